@@ -0,0 +1,97 @@
+"""
+Synthetic profiles and reviews for benchmarks, either seeded into Postgres
+or served by the in-process stand-in (see standin.py).
+"""
+import random
+from datetime import datetime, timedelta
+
+# Benchmark rows are recognisable by this prefix so reseeding can remove them
+PREFIX = "bench-"
+
+REVIEW_FIELDS = (
+    "review_id",
+    "business_place_id",
+    "author_title",
+    "author_link",
+    "author_reviews_count",
+    "review_rating",
+    "review_text",
+    "review_datetime_utc",
+    "review_timestamp",
+    "replies",
+)
+
+PHRASES = [
+    "The food was great",
+    "Service was slow tonight",
+    "Lovely atmosphere and friendly staff",
+    "A bit overpriced for the portion size",
+    "Best dumplings in the city",
+    "We waited forty minutes for a table",
+    "Will definitely come back",
+]
+
+class Dataset:
+    """
+    A reproducible set of profiles and reviews spread over businesses.
+    """
+
+    def __init__(self, businesses: int, reviews_per_business: int, profiles: int, reply_ratio: float = 0.3, seed: int = 0):
+        rng = random.Random(seed)
+        start = datetime(2024, 1, 1)
+
+        self.profiles = [
+            {
+                "id": i + 1,
+                "profile_name": f"{PREFIX}profile-{i + 1}",
+                "profile_text_base": "You are the friendly manager of a busy restaurant.",
+                "profile_text_addon": f"Sign every reply as Manager {i + 1}."
+            }
+            for i in range(profiles)
+        ]
+        self.business_ids = [f"{PREFIX}place-{b}" for b in range(businesses)]
+        self.reviews = []
+        for business_place_id in self.business_ids:
+            for r in range(reviews_per_business):
+                written_at = start + timedelta(minutes=rng.randrange(0, 60 * 24 * 365))
+                self.reviews.append({
+                    "review_id": f"{business_place_id}-review-{r}",
+                    "business_place_id": business_place_id,
+                    "author_title": f"Guest {rng.randrange(100000)}",
+                    "author_link": None,
+                    "author_reviews_count": rng.randrange(1, 200),
+                    "review_rating": float(rng.randint(1, 5)),
+                    "review_text": ". ".join(rng.sample(PHRASES, rng.randint(1, 4))),
+                    "review_datetime_utc": written_at,
+                    "review_timestamp": int(written_at.timestamp()),
+                    "replies": "Thank you!" if rng.random() < reply_ratio else None
+                })
+
+    @property
+    def review_ids(self) -> list[str]:
+        return [review["review_id"] for review in self.reviews]
+
+async def seed_postgres(connection, dataset: Dataset):
+    """
+    Replace earlier benchmark rows with the dataset. Reviews are loaded with
+    COPY; the stats trigger keeps business_review_stats in step.
+    """
+    async with connection.transaction():
+        await connection.execute("DELETE FROM reviews WHERE business_place_id LIKE $1", f"{PREFIX}%")
+        await connection.execute("DELETE FROM profiles WHERE profile_name LIKE $1", f"{PREFIX}%")
+        profile_ids = [
+            await connection.fetchval(
+                "INSERT INTO profiles (profile_name, profile_text_base, profile_text_addon) VALUES ($1, $2, $3) RETURNING id",
+                profile["profile_name"], profile["profile_text_base"], profile["profile_text_addon"]
+            )
+            for profile in dataset.profiles
+        ]
+        await connection.copy_records_to_table(
+            "reviews",
+            records=[tuple(review[field] for field in REVIEW_FIELDS) for review in dataset.reviews],
+            columns=REVIEW_FIELDS
+        )
+    # Serial IDs differ from the dataset's, so point the dataset at the real rows
+    for profile, profile_id in zip(dataset.profiles, profile_ids):
+        profile["id"] = profile_id
+    await connection.execute("ANALYZE reviews")
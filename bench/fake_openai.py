@@ -0,0 +1,102 @@
+"""
+OpenAI-compatible chat completions server for benchmarks.
+
+Replies after a fixed time-to-first-token and then produces tokens at a
+fixed rate, so generation cost is predictable across runs. Configured
+through the environment:
+
+    FAKE_OPENAI_LATENCY            seconds before the first token (default 0.3)
+    FAKE_OPENAI_TOKENS_PER_SECOND  completion token rate (default 50)
+    FAKE_OPENAI_COMPLETION_TOKENS  tokens per reply (default 60)
+
+Run with:
+
+    uvicorn bench.fake_openai:app --port 8001
+
+and point the API at it with OPENAI_BASE_URL=http://127.0.0.1:8001/v1.
+"""
+import asyncio
+import json
+import os
+import time
+import uuid
+
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+WORD = "thanks "
+
+def estimate_tokens(messages: list[dict]) -> int:
+    """
+    Rough prompt size: about four characters per token.
+    """
+    return sum(len(message.get("content") or "") for message in messages) // 4 + 1
+
+def create_app(latency: float, tokens_per_second: float, completion_tokens: int) -> FastAPI:
+    app = FastAPI(title="Fake OpenAI")
+    token_interval = 1 / tokens_per_second if tokens_per_second > 0 else 0
+
+    @app.get("/health")
+    async def health():
+        return {"status": "ok"}
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(req: Request):
+        body = await req.json()
+        model = body.get("model", "fake")
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        created = int(time.time())
+        max_tokens = body.get("max_tokens") or completion_tokens
+        n_tokens = min(completion_tokens, max_tokens)
+
+        if body.get("stream"):
+            async def chunks():
+                await asyncio.sleep(latency)
+                for _ in range(n_tokens):
+                    chunk = {
+                        "id": completion_id,
+                        "object": "chat.completion.chunk",
+                        "created": created,
+                        "model": model,
+                        "choices": [{"index": 0, "delta": {"content": WORD}, "finish_reason": None}]
+                    }
+                    yield f"data: {json.dumps(chunk)}\n\n"
+                    await asyncio.sleep(token_interval)
+                done = {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": model,
+                    "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]
+                }
+                yield f"data: {json.dumps(done)}\n\n"
+                yield "data: [DONE]\n\n"
+
+            return StreamingResponse(chunks(), media_type="text/event-stream")
+
+        await asyncio.sleep(latency + n_tokens * token_interval)
+        prompt_tokens = estimate_tokens(body.get("messages", []))
+        return {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": (WORD * n_tokens).strip()},
+                "finish_reason": "stop"
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": n_tokens,
+                "total_tokens": prompt_tokens + n_tokens
+            }
+        }
+
+    return app
+
+app = create_app(
+    latency=float(os.getenv("FAKE_OPENAI_LATENCY", "0.3")),
+    tokens_per_second=float(os.getenv("FAKE_OPENAI_TOKENS_PER_SECOND", "50")),
+    completion_tokens=int(os.getenv("FAKE_OPENAI_COMPLETION_TOKENS", "60"))
+)
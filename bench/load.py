@@ -0,0 +1,85 @@
+"""
+Closed-loop load driver: a fixed number of concurrent clients each send
+their next request as soon as the previous one completes.
+"""
+import asyncio
+import itertools
+import math
+import time
+
+def percentile(values: list[float], pct: float) -> float:
+    """
+    Nearest-rank percentile of the values (0 for an empty list).
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered), math.ceil(pct / 100 * len(ordered))) - 1)
+    return ordered[rank]
+
+def summarize(name: str, latencies: list[float], errors: int, elapsed: float) -> dict:
+    """
+    Latency percentiles in milliseconds and throughput in requests per second.
+    """
+    completed = len(latencies) + errors
+    return {
+        "scenario": name,
+        "requests": completed,
+        "errors": errors,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "throughput_rps": round(completed / elapsed, 2) if elapsed > 0 else 0.0
+    }
+
+async def run_scenario(client, name: str, requests, total: int, concurrency: int) -> dict:
+    """
+    Send `total` requests drawn from the `requests` iterable of
+    (method, path, json) tuples over `concurrency` workers. Only 2xx
+    responses count towards the latency percentiles.
+    """
+    source = iter(itertools.islice(requests, total))
+    latencies = []
+    errors = 0
+
+    async def worker():
+        nonlocal errors
+        for method, path, body in source:
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, path, json=body)
+                ok = response.is_success
+            except Exception:
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - start)
+            else:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    return summarize(name, latencies, errors, time.perf_counter() - start)
+
+def scenarios(dataset, page_size: int, bypass_cache: bool) -> dict:
+    """
+    Endless request streams per scenario, cycling through the dataset.
+    """
+    profile_ids = [profile["id"] for profile in dataset.profiles]
+    return {
+        "reviews_fetch": (
+            ("POST", "/reviews/fetch", {"business_place_id": place, "limit": page_size})
+            for place in itertools.cycle(dataset.business_ids)
+        ),
+        "profiles_fetch": (
+            ("GET", "/profiles/fetch_profiles", None)
+            for _ in itertools.count()
+        ),
+        "message_get_response": (
+            ("POST", "/message/get_response", {
+                "profile_id": profile_id,
+                "message_id": review_id,
+                "bypass_cache": bypass_cache
+            })
+            for profile_id, review_id in zip(itertools.cycle(profile_ids), itertools.cycle(dataset.review_ids))
+        ),
+    }
@@ -0,0 +1,176 @@
+"""
+Benchmark the API against a fake OpenAI server and a synthetic dataset.
+
+    python -m bench.run --mode standin                 # no database needed
+    python -m bench.run --mode postgres --app-workers 2
+    python -m bench.run --output before.json
+    python -m bench.run --compare before.json
+
+In postgres mode the dataset is seeded into the database configured by the
+DB_* settings (rows are prefixed "bench-" and replaced on every run) and the
+app is started with uvicorn. In standin mode the app runs in this process
+against an in-memory stand-in for the pool. Either way OpenAI calls go to
+bench.fake_openai, started on a local port.
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+
+from .dataset import Dataset, seed_postgres
+from .load import run_scenario, scenarios
+
+SCENARIOS = ["reviews_fetch", "profiles_fetch", "message_get_response"]
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def start_server(app: str, port: int, env: dict, workers: int = 1) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", app, "--port", str(port), "--workers", str(workers), "--log-level", "warning"],
+        env={**os.environ, **env}
+    )
+
+async def wait_until_up(url: str, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while True:
+            try:
+                if (await client.get(url)).is_success:
+                    return
+            except httpx.TransportError:
+                pass
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"{url} did not come up within {timeout}s")
+            await asyncio.sleep(0.2)
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def print_results(results: list[dict], baseline: dict | None = None):
+    print(f"{'scenario':<22}{'requests':>9}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>10}")
+    for result in results:
+        print(
+            f"{result['scenario']:<22}{result['requests']:>9}{result['errors']:>8}"
+            f"{result['p50_ms']:>10}{result['p95_ms']:>10}{result['p99_ms']:>10}{result['throughput_rps']:>10}"
+        )
+        before = (baseline or {}).get(result["scenario"])
+        if before:
+            deltas = [
+                f"{key}: {(result[key] - before[key]) / before[key] * 100:+.1f}%"
+                for key in ("p50_ms", "p95_ms", "p99_ms", "throughput_rps")
+                if before[key]
+            ]
+            print(f"{'  vs baseline':<22}{', '.join(deltas)}")
+
+async def run_benchmarks(client, dataset: Dataset, args) -> list[dict]:
+    streams = scenarios(dataset, args.page_size, bypass_cache=not args.use_cache)
+    results = []
+    for name in args.scenarios:
+        total = args.requests
+        # Generation is far slower than reads, so it gets fewer requests by default
+        if name == "message_get_response" and args.message_requests is not None:
+            total = args.message_requests
+        if args.warmup:
+            await run_scenario(client, name, streams[name], args.warmup, args.concurrency)
+        results.append(await run_scenario(client, name, streams[name], total, args.concurrency))
+    return results
+
+async def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the review reply API")
+    parser.add_argument("--mode", choices=["standin", "postgres"], default="standin")
+    parser.add_argument("--businesses", type=int, default=20)
+    parser.add_argument("--reviews-per-business", type=int, default=500)
+    parser.add_argument("--profiles", type=int, default=5)
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=2000, help="requests per scenario")
+    parser.add_argument("--message-requests", type=int, default=None, help="requests for message_get_response")
+    parser.add_argument("--warmup", type=int, default=50, help="unmeasured requests before each scenario")
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--use-cache", action="store_true", help="let /message/get_response hit the reply cache")
+    parser.add_argument("--openai-latency", type=float, default=0.3, help="seconds to first token")
+    parser.add_argument("--openai-tokens-per-second", type=float, default=50)
+    parser.add_argument("--openai-completion-tokens", type=int, default=60)
+    parser.add_argument("--db-latency", type=float, default=0.0, help="stand-in delay per query, in seconds")
+    parser.add_argument("--app-workers", type=int, default=1, help="uvicorn workers in postgres mode")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare against")
+    args = parser.parse_args(argv)
+
+    dataset = Dataset(args.businesses, args.reviews_per_business, args.profiles)
+    openai_port = free_port()
+    openai_env = {
+        "FAKE_OPENAI_LATENCY": str(args.openai_latency),
+        "FAKE_OPENAI_TOKENS_PER_SECOND": str(args.openai_tokens_per_second),
+        "FAKE_OPENAI_COMPLETION_TOKENS": str(args.openai_completion_tokens),
+    }
+    app_env = {
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{openai_port}/v1",
+        "OPENAI_API_KEY": "bench",
+        # Benchmarks measure throughput, not tenant limits
+        "RATE_LIMIT_ENABLED": "false",
+    }
+    processes = [start_server("bench.fake_openai:app", openai_port, openai_env)]
+    try:
+        await wait_until_up(f"http://127.0.0.1:{openai_port}/health")
+
+        if args.mode == "postgres":
+            import asyncpg
+            from src import database
+            from src.migrate import migrate
+
+            connection = await asyncpg.connect(**database.DB_CONFIG)
+            try:
+                await migrate(connection)
+                await seed_postgres(connection, dataset)
+            finally:
+                await connection.close()
+
+            app_port = free_port()
+            processes.append(start_server("src.main:app", app_port, {**app_env, "JOB_WORKERS": "0", "AUTO_REPLY_ENABLED": "false"}, args.app_workers))
+            await wait_until_up(f"http://127.0.0.1:{app_port}/")
+            client = httpx.AsyncClient(base_url=f"http://127.0.0.1:{app_port}", timeout=120)
+        else:
+            # The OpenAI client reads its settings at import time; there is
+            # no database for cross-process locks
+            os.environ.update({**app_env, "SINGLE_FLIGHT_CROSS_PROCESS": "false"})
+            from src.main import app
+            from src.usage import usage_recorder
+            from .standin import StandInPool
+
+            app.state.db_pool = StandInPool(dataset, query_delay=args.db_latency)
+            usage_recorder.start(app.state.db_pool)
+            client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=120)
+
+        async with client:
+            results = await run_benchmarks(client, dataset, args)
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = {result["scenario"]: result for result in json.load(f)["results"]}
+    print_results(results, baseline)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"commit": git_commit(), "config": vars(args), "results": results}, f, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
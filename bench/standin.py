@@ -0,0 +1,127 @@
+"""
+In-process stand-in for the Postgres pool, serving a Dataset from memory.
+
+It answers the queries behind /reviews/fetch, /profiles/fetch_profiles and
+/message/get_response, so those paths can be benchmarked without a
+database. Review pages honour the business and limit only; other filters
+and cursors are ignored. An optional per-query delay approximates the
+round trip to a real server.
+"""
+import asyncio
+from contextlib import asynccontextmanager
+
+from src import database
+
+from .dataset import Dataset
+
+class StandInConnection:
+    def __init__(self, dataset: Dataset, query_delay: float):
+        self.dataset = dataset
+        self.query_delay = query_delay
+        self.profiles = {profile["id"]: profile for profile in dataset.profiles}
+        self.reviews = {review["review_id"]: review for review in dataset.reviews}
+        self.by_business = {}
+        for review_id, review in enumerate(dataset.reviews, start=1):
+            review["id"] = review_id
+            self.by_business.setdefault(review["business_place_id"], []).append(review)
+        for reviews in self.by_business.values():
+            reviews.sort(key=lambda review: (review["review_datetime_utc"], review["id"]), reverse=True)
+
+    async def _round_trip(self):
+        if self.query_delay:
+            await asyncio.sleep(self.query_delay)
+
+    async def fetch(self, query: str, *args):
+        await self._round_trip()
+        if query == database.PROFILE_LISTING:
+            return [
+                {key: profile[key] for key in ("id", "profile_name", "profile_text_addon")}
+                for profile in self.profiles.values()
+            ]
+        if "WITH stats AS" in query:
+            return self._review_page(args[0], args[-1])
+        raise NotImplementedError(f"Stand-in does not support query: {query.strip()[:60]}")
+
+    async def fetchrow(self, query: str, *args):
+        await self._round_trip()
+        if query == database.PROFILE_BY_ID:
+            return self.profiles.get(args[0])
+        if query == database.REVIEW_FOR_REPLY:
+            review = self.reviews.get(args[0])
+            if review is None:
+                return None
+            return {"message": review["review_text"], "username": review["author_title"], "rating": review["review_rating"]}
+        raise NotImplementedError(f"Stand-in does not support query: {query.strip()[:60]}")
+
+    async def fetchval(self, query: str, *args):
+        await self._round_trip()
+        if query == database.CACHED_REPLY:
+            return None
+        raise NotImplementedError(f"Stand-in does not support query: {query.strip()[:60]}")
+
+    async def execute(self, query: str, *args):
+        await self._round_trip()
+        if query == database.REPLY_VERSIONS_INSERT:
+            saved = 0
+            for review_id, reply in zip(args[0], args[6]):
+                if review_id in self.reviews:
+                    self.reviews[review_id]["replies"] = reply
+                    saved += 1
+            return f"INSERT 0 {saved}"
+        if query in (database.CACHED_REPLY_UPSERT, database.NOTIFY):
+            return "INSERT 0 1"
+        if query == database.REPLY_USAGE_BULK_INSERT:
+            return f"INSERT 0 {len(args[0])}"
+        raise NotImplementedError(f"Stand-in does not support query: {query.strip()[:60]}")
+
+    def _review_page(self, business_place_id: str, limit: int) -> list[dict]:
+        reviews = self.by_business.get(business_place_id, [])
+        stats = {
+            "total_reviews": len(reviews),
+            "average_rating": sum(r["review_rating"] for r in reviews) / len(reviews) if reviews else None,
+            "replied_reviews": sum(1 for r in reviews if r["replies"]),
+            **{f"rating_{star}": sum(1 for r in reviews if round(r["review_rating"]) == star) for star in range(1, 6)}
+        }
+        page = [
+            {
+                **stats,
+                "id": review["id"],
+                "review_id": review["review_id"],
+                "username": review["author_title"],
+                "rating": review["review_rating"],
+                "timestamp": review["review_datetime_utc"],
+                "review_text": review["review_text"],
+                "business_place_id": review["business_place_id"],
+                "n_review_user": review["author_reviews_count"],
+                "replies": review["replies"],
+                "review_timestamp": review["review_timestamp"],
+                "url_user": review["author_link"]
+            }
+            for review in reviews[:limit]
+        ]
+        return page or [{**stats, "id": None}]
+
+class StandInPool:
+    """
+    Pool-shaped wrapper handing out a shared StandInConnection, with at most
+    max_size connections acquired at once like a real pool.
+    """
+
+    def __init__(self, dataset: Dataset, max_size: int = 10, query_delay: float = 0.0):
+        self.connection = StandInConnection(dataset, query_delay)
+        self.max_size = max_size
+        self._slots = asyncio.Semaphore(max_size)
+
+    @asynccontextmanager
+    async def acquire(self):
+        async with self._slots:
+            yield self.connection
+
+    def get_size(self) -> int:
+        return self.max_size
+
+    def get_idle_size(self) -> int:
+        return self._slots._value
+
+    def get_max_size(self) -> int:
+        return self.max_size
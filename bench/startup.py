@@ -0,0 +1,87 @@
+"""
+Measure cold start: the time to import the app, and the latency of the
+first reply generation in a fresh process (against the fake OpenAI server
+and the in-memory stand-in for Postgres).
+
+    python -m bench.startup --runs 5
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from .run import free_port, start_server, wait_until_up
+
+async def first_request(warm_up: bool) -> dict:
+    start = time.perf_counter()
+    from src.main import app
+    from src import llm
+    imported = time.perf_counter() - start
+
+    import httpx
+    from .dataset import Dataset
+    from .standin import StandInPool
+
+    dataset = Dataset(businesses=1, reviews_per_business=10, profiles=1)
+    app.state.db_pool = StandInPool(dataset)
+    if warm_up:
+        # As the lifespan handler does once the server is up
+        await llm.warm_up()
+    review = dataset.reviews[0]
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        start = time.perf_counter()
+        response = await client.post(
+            "/message/get_response",
+            json={"profile_id": dataset.profiles[0]["id"], "message_id": review["review_id"], "bypass_cache": True}
+        )
+        response.raise_for_status()
+        first = time.perf_counter() - start
+    return {"import_ms": round(imported * 1000, 1), "first_request_ms": round(first * 1000, 1)}
+
+def measure(runs: int, env: dict, warm_up: bool) -> list[dict]:
+    samples = []
+    for _ in range(runs):
+        command = [sys.executable, "-m", "bench.startup", "--child"] + (["--warm-up"] if warm_up else [])
+        output = subprocess.run(command, env={**os.environ, **env}, capture_output=True, text=True, check=True).stdout
+        samples.append(json.loads(output.strip().splitlines()[-1]))
+    return samples
+
+async def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="Measure app import and first-request latency")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--warm-up", action="store_true", help="build the OpenAI client before the first request")
+    args = parser.parse_args(argv)
+
+    if args.child:
+        print(json.dumps(await first_request(args.warm_up)))
+        return
+
+    openai_port = free_port()
+    server = start_server("bench.fake_openai:app", openai_port, {"FAKE_OPENAI_LATENCY": "0", "FAKE_OPENAI_TOKENS_PER_SECOND": "0"})
+    env = {
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{openai_port}/v1",
+        "OPENAI_API_KEY": "bench",
+        "SINGLE_FLIGHT_CROSS_PROCESS": "false",
+        "RATE_LIMIT_ENABLED": "false",
+    }
+    try:
+        await wait_until_up(f"http://127.0.0.1:{openai_port}/health")
+        for warm_up in (False, True):
+            samples = measure(args.runs, env, warm_up)
+            label = "warmed client" if warm_up else "cold client"
+            print(
+                f"{label:<14} import {statistics.median(s['import_ms'] for s in samples):>7.1f} ms   "
+                f"first request {statistics.median(s['first_request_ms'] for s in samples):>7.1f} ms   "
+                f"(median of {args.runs})"
+            )
+    finally:
+        server.terminate()
+        server.wait()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,21 +1,19 @@
 #!/bin/bash
 
-# Load environment variables
-source ../.env
+# Apply the schema migrations in src/migrations (run from the scripts directory)
+cd "$(dirname "$0")/.." || exit 1
 
-# Check if psql is installed
-if ! command -v psql &> /dev/null; then
-    echo "Error: psql is not installed. Please install PostgreSQL client tools."
-    exit 1
-fi
+# Load environment variables
+set -a
+source .env
+set +a
 
-# Initialize the database
 echo "Initializing database..."
-PGPASSWORD=$DB_PASSWORD psql -h $DB_HOST -p $DB_PORT -U $DB_USER -d $DB_NAME -f init_db.sql
+python -m src.migrate "$@"
 
 if [ $? -eq 0 ]; then
     echo "Database initialized successfully!"
 else
     echo "Error initializing database."
     exit 1
-fi 
\ No newline at end of file
+fi
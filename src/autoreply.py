@@ -0,0 +1,218 @@
+import asyncio
+import logging
+import time
+
+import asyncpg
+
+from . import database, metrics, routing
+from .config import (
+    AUTO_REPLY_WINDOW_SECONDS,
+    AUTO_REPLY_BATCH_SIZE,
+    AUTO_REPLY_CONCURRENCY,
+    AUTO_REPLY_MAX_PER_MINUTE,
+    AUTO_REPLY_POLL_SECONDS,
+    AUTO_REPLY_MAX_ATTEMPTS,
+    AUTO_REPLY_RETRY_SECONDS,
+)
+from .profile_cache import profile_cache
+from .prompts import build_system_message, build_message_content
+from .routes.message import generate_reply
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Channel notified by the reviews_notify_new trigger (migrations 0009, 0012)
+NEW_REVIEWS_CHANNEL = "new_reviews"
+
+# Only the worker holding this advisory lock replies automatically
+AUTO_REPLY_LOCK_ID = 7_404_002
+
+class RateLimiter:
+    """
+    Token bucket allowing `rate_per_minute` acquisitions per minute on
+    average, in bursts of at most `burst`.
+    """
+
+    def __init__(self, rate_per_minute: float, burst: int = 1):
+        self.rate = rate_per_minute / 60
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = None
+
+    async def acquire(self):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+async def wait_for_any(events: list[asyncio.Event], timeout: float):
+    waiters = [asyncio.create_task(event.wait()) for event in events]
+    try:
+        await asyncio.wait(waiters, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for waiter in waiters:
+            waiter.cancel()
+
+class AutoReplier:
+    """
+    Replies to new reviews of businesses that have a default profile in
+    business_reply_profiles. An insert trigger queues them in
+    auto_reply_queue and notifies NEW_REVIEWS_CHANNEL; notifications only
+    wake the replier, which waits `window_seconds` for more to arrive and
+    then works through the queue in batches. Failed replies stay queued and
+    are retried with backoff, up to `max_attempts` attempts, and then moved
+    to auto_reply_dead_letters. One batch is in flight at a time and LLM
+    calls are rate limited, so a large import is answered at a steady pace
+    instead of flooding the LLM. One worker process at a time replies,
+    elected with an advisory lock; the others stand by.
+    """
+
+    def __init__(self, window_seconds: float, batch_size: int, concurrency: int, max_per_minute: float, poll_seconds: float,
+                 max_attempts: int = 5, retry_seconds: float = 60):
+        self.window_seconds = window_seconds
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.poll_seconds = poll_seconds
+        self.max_attempts = max_attempts
+        self.retry_seconds = retry_seconds
+        self.rate_limiter = RateLimiter(max_per_minute, burst=concurrency)
+        self._task = None
+
+    async def reply_to(self, db_pool, row) -> tuple | None:
+        profile_row = await profile_cache.get(db_pool, row['profile_id'])
+        if not profile_row:
+            logger.warning(f"Default profile {row['profile_id']} for review {row['review_id']} no longer exists")
+            return None
+        await self.rate_limiter.acquire()
+        system_message = build_system_message(profile_row)
+        reply = await generate_reply(
+            system_message, build_message_content(row, system_message), db_pool,
+            profile_id=row['profile_id'], message_id=row['review_id'],
+            settings=routing.completion_settings(profile_row, row)
+        )
+        return reply.version(row['review_id'], row['profile_id'])
+
+    async def process_batch(self, db_pool, rows) -> int:
+        """
+        Generate replies for a batch of queued reviews and save them as
+        reply versions with one INSERT. Answered reviews leave the queue;
+        failed ones stay queued for a retry. Returns the number of replies
+        saved.
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def generate_one(row):
+            async with semaphore:
+                return await self.reply_to(db_pool, row)
+
+        results = await asyncio.gather(*[generate_one(row) for row in rows], return_exceptions=True)
+        generated = [result for result in results if isinstance(result, tuple)]
+        failed = [(row['review_id'], str(result)) for row, result in zip(rows, results) if isinstance(result, Exception)]
+        for review_id, error in failed:
+            logger.error(f"Automatic reply to review {review_id} failed: {error}")
+        metrics.AUTO_REPLIES.labels("failed").inc(len(failed))
+
+        saved = 0
+        async with db_pool.acquire() as connection:
+            if generated:
+                saved = await database.save_auto_replies(connection, generated)
+            # Reviews whose profile is gone are dropped along with the answered ones
+            done = [row['review_id'] for row, result in zip(rows, results) if not isinstance(result, Exception)]
+            if done:
+                await database.dequeue_auto_replies(connection, done)
+            if failed:
+                await database.retry_auto_replies(
+                    connection, [review_id for review_id, _ in failed], [error for _, error in failed], self.retry_seconds
+                )
+        metrics.AUTO_REPLIES.labels("saved").inc(saved)
+        logger.info(f"Saved {saved} automatic replies ({len(rows)} new reviews)")
+        return saved
+
+    async def drain(self, db_pool):
+        """
+        Answer every queued review that is due, one batch at a time.
+        Failed reviews are not due again until their retry time, so each
+        is attempted at most once per drain.
+        """
+        async with db_pool.acquire() as connection:
+            pruned = await database.prune_auto_reply_queue(connection)
+            exhausted = await database.dead_letter_auto_replies(connection, self.max_attempts)
+        if pruned:
+            logger.info(f"Dropped {pruned} queued reviews that no longer need an automatic reply")
+        for row in exhausted:
+            logger.warning(
+                f"Gave up on an automatic reply to review {row['review_id']} after {self.max_attempts} attempts: {row['error']}"
+            )
+        metrics.AUTO_REPLIES.labels("abandoned").inc(len(exhausted))
+
+        while True:
+            async with db_pool.acquire() as connection:
+                rows = await database.fetch_auto_reply_candidates(connection, self.batch_size, self.max_attempts)
+            if not rows:
+                return
+            await self.process_batch(db_pool, rows)
+
+    async def _run(self, db_pool):
+        while True:
+            connection = None
+            try:
+                connection = await asyncpg.connect(**database.DB_CONFIG)
+                closed = asyncio.Event()
+                connection.add_termination_listener(lambda _: closed.set())
+
+                while not await database.try_advisory_lock(connection, AUTO_REPLY_LOCK_ID):
+                    await asyncio.sleep(self.poll_seconds)
+                logger.info(f"Replying automatically to new reviews (channel {NEW_REVIEWS_CHANNEL})")
+
+                wake = asyncio.Event()
+                await connection.add_listener(NEW_REVIEWS_CHANNEL, lambda *args: wake.set())
+                while not closed.is_set():
+                    wake.clear()
+                    # Also catches reviews that arrived while not listening
+                    await self.drain(db_pool)
+                    await wait_for_any([wake, closed], self.poll_seconds)
+                    if wake.is_set():
+                        await asyncio.sleep(self.window_seconds)
+                logger.warning("Auto-reply listener connection lost, reconnecting")
+            except asyncio.CancelledError:
+                if connection is not None and not connection.is_closed():
+                    await connection.close()
+                raise
+            except Exception as e:
+                # Anything else, a bug included, must not end auto-replies
+                # for the life of the process
+                logger.error(f"Auto-reply listener failed: {str(e)}")
+            if connection is not None and not connection.is_closed():
+                await connection.close()
+            await asyncio.sleep(5)
+
+    def start(self, db_pool):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(db_pool))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+auto_replier = AutoReplier(
+    window_seconds=AUTO_REPLY_WINDOW_SECONDS,
+    batch_size=AUTO_REPLY_BATCH_SIZE,
+    concurrency=AUTO_REPLY_CONCURRENCY,
+    max_per_minute=AUTO_REPLY_MAX_PER_MINUTE,
+    poll_seconds=AUTO_REPLY_POLL_SECONDS,
+    max_attempts=AUTO_REPLY_MAX_ATTEMPTS,
+    retry_seconds=AUTO_REPLY_RETRY_SECONDS
+)
@@ -0,0 +1,169 @@
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+
+import asyncpg
+
+from . import database, metrics
+from .config import (
+    REPLY_CACHE_MAX_ENTRIES,
+    REPLY_CACHE_MAX_BYTES,
+    REPLY_CACHE_TTL_SECONDS,
+    REPLY_CACHE_PERSISTENT,
+    REPLY_CACHE_PRUNE_INTERVAL_SECONDS,
+    REPLY_CACHE_PRUNE_BATCH_SIZE,
+)
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+def cache_key(params: dict) -> str:
+    """
+    Content-addressed key for a completion request: a SHA-256 over the
+    model, messages and sampling parameters.
+    """
+    payload = json.dumps(params, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class ReplyCache:
+    """
+    Two-tier cache of generated replies.
+    The first tier is an in-process LRU bounded by entry count and total
+    size, with a TTL. The optional second tier is the reply_cache table,
+    shared by every worker using the same database; rows past the TTL are
+    deleted every `prune_interval` seconds.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl_seconds: float, persistent: bool = False,
+                 prune_interval: float = 600, prune_batch_size: int = 5000):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.persistent = persistent
+        self.prune_interval = prune_interval
+        self.prune_batch_size = prune_batch_size
+        self._prune_task = None
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+
+    def _get_local(self, key: str) -> str | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at < time.monotonic():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def _set_local(self, key: str, value: str):
+        if key in self._entries:
+            self._remove(key)
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        self._entries[key] = (value, time.monotonic() + self.ttl_seconds)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+
+    def _remove(self, key: str):
+        value, _ = self._entries.pop(key)
+        self._bytes -= len(value.encode("utf-8"))
+
+    async def get(self, key: str, db_pool=None) -> str | None:
+        value = self._get_local(key)
+        if value is not None:
+            self.hits += 1
+            metrics.REPLY_CACHE_LOOKUPS.labels("hit").inc()
+            return value
+
+        if self.persistent and db_pool:
+            try:
+                async with db_pool.acquire() as connection:
+                    value = await database.fetch_cached_reply(connection, key, self.ttl_seconds)
+            except asyncpg.PostgresError as e:
+                logger.error(f"Database error while reading reply cache: {str(e)}")
+                value = None
+            if value is not None:
+                self.persistent_hits += 1
+                metrics.REPLY_CACHE_LOOKUPS.labels("persistent_hit").inc()
+                self._set_local(key, value)
+                return value
+
+        self.misses += 1
+        metrics.REPLY_CACHE_LOOKUPS.labels("miss").inc()
+        return None
+
+    async def set(self, key: str, value: str, db_pool=None):
+        self._set_local(key, value)
+
+        if self.persistent and db_pool:
+            try:
+                async with db_pool.acquire() as connection:
+                    await database.store_cached_reply(connection, key, value)
+            except asyncpg.PostgresError as e:
+                logger.error(f"Database error while writing reply cache: {str(e)}")
+
+    async def prune(self, db_pool) -> int:
+        """
+        Delete expired rows from the reply_cache table, in batches so no
+        single statement holds locks for long. Returns how many were deleted.
+        """
+        deleted = 0
+        while True:
+            async with db_pool.acquire() as connection:
+                count = await database.prune_cached_replies(connection, self.ttl_seconds, self.prune_batch_size)
+            deleted += count
+            if count < self.prune_batch_size:
+                return deleted
+
+    async def _run_pruning(self, db_pool):
+        while True:
+            try:
+                deleted = await self.prune(db_pool)
+                if deleted:
+                    logger.info(f"Pruned {deleted} expired reply cache rows")
+            except (OSError, asyncpg.PostgresError) as e:
+                logger.error(f"Failed to prune reply cache: {str(e)}")
+            await asyncio.sleep(self.prune_interval)
+
+    def start_pruning(self, db_pool):
+        if self.persistent and self._prune_task is None:
+            self._prune_task = asyncio.create_task(self._run_pruning(db_pool))
+
+    async def stop_pruning(self):
+        if self._prune_task is not None:
+            self._prune_task.cancel()
+            try:
+                await self._prune_task
+            except asyncio.CancelledError:
+                pass
+            self._prune_task = None
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.persistent_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "persistent_hits": self.persistent_hits,
+            "misses": self.misses,
+            "hit_ratio": (self.hits + self.persistent_hits) / lookups if lookups else 0.0
+        }
+
+reply_cache = ReplyCache(
+    max_entries=REPLY_CACHE_MAX_ENTRIES,
+    max_bytes=REPLY_CACHE_MAX_BYTES,
+    ttl_seconds=REPLY_CACHE_TTL_SECONDS,
+    persistent=REPLY_CACHE_PERSISTENT,
+    prune_interval=REPLY_CACHE_PRUNE_INTERVAL_SECONDS,
+    prune_batch_size=REPLY_CACHE_PRUNE_BATCH_SIZE
+)
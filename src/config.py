@@ -14,5 +14,133 @@ DB_NAME = os.getenv("DB_NAME", "googlemaps")
 DB_USER = os.getenv("DB_USER", "reviewsuser")
 DB_PASSWORD = os.getenv("DB_PASSWORD", "reviewspass")
 
+# Database pool tuning
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "2"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+DB_POOL_MAX_QUERIES = int(os.getenv("DB_POOL_MAX_QUERIES", "50000"))
+DB_POOL_MAX_INACTIVE_LIFETIME = float(os.getenv("DB_POOL_MAX_INACTIVE_LIFETIME", "300"))
+DB_COMMAND_TIMEOUT = float(os.getenv("DB_COMMAND_TIMEOUT", "60"))
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "256"))
+
+# Server processes. With DB_CONNECTION_BUDGET set, each worker's pool is
+# capped to its share of the budget so WEB_CONCURRENCY workers stay under
+# the server's max_connections.
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+SERVER_HOST = os.getenv("SERVER_HOST", "0.0.0.0")
+SERVER_PORT = int(os.getenv("SERVER_PORT", "8000"))
+DB_CONNECTION_BUDGET = int(os.getenv("DB_CONNECTION_BUDGET", "0"))
+# Time in-flight requests and generations get to finish on shutdown
+SHUTDOWN_GRACE_SECONDS = float(os.getenv("SHUTDOWN_GRACE_SECONDS", "30"))
+HEALTH_CHECK_TIMEOUT_SECONDS = float(os.getenv("HEALTH_CHECK_TIMEOUT_SECONDS", "2"))
+
 # OpenAI Configuration
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY") 
\ No newline at end of file
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+# Any OpenAI-compatible server, e.g. a local model server
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
+
+# Default completion settings; profiles can override each of them
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")
+OPENAI_CHEAP_MODEL = os.getenv("OPENAI_CHEAP_MODEL", "")
+OPENAI_FALLBACK_MODEL = os.getenv("OPENAI_FALLBACK_MODEL", "")
+OPENAI_TEMPERATURE = float(os.getenv("OPENAI_TEMPERATURE", "0.7"))
+OPENAI_MAX_TOKENS = int(os.getenv("OPENAI_MAX_TOKENS", "500"))
+
+# Model routing: short or positive reviews go to the cheap model, and the
+# primary model falls back when it exceeds its latency budget or fails
+ROUTING_SHORT_REVIEW_TOKENS = int(os.getenv("ROUTING_SHORT_REVIEW_TOKENS", "60"))
+ROUTING_POSITIVE_RATING = float(os.getenv("ROUTING_POSITIVE_RATING", "4"))
+MODEL_LATENCY_BUDGET_SECONDS = float(os.getenv("MODEL_LATENCY_BUDGET_SECONDS", "15"))
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_SECONDS = float(os.getenv("CIRCUIT_RESET_SECONDS", "30"))
+
+# OpenAI client limits
+OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "32"))
+OPENAI_TIMEOUT_SECONDS = float(os.getenv("OPENAI_TIMEOUT_SECONDS", "30"))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "3"))
+OPENAI_RETRY_BASE_DELAY = float(os.getenv("OPENAI_RETRY_BASE_DELAY", "0.5"))
+OPENAI_RETRY_MAX_DELAY = float(os.getenv("OPENAI_RETRY_MAX_DELAY", "8"))
+
+# Batch reply generation
+MESSAGE_BATCH_MAX_SIZE = int(os.getenv("MESSAGE_BATCH_MAX_SIZE", "500"))
+MESSAGE_BATCH_CONCURRENCY = int(os.getenv("MESSAGE_BATCH_CONCURRENCY", "16"))
+
+# Prompt token budgets
+PROMPT_MAX_TOKENS = int(os.getenv("PROMPT_MAX_TOKENS", "3000"))
+PROMPT_PROFILE_MAX_TOKENS = int(os.getenv("PROMPT_PROFILE_MAX_TOKENS", "1000"))
+PROMPT_REVIEW_MAX_TOKENS = int(os.getenv("PROMPT_REVIEW_MAX_TOKENS", "1000"))
+
+# Per-reply token usage recording
+USAGE_FLUSH_INTERVAL = float(os.getenv("USAGE_FLUSH_INTERVAL", "5"))
+USAGE_BUFFER_MAX = int(os.getenv("USAGE_BUFFER_MAX", "10000"))
+
+# Coalescing of concurrent identical reply generations
+SINGLE_FLIGHT_CROSS_PROCESS = os.getenv("SINGLE_FLIGHT_CROSS_PROCESS", "true").lower() == "true"
+SINGLE_FLIGHT_WAIT_SECONDS = float(os.getenv("SINGLE_FLIGHT_WAIT_SECONDS", "120"))
+SINGLE_FLIGHT_POLL_INTERVAL = float(os.getenv("SINGLE_FLIGHT_POLL_INTERVAL", "0.25"))
+
+# Reply cache
+REPLY_CACHE_MAX_ENTRIES = int(os.getenv("REPLY_CACHE_MAX_ENTRIES", "10000"))
+REPLY_CACHE_MAX_BYTES = int(os.getenv("REPLY_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+REPLY_CACHE_TTL_SECONDS = float(os.getenv("REPLY_CACHE_TTL_SECONDS", "86400"))
+REPLY_CACHE_PERSISTENT = os.getenv("REPLY_CACHE_PERSISTENT", "false").lower() == "true"
+REPLY_CACHE_PRUNE_INTERVAL_SECONDS = float(os.getenv("REPLY_CACHE_PRUNE_INTERVAL_SECONDS", "600"))
+REPLY_CACHE_PRUNE_BATCH_SIZE = int(os.getenv("REPLY_CACHE_PRUNE_BATCH_SIZE", "5000"))
+
+# Review listing pagination
+REVIEWS_PAGE_SIZE = int(os.getenv("REVIEWS_PAGE_SIZE", "50"))
+REVIEWS_PAGE_SIZE_MAX = int(os.getenv("REVIEWS_PAGE_SIZE_MAX", "500"))
+
+# Review export
+REVIEWS_EXPORT_BATCH_SIZE = int(os.getenv("REVIEWS_EXPORT_BATCH_SIZE", "500"))
+
+# Bulk review ingestion: rows per COPY into the staging table
+INGEST_COPY_BATCH_SIZE = int(os.getenv("INGEST_COPY_BATCH_SIZE", "5000"))
+
+# Profile cache
+PROFILE_CACHE_TTL_SECONDS = float(os.getenv("PROFILE_CACHE_TTL_SECONDS", "300"))
+PROFILE_CACHE_CHANNEL = os.getenv("PROFILE_CACHE_CHANNEL", "profile_changes")
+
+# Reply-generation job queue
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_BATCH_SIZE = int(os.getenv("JOB_BATCH_SIZE", "8"))
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "300"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1"))
+JOB_MAX_ITEMS = int(os.getenv("JOB_MAX_ITEMS", "10000"))
+
+# Automatic replies to new reviews of businesses with a default profile
+AUTO_REPLY_ENABLED = os.getenv("AUTO_REPLY_ENABLED", "true").lower() == "true"
+AUTO_REPLY_WINDOW_SECONDS = float(os.getenv("AUTO_REPLY_WINDOW_SECONDS", "2"))
+AUTO_REPLY_BATCH_SIZE = int(os.getenv("AUTO_REPLY_BATCH_SIZE", "50"))
+AUTO_REPLY_CONCURRENCY = int(os.getenv("AUTO_REPLY_CONCURRENCY", "8"))
+AUTO_REPLY_MAX_PER_MINUTE = float(os.getenv("AUTO_REPLY_MAX_PER_MINUTE", "120"))
+AUTO_REPLY_POLL_SECONDS = float(os.getenv("AUTO_REPLY_POLL_SECONDS", "60"))
+AUTO_REPLY_MAX_ATTEMPTS = int(os.getenv("AUTO_REPLY_MAX_ATTEMPTS", "5"))
+AUTO_REPLY_RETRY_SECONDS = float(os.getenv("AUTO_REPLY_RETRY_SECONDS", "60"))
+
+# Per-tenant rate limits on /message endpoints: replies requested and
+# OpenAI tokens used per minute, with bursts up to the given sizes.
+# RATE_LIMIT_SHARED keeps the buckets in Postgres so all workers share them.
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+RATE_LIMIT_REQUESTS_PER_MINUTE = float(os.getenv("RATE_LIMIT_REQUESTS_PER_MINUTE", "60"))
+RATE_LIMIT_REQUEST_BURST = float(os.getenv("RATE_LIMIT_REQUEST_BURST", "100"))
+RATE_LIMIT_TOKENS_PER_MINUTE = float(os.getenv("RATE_LIMIT_TOKENS_PER_MINUTE", "60000"))
+RATE_LIMIT_TOKEN_BURST = float(os.getenv("RATE_LIMIT_TOKEN_BURST", "100000"))
+RATE_LIMIT_SHARED = os.getenv("RATE_LIMIT_SHARED", "false").lower() == "true"
+RATE_LIMIT_MAX_TENANTS = int(os.getenv("RATE_LIMIT_MAX_TENANTS", "10000"))
+
+# Logging goes through a bounded queue to a thread writing JSON lines to
+# a rotating file and the console. LOG_SAMPLE_RATES keeps a fraction of the
+# INFO records of busy loggers, e.g. "src.routes.reviews=0.1".
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+LOG_DIRECTORY = os.getenv("LOG_DIRECTORY", "logs")
+LOG_FILE = os.getenv("LOG_FILE", "app.log")
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "5"))
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+LOG_FLUSH_TIMEOUT_SECONDS = float(os.getenv("LOG_FLUSH_TIMEOUT_SECONDS", "5"))
+LOG_SAMPLE_RATES = os.getenv("LOG_SAMPLE_RATES", "src.routes.reviews=0.1,src.routes.message=0.1")
+
+# Schema migrations
+MIGRATE_ON_STARTUP = os.getenv("MIGRATE_ON_STARTUP", "true").lower() == "true"
@@ -1,49 +1,653 @@
-import os
 import asyncpg
-from dotenv import load_dotenv
 import logging
+from . import metrics
+from .config import (
+    DB_HOST,
+    DB_PORT,
+    DB_NAME,
+    DB_USER,
+    DB_PASSWORD,
+    DB_POOL_MIN_SIZE,
+    DB_POOL_MAX_SIZE,
+    DB_POOL_MAX_QUERIES,
+    DB_POOL_MAX_INACTIVE_LIFETIME,
+    DB_COMMAND_TIMEOUT,
+    DB_STATEMENT_CACHE_SIZE,
+    DB_CONNECTION_BUDGET,
+    WEB_CONCURRENCY,
+    SINGLE_FLIGHT_CROSS_PROCESS,
+    AUTO_REPLY_ENABLED,
+)
 
 # Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Load environment variables
-load_dotenv()
-
 # Database configuration
 DB_CONFIG = {
-    "host": os.getenv("DB_HOST", "localhost"),
-    "port": int(os.getenv("DB_PORT", "5432")),
-    "user": os.getenv("DB_USER", "reviewsuser"),
-    "password": os.getenv("DB_PASSWORD", "reviewspass"),
-    "database": os.getenv("DB_NAME", "googlemaps"),
-    "command_timeout": 60
+    "host": DB_HOST,
+    "port": DB_PORT,
+    "user": DB_USER,
+    "password": DB_PASSWORD,
+    "database": DB_NAME,
+    "command_timeout": DB_COMMAND_TIMEOUT,
+    "statement_cache_size": DB_STATEMENT_CACHE_SIZE
+}
+
+def dedicated_connections() -> int:
+    """
+    Connections each worker opens outside its pool: the profile cache
+    listener, plus the advisory lock and auto-reply connections when enabled.
+    """
+    return 1 + int(SINGLE_FLIGHT_CROSS_PROCESS) + int(AUTO_REPLY_ENABLED)
+
+def pool_max_size(budget: int, workers: int, dedicated: int, max_size: int) -> int:
+    """
+    Largest pool each of `workers` processes may open so that together,
+    with their dedicated connections, they stay within `budget`
+    connections. A budget of 0 means no budget.
+    """
+    if budget <= 0:
+        return max_size
+    share = budget // max(workers, 1) - dedicated
+    if share < 1:
+        raise ValueError(
+            f"DB_CONNECTION_BUDGET={budget} leaves no pool connections for {workers} workers "
+            f"with {dedicated} dedicated connections each"
+        )
+    return min(max_size, share)
+
+_pool_max_size = pool_max_size(DB_CONNECTION_BUDGET, WEB_CONCURRENCY, dedicated_connections(), DB_POOL_MAX_SIZE)
+
+# Pool sizing and connection lifetimes
+POOL_CONFIG = {
+    "min_size": min(DB_POOL_MIN_SIZE, _pool_max_size),
+    "max_size": _pool_max_size,
+    "max_queries": DB_POOL_MAX_QUERIES,
+    "max_inactive_connection_lifetime": DB_POOL_MAX_INACTIVE_LIFETIME
 }
 
 # Database connection pool
 db_pool = None
 
+# ---------------------------------------------------------------------------
+# Queries
+#
+# Every query below is a constant string, so asyncpg's per-connection
+# statement cache parses and plans it once per connection and reuses it.
+# The statements in HOT_STATEMENTS are also prepared when a pool
+# connection is opened, so one that no longer matches the schema is
+# reported at startup rather than on its first request.
+# ---------------------------------------------------------------------------
+
+# Columns of a full profile, including its model settings
+PROFILE_COLUMNS = """
+    id, profile_name, profile_text_base, profile_text_addon,
+    model, cheap_model, fallback_model, temperature, max_tokens
+"""
+
+PROFILE_BY_ID = f"""
+    SELECT {PROFILE_COLUMNS}
+    FROM profiles
+    WHERE id = $1
+"""
+
+PROFILE_LISTING = """
+    SELECT id, profile_name, profile_text_addon
+    FROM profiles
+    ORDER BY id
+"""
+
+PROFILE_INSERT = f"""
+    INSERT INTO profiles (profile_name, profile_text_base, profile_text_addon,
+                          model, cheap_model, fallback_model, temperature, max_tokens)
+    VALUES ($1, $2, $3, $4, $5, $6, $7, $8)
+    RETURNING {PROFILE_COLUMNS}
+"""
+
+# NULL parameters keep the current value
+PROFILE_UPDATE = f"""
+    UPDATE profiles
+    SET profile_name = COALESCE($2, profile_name),
+        profile_text_addon = COALESCE($3, profile_text_addon),
+        model = COALESCE($4, model),
+        cheap_model = COALESCE($5, cheap_model),
+        fallback_model = COALESCE($6, fallback_model),
+        temperature = COALESCE($7, temperature),
+        max_tokens = COALESCE($8, max_tokens)
+    WHERE id = $1
+    RETURNING {PROFILE_COLUMNS}
+"""
+
+PROFILE_DELETE = """
+    DELETE FROM profiles WHERE id = $1 RETURNING id
+"""
+
+NOTIFY = "SELECT pg_notify($1, $2)"
+
+REVIEW_FOR_REPLY = """
+    SELECT review_text as message, author_title as username, review_rating as rating
+    FROM reviews
+    WHERE review_id = $1
+"""
+
+# Filter for reviews without a reply: none imported with the review and no
+# published version in review_replies. unreplied_reviews is maintained by
+# triggers (migration 0015). Used in queries over `reviews`.
+UNREPLIED = "EXISTS (SELECT 1 FROM unreplied_reviews u WHERE u.review_id = reviews.review_id)"
+
+REVIEWS_FOR_REPLY_BY_IDS = f"""
+    SELECT review_id, review_text as message, author_title as username, review_rating as rating
+    FROM reviews
+    WHERE review_id = ANY($1::text[])
+      AND (NOT $2 OR {UNREPLIED})
+"""
+
+REVIEWS_FOR_REPLY_BY_BUSINESS = f"""
+    SELECT review_id, review_text as message, author_title as username, review_rating as rating
+    FROM reviews
+    WHERE business_place_id = $1
+      AND (NOT $2 OR {UNREPLIED})
+    ORDER BY review_datetime_utc DESC
+    LIMIT $3
+"""
+
+# The current reply of a review: its newest published version, found
+# through review_replies_current_idx, else the imported reply. An empty
+# imported reply counts as none, as in UNREPLIED.
+CURRENT_REPLY = """coalesce(
+        (
+            SELECT v.reply FROM review_replies v
+            WHERE v.review_id = reviews.review_id AND v.status = 'published'
+            ORDER BY v.id DESC
+            LIMIT 1
+        ),
+        nullif(reviews.replies, '')
+    )"""
+
+# The current reply with the id of the newest published version, which
+# changes on every new version even when the text does not
+REPLY_FOR_REVIEW = f"""
+    SELECT
+        (
+            SELECT max(v.id) FROM review_replies v
+            WHERE v.review_id = reviews.review_id AND v.status = 'published'
+        ) AS version_id,
+        {CURRENT_REPLY} AS reply
+    FROM reviews
+    WHERE review_id = $1
+"""
+
+TRY_ADVISORY_LOCK = "SELECT pg_try_advisory_lock($1)"
+
+ADVISORY_UNLOCK = "SELECT pg_advisory_unlock($1)"
+
+# Append reply versions: (review_id, profile_id, model, prompt_tokens,
+# completion_tokens, latency_ms, reply) columns, one array each
+REPLY_VERSIONS_INSERT = """
+    INSERT INTO review_replies (review_id, profile_id, model, prompt_tokens, completion_tokens, latency_ms, reply)
+    SELECT * FROM unnest($1::text[], $2::int[], $3::text[], $4::int[], $5::int[], $6::float8[], $7::text[])
+"""
+
+# Columns of a review as returned by the listing and export endpoints
+REVIEW_COLUMNS = f"""
+    id,
+    review_id,
+    author_title as username,
+    review_rating as rating,
+    review_datetime_utc as timestamp,
+    review_text,
+    business_place_id,
+    author_reviews_count as n_review_user,
+    {CURRENT_REPLY} as replies,
+    review_timestamp,
+    author_link as url_user
+"""
+
+BUSINESS_STATS = """
+    SELECT
+        business_place_id,
+        review_count,
+        rating_sum,
+        rating_1,
+        rating_2,
+        rating_3,
+        rating_4,
+        rating_5,
+        replied_count,
+        last_review_at
+    FROM business_review_stats
+    WHERE business_place_id = ANY($1::text[])
+"""
+
+# Columns loaded by bulk ingestion, in COPY order
+INGEST_COLUMNS = (
+    "line",
+    "review_id",
+    "business_place_id",
+    "author_title",
+    "author_link",
+    "author_reviews_count",
+    "review_rating",
+    "review_text",
+    "review_datetime_utc",
+    "review_timestamp",
+    "replies",
+)
+
+# Dropped with the ingestion transaction; temporary tables skip the WAL
+INGEST_STAGING_CREATE = """
+    CREATE TEMP TABLE review_staging (
+        line BIGINT NOT NULL,
+        review_id TEXT NOT NULL,
+        business_place_id TEXT NOT NULL,
+        author_title TEXT,
+        author_link TEXT,
+        author_reviews_count INTEGER,
+        review_rating DOUBLE PRECISION NOT NULL,
+        review_text TEXT,
+        review_datetime_utc TIMESTAMP,
+        review_timestamp BIGINT,
+        replies TEXT
+    ) ON COMMIT DROP
+"""
+
+# Tells the stats trigger to skip rows written by this transaction
+INGEST_BULK_MODE = "SELECT set_config('app.bulk_ingest', 'on', true)"
+
+# Businesses whose statistics an ingestion changes: those of the staged
+# rows and those the updated rows are moving away from
+INGEST_AFFECTED_BUSINESSES = """
+    SELECT business_place_id FROM review_staging
+    UNION
+    SELECT r.business_place_id
+    FROM reviews r
+    JOIN review_staging s USING (review_id)
+"""
+
+# The last staged row per review_id wins. Existing replies are kept, and
+# rows identical to the stored review are skipped.
+INGEST_UPSERT = """
+    WITH latest AS (
+        SELECT DISTINCT ON (review_id) *
+        FROM review_staging
+        ORDER BY review_id, line DESC
+    ),
+    upserted AS (
+        INSERT INTO reviews AS r (
+            review_id, business_place_id, author_title, author_link, author_reviews_count,
+            review_rating, review_text, review_datetime_utc, review_timestamp, replies
+        )
+        SELECT
+            review_id, business_place_id, coalesce(author_title, ''), author_link,
+            coalesce(author_reviews_count, 0), review_rating, review_text,
+            review_datetime_utc, review_timestamp, replies
+        FROM latest
+        ON CONFLICT (review_id) DO UPDATE SET
+            business_place_id = EXCLUDED.business_place_id,
+            author_title = EXCLUDED.author_title,
+            author_link = EXCLUDED.author_link,
+            author_reviews_count = EXCLUDED.author_reviews_count,
+            review_rating = EXCLUDED.review_rating,
+            review_text = EXCLUDED.review_text,
+            review_datetime_utc = EXCLUDED.review_datetime_utc,
+            review_timestamp = EXCLUDED.review_timestamp,
+            replies = coalesce(nullif(r.replies, ''), EXCLUDED.replies)
+        WHERE (
+            r.business_place_id, r.author_title, r.author_link, r.author_reviews_count,
+            r.review_rating, r.review_text, r.review_datetime_utc, r.review_timestamp
+        ) IS DISTINCT FROM (
+            EXCLUDED.business_place_id, EXCLUDED.author_title, EXCLUDED.author_link, EXCLUDED.author_reviews_count,
+            EXCLUDED.review_rating, EXCLUDED.review_text, EXCLUDED.review_datetime_utc, EXCLUDED.review_timestamp
+        )
+        OR (coalesce(r.replies, '') = '' AND coalesce(EXCLUDED.replies, '') <> '')
+        RETURNING (xmax = 0) AS inserted
+    )
+    SELECT
+        count(*) FILTER (WHERE inserted) AS inserted,
+        count(*) FILTER (WHERE NOT inserted) AS updated
+    FROM upserted
+"""
+
+# Serializes with the stats triggers of concurrent writers, which hold the
+# same lock shared (see 0016) and apply their changes on top of the
+# recomputed values. Taken before the upsert, in a fixed order, so it also
+# covers businesses without a statistics row yet.
+BUSINESS_STATS_LOCK = """
+    SELECT pg_advisory_xact_lock(hashtext('business_review_stats'), hashtext(b.business_place_id))
+    FROM (
+        SELECT DISTINCT business_place_id
+        FROM unnest($1::text[]) AS u(business_place_id)
+        ORDER BY business_place_id
+    ) b
+"""
+
+BUSINESS_STATS_RECOMPUTE = """
+    INSERT INTO business_review_stats AS s (
+        business_place_id, review_count, rating_sum,
+        rating_1, rating_2, rating_3, rating_4, rating_5,
+        replied_count, last_review_at
+    )
+    SELECT
+        b.business_place_id,
+        count(r.id),
+        coalesce(sum(r.review_rating), 0)::double precision,
+        count(*) FILTER (WHERE round(r.review_rating) = 1),
+        count(*) FILTER (WHERE round(r.review_rating) = 2),
+        count(*) FILTER (WHERE round(r.review_rating) = 3),
+        count(*) FILTER (WHERE round(r.review_rating) = 4),
+        count(*) FILTER (WHERE round(r.review_rating) = 5),
+        count(*) FILTER (WHERE review_has_reply(r.review_id, r.replies)),
+        max(r.review_datetime_utc)
+    FROM unnest($1::text[]) AS b(business_place_id)
+    LEFT JOIN reviews r USING (business_place_id)
+    GROUP BY b.business_place_id
+    ON CONFLICT (business_place_id) DO UPDATE SET
+        review_count = EXCLUDED.review_count,
+        rating_sum = EXCLUDED.rating_sum,
+        rating_1 = EXCLUDED.rating_1,
+        rating_2 = EXCLUDED.rating_2,
+        rating_3 = EXCLUDED.rating_3,
+        rating_4 = EXCLUDED.rating_4,
+        rating_5 = EXCLUDED.rating_5,
+        replied_count = EXCLUDED.replied_count,
+        last_review_at = EXCLUDED.last_review_at,
+        updated_at = now()
+"""
+
+CACHED_REPLY = """
+    SELECT reply
+    FROM reply_cache
+    WHERE cache_key = $1
+      AND created_at > now() - make_interval(secs => $2)
+"""
+
+CACHED_REPLY_UPSERT = """
+    INSERT INTO reply_cache (cache_key, reply, created_at)
+    VALUES ($1, $2, now())
+    ON CONFLICT (cache_key)
+    DO UPDATE SET reply = EXCLUDED.reply, created_at = EXCLUDED.created_at
+"""
+
+# Delete up to $2 entries older than the TTL ($1 seconds), which
+# CACHED_REPLY no longer returns
+REPLY_CACHE_PRUNE = """
+    DELETE FROM reply_cache
+    WHERE cache_key IN (
+        SELECT cache_key FROM reply_cache
+        WHERE created_at <= now() - make_interval(secs => $1)
+        LIMIT $2
+    )
+"""
+
+JOB_INSERT = """
+    INSERT INTO reply_jobs (profile_id)
+    VALUES ($1)
+    RETURNING id
+"""
+
+JOB_ITEMS_INSERT_BY_IDS = """
+    INSERT INTO reply_job_items (job_id, profile_id, message_id, bypass_cache)
+    SELECT $1, $2, message_id, $3
+    FROM unnest($4::text[]) AS message_id
+"""
+
+JOB_ITEMS_INSERT_BY_BUSINESS = f"""
+    INSERT INTO reply_job_items (job_id, profile_id, message_id, bypass_cache)
+    SELECT $1, $2, review_id, $3
+    FROM reviews
+    WHERE business_place_id = $4
+      AND (NOT $5 OR {UNREPLIED})
+    ORDER BY review_datetime_utc DESC
+    LIMIT $6
+"""
+
+# How many items JOB_ITEMS_INSERT_BY_BUSINESS would enqueue
+JOB_ITEMS_COUNT_BY_BUSINESS = f"""
+    SELECT count(*) FROM (
+        SELECT 1
+        FROM reviews
+        WHERE business_place_id = $1
+          AND (NOT $2 OR {UNREPLIED})
+        LIMIT $3
+    ) AS items
+"""
+
+# Claim queued items, or running items whose worker's lease ran out
+# (e.g. after a restart). SKIP LOCKED lets any number of workers, in any
+# number of processes, claim disjoint items without blocking each other.
+JOB_ITEMS_CLAIM = """
+    UPDATE reply_job_items
+    SET status = 'running',
+        attempts = attempts + 1,
+        lease_expires_at = now() + make_interval(secs => $2),
+        updated_at = now()
+    WHERE id IN (
+        SELECT id
+        FROM reply_job_items
+        WHERE (status = 'queued' AND (not_before IS NULL OR not_before <= now()))
+           OR (status = 'running' AND lease_expires_at < now())
+        ORDER BY id
+        LIMIT $1
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING id, job_id, profile_id, message_id, bypass_cache, attempts
+"""
+
+JOB_ITEM_SUCCEEDED = """
+    UPDATE reply_job_items
+    SET status = 'succeeded', response = $2, error = NULL, lease_expires_at = NULL, updated_at = now()
+    WHERE id = $1
+"""
+
+# Put a claimed item back without counting the attempt, until $2 seconds from now
+JOB_ITEM_DEFER = """
+    UPDATE reply_job_items
+    SET status = 'queued', attempts = attempts - 1, error = $3,
+        not_before = now() + make_interval(secs => $2), lease_expires_at = NULL, updated_at = now()
+    WHERE id = $1
+"""
+
+JOB_ITEM_FINISHED_WITH_ERROR = """
+    UPDATE reply_job_items
+    SET status = $2, error = $3, lease_expires_at = NULL, updated_at = now()
+    WHERE id = $1
+"""
+
+JOB_STATUS = """
+    SELECT
+        j.id,
+        j.profile_id,
+        j.created_at,
+        COUNT(i.id) as total,
+        COUNT(i.id) FILTER (WHERE i.status = 'queued') as queued,
+        COUNT(i.id) FILTER (WHERE i.status = 'running') as running,
+        COUNT(i.id) FILTER (WHERE i.status = 'succeeded') as succeeded,
+        COUNT(i.id) FILTER (WHERE i.status = 'failed') as failed
+    FROM reply_jobs j
+    LEFT JOIN reply_job_items i ON i.job_id = j.id
+    WHERE j.id = $1
+    GROUP BY j.id
+"""
+
+JOB_EXISTS = "SELECT 1 FROM reply_jobs WHERE id = $1"
+
+JOB_RESULTS = """
+    SELECT message_id, status, attempts, response, error
+    FROM reply_job_items
+    WHERE job_id = $1
+    ORDER BY id
+"""
+
+BUSINESS_REPLY_PROFILE_UPSERT = """
+    INSERT INTO business_reply_profiles (business_place_id, profile_id, enabled)
+    VALUES ($1, $2, $3)
+    ON CONFLICT (business_place_id) DO UPDATE SET
+        profile_id = EXCLUDED.profile_id,
+        enabled = EXCLUDED.enabled,
+        updated_at = now()
+    RETURNING business_place_id, profile_id, enabled
+"""
+
+BUSINESS_REPLY_PROFILE_DELETE = """
+    DELETE FROM business_reply_profiles WHERE business_place_id = $1 RETURNING business_place_id
+"""
+
+# Queued reviews due for an automatic reply, oldest first, while their
+# business still has auto-reply enabled and they have fewer than $2 attempts
+AUTO_REPLY_CANDIDATES = f"""
+    SELECT reviews.review_id, reviews.review_text as message, reviews.author_title as username,
+           reviews.review_rating as rating, d.profile_id
+    FROM auto_reply_queue q
+    JOIN reviews USING (review_id)
+    JOIN business_reply_profiles d USING (business_place_id)
+    WHERE q.next_attempt_at <= now()
+      AND q.attempts < $2
+      AND d.enabled
+      AND {UNREPLIED}
+    ORDER BY q.enqueued_at, q.review_id
+    LIMIT $1
+"""
+
+# Drop queued reviews answered some other way, deleted, or whose business
+# no longer has auto-reply
+AUTO_REPLY_QUEUE_PRUNE = f"""
+    DELETE FROM auto_reply_queue q
+    WHERE NOT EXISTS (
+        SELECT 1
+        FROM reviews
+        JOIN business_reply_profiles d USING (business_place_id)
+        WHERE reviews.review_id = q.review_id
+          AND d.enabled
+          AND {UNREPLIED}
+    )
+"""
+
+# Move queued reviews with $1 or more failed attempts to the dead letters
+AUTO_REPLY_QUEUE_DEAD_LETTER = """
+    WITH exhausted AS (
+        DELETE FROM auto_reply_queue
+        WHERE attempts >= $1
+        RETURNING review_id, attempts, error, enqueued_at
+    )
+    INSERT INTO auto_reply_dead_letters AS d (review_id, attempts, error, enqueued_at)
+    SELECT review_id, attempts, error, enqueued_at FROM exhausted
+    ON CONFLICT (review_id) DO UPDATE SET
+        attempts = EXCLUDED.attempts,
+        error = EXCLUDED.error,
+        enqueued_at = EXCLUDED.enqueued_at,
+        failed_at = now()
+    RETURNING d.review_id, d.error
+"""
+
+AUTO_REPLY_QUEUE_DELETE = "DELETE FROM auto_reply_queue WHERE review_id = ANY($1::text[])"
+
+# Count a failed attempt and retry after $3 seconds, doubling per attempt
+AUTO_REPLY_QUEUE_RETRY = """
+    UPDATE auto_reply_queue AS q
+    SET attempts = q.attempts + 1,
+        next_attempt_at = now() + make_interval(secs => $3 * 2 ^ q.attempts),
+        error = v.error
+    FROM unnest($1::text[], $2::text[]) AS v(review_id, error)
+    WHERE q.review_id = v.review_id
+"""
+
+# Like REPLY_VERSIONS_INSERT, but skips reviews answered meanwhile
+AUTO_REPLY_VERSIONS_INSERT = f"""
+    INSERT INTO review_replies (review_id, profile_id, model, prompt_tokens, completion_tokens, latency_ms, reply)
+    SELECT v.*
+    FROM unnest($1::text[], $2::int[], $3::text[], $4::int[], $5::int[], $6::float8[], $7::text[])
+        AS v(review_id, profile_id, model, prompt_tokens, completion_tokens, latency_ms, reply)
+    JOIN reviews USING (review_id)
+    WHERE {UNREPLIED}
+"""
+
+# Refill a token bucket for the time since its last update and take $5 from
+# it when at least $6 is left ($3 capacity, $4 refill per second). Returns
+# the new level and whether the cost was taken.
+RATE_LIMIT_TAKE = """
+    INSERT INTO rate_limit_buckets AS b (tenant, budget, level, granted, updated_at)
+    VALUES ($1, $2, $3::float8 - $5::float8, $3::float8 >= $6::float8, clock_timestamp())
+    ON CONFLICT (tenant, budget) DO UPDATE SET
+        granted = least($3, b.level + extract(epoch FROM clock_timestamp() - b.updated_at) * $4) >= $6,
+        level = least($3, b.level + extract(epoch FROM clock_timestamp() - b.updated_at) * $4)
+            - CASE WHEN least($3, b.level + extract(epoch FROM clock_timestamp() - b.updated_at) * $4) >= $6
+                   THEN $5 ELSE 0 END,
+        updated_at = clock_timestamp()
+    RETURNING level, granted
+"""
+
+REPLY_USAGE_BULK_INSERT = """
+    INSERT INTO reply_usage (profile_id, review_id, model, prompt_tokens, completion_tokens, latency_ms)
+    SELECT * FROM unnest($1::int[], $2::text[], $3::text[], $4::int[], $5::int[], $6::float8[])
+"""
+
+PROFILE_USAGE = """
+    SELECT
+        count(*) as replies,
+        coalesce(sum(prompt_tokens), 0) as prompt_tokens,
+        coalesce(sum(completion_tokens), 0) as completion_tokens,
+        avg(latency_ms) as average_latency_ms
+    FROM reply_usage
+    WHERE profile_id = $1
+      AND created_at > now() - make_interval(days => $2)
+"""
+
+# Statements prepared on every new pool connection: the ones on the reply
+# generation, listing and job worker hot paths
+HOT_STATEMENTS = [
+    PROFILE_BY_ID,
+    PROFILE_LISTING,
+    REVIEW_FOR_REPLY,
+    REVIEWS_FOR_REPLY_BY_IDS,
+    REPLY_FOR_REVIEW,
+    REPLY_VERSIONS_INSERT,
+    BUSINESS_STATS,
+    JOB_ITEMS_CLAIM,
+    JOB_ITEM_SUCCEEDED,
+    JOB_ITEM_FINISHED_WITH_ERROR,
+]
+
+# Per-query latency is labelled by the constant's name
+metrics.register_queries(globals())
+
+async def init_connection(connection):
+    """
+    Pool init hook: record query timings and prepare the hot statements
+    once per connection. Statements on tables, columns or functions that do
+    not exist yet (before migrations have run) are skipped.
+    """
+    connection.add_query_logger(metrics.record_query)
+    for query in HOT_STATEMENTS:
+        try:
+            await connection.prepare(query)
+        except asyncpg.SyntaxOrAccessError as e:
+            logger.warning(f"Skipping statement preparation: {str(e)}")
+
 async def init_db():
     global db_pool
     try:
         # Log the configuration (excluding password)
         safe_config = {k: v for k, v in DB_CONFIG.items() if k != 'password'}
-        logger.info(f"Initializing database connection pool with config: {safe_config}")
-        
+        logger.info(f"Initializing database connection pool with config: {safe_config}, pool: {POOL_CONFIG}")
+
         # Try to create the pool
-        pool = await asyncpg.create_pool(**DB_CONFIG)
-        
+        pool = await asyncpg.create_pool(
+            **DB_CONFIG,
+            **POOL_CONFIG,
+            init=init_connection
+        )
+
         if not pool:
             raise Exception("Failed to create database pool")
-            
+
         # Test the connection with a simple query
         async with pool.acquire() as conn:
             await conn.fetchval('SELECT 1')
-            
+
         logger.info("Database connection pool created and tested successfully")
         db_pool = pool  # Assign the pool to the global variable
         return db_pool
-        
+
     except asyncpg.PostgresError as e:
         logger.error(f"PostgreSQL error during connection: {str(e)}")
         db_pool = None  # Reset pool on error
@@ -53,9 +657,315 @@ async def init_db():
         db_pool = None  # Reset pool on error
         raise
 
+async def ping(connection) -> bool:
+    return await connection.fetchval("SELECT 1") == 1
+
 async def close_db():
     global db_pool
     if db_pool:
         await db_pool.close()
         db_pool = None  # Clear the pool reference
-        logger.info("Database connection pool closed") 
\ No newline at end of file
+        logger.info("Database connection pool closed")
+
+# ---------------------------------------------------------------------------
+# Profiles
+# ---------------------------------------------------------------------------
+
+async def fetch_profile(connection, profile_id: int) -> asyncpg.Record | None:
+    return await connection.fetchrow(PROFILE_BY_ID, profile_id)
+
+async def fetch_profiles(connection) -> list[asyncpg.Record]:
+    return await connection.fetch(PROFILE_LISTING)
+
+# Model settings columns, in statement parameter order
+MODEL_SETTINGS = ("model", "cheap_model", "fallback_model", "temperature", "max_tokens")
+
+async def insert_profile(connection, profile_name: str, profile_text_base: str, profile_text_addon: str,
+                         model_settings: dict | None = None) -> asyncpg.Record:
+    settings = model_settings or {}
+    return await connection.fetchrow(
+        PROFILE_INSERT, profile_name, profile_text_base, profile_text_addon,
+        *[settings.get(name) for name in MODEL_SETTINGS]
+    )
+
+async def update_profile(connection, profile_id: int, profile_name: str | None, profile_text_addon: str | None,
+                         model_settings: dict | None = None) -> asyncpg.Record | None:
+    """
+    Update the given fields of a profile; None leaves a field unchanged.
+    Returns the updated profile, or None if it does not exist.
+    """
+    settings = model_settings or {}
+    return await connection.fetchrow(
+        PROFILE_UPDATE, profile_id, profile_name, profile_text_addon,
+        *[settings.get(name) for name in MODEL_SETTINGS]
+    )
+
+async def delete_profile(connection, profile_id: int) -> bool:
+    """
+    Delete a profile. Returns False if it does not exist.
+    """
+    return await connection.fetchval(PROFILE_DELETE, profile_id) is not None
+
+async def notify(connection, channel: str, payload: str):
+    await connection.execute(NOTIFY, channel, payload)
+
+# ---------------------------------------------------------------------------
+# Reviews and replies
+# ---------------------------------------------------------------------------
+
+async def fetch_review_for_reply(connection, review_id: str) -> asyncpg.Record | None:
+    return await connection.fetchrow(REVIEW_FOR_REPLY, review_id)
+
+async def fetch_reviews_for_reply_by_ids(connection, review_ids: list[str], only_unreplied: bool) -> list[asyncpg.Record]:
+    return await connection.fetch(REVIEWS_FOR_REPLY_BY_IDS, review_ids, only_unreplied)
+
+async def fetch_reviews_for_reply_by_business(connection, business_place_id: str, only_unreplied: bool, limit: int) -> list[asyncpg.Record]:
+    return await connection.fetch(REVIEWS_FOR_REPLY_BY_BUSINESS, business_place_id, only_unreplied, limit)
+
+async def fetch_reply(connection, review_id: str) -> asyncpg.Record | None:
+    """
+    Fetch the current reply of a review and its version_id (None for an
+    imported reply or none at all).
+    """
+    return await connection.fetchrow(REPLY_FOR_REVIEW, review_id)
+
+async def save_replies(connection, versions: list[tuple]):
+    """
+    Append (review_id, profile_id, model, prompt_tokens, completion_tokens,
+    latency_ms, reply) versions to review_replies with a single INSERT.
+    Each becomes the current reply of its review.
+    """
+    columns = [list(column) for column in zip(*versions)]
+    await connection.execute(REPLY_VERSIONS_INSERT, *columns)
+
+def review_page_query(clauses: list[str], limit_param: int) -> str:
+    """
+    Build the listing query for one business: the reviews matching the
+    filter clauses (the first parameter is the business place ID), limited
+    by parameter $limit_param and joined with the business-wide statistics
+    from business_review_stats. A single row of statistics with NULL review
+    columns is returned when nothing matches.
+    """
+    return f"""
+        WITH stats AS (
+            SELECT
+                coalesce(s.review_count, 0) as total_reviews,
+                s.rating_sum / nullif(s.review_count, 0) as average_rating,
+                coalesce(s.replied_count, 0) as replied_reviews,
+                coalesce(s.rating_1, 0) as rating_1,
+                coalesce(s.rating_2, 0) as rating_2,
+                coalesce(s.rating_3, 0) as rating_3,
+                coalesce(s.rating_4, 0) as rating_4,
+                coalesce(s.rating_5, 0) as rating_5
+            FROM (SELECT $1::text as business_place_id) b
+            LEFT JOIN business_review_stats s USING (business_place_id)
+        ),
+        page AS (
+            SELECT {REVIEW_COLUMNS}
+            FROM reviews
+            WHERE {' AND '.join(clauses)}
+            ORDER BY review_datetime_utc DESC NULLS LAST, id DESC
+            LIMIT ${limit_param}
+        )
+        SELECT stats.*, page.*
+        FROM stats
+        LEFT JOIN page ON true
+        ORDER BY page.timestamp DESC NULLS LAST, page.id DESC
+    """
+
+async def fetch_review_page(connection, clauses: list[str], params: list, limit: int) -> list[asyncpg.Record]:
+    """
+    Fetch up to `limit` reviews of one business with its statistics;
+    see review_page_query.
+    """
+    params = [*params, limit]
+    return await connection.fetch(review_page_query(clauses, len(params)), *params)
+
+async def open_review_export_cursor(connection, clauses: list[str], params: list):
+    """
+    Open a server-side cursor over the reviews matching the filter clauses.
+    Must be called inside a transaction.
+    """
+    query = f"""
+        SELECT {REVIEW_COLUMNS}
+        FROM reviews
+        WHERE {' AND '.join(clauses)}
+        ORDER BY business_place_id, review_datetime_utc DESC NULLS LAST, id DESC
+    """
+    return await connection.cursor(query, *params)
+
+async def fetch_business_stats(connection, business_place_ids: list[str]) -> list[asyncpg.Record]:
+    return await connection.fetch(BUSINESS_STATS, business_place_ids)
+
+# ---------------------------------------------------------------------------
+# Bulk ingestion
+# ---------------------------------------------------------------------------
+
+async def create_ingest_staging(connection):
+    """
+    Create the staging table and switch the stats trigger off for the
+    current transaction.
+    """
+    await connection.execute(INGEST_STAGING_CREATE)
+    await connection.execute(INGEST_BULK_MODE)
+
+async def copy_ingest_rows(connection, records: list[tuple]):
+    """
+    COPY rows, in INGEST_COLUMNS order, into the staging table.
+    """
+    await connection.copy_records_to_table("review_staging", records=records, columns=INGEST_COLUMNS)
+
+async def merge_ingest_staging(connection) -> tuple[int, int]:
+    """
+    Upsert the staged rows into reviews and recompute the statistics of
+    the businesses involved. Returns the inserted and updated counts.
+    """
+    affected = [row['business_place_id'] for row in await connection.fetch(INGEST_AFFECTED_BUSINESSES)]
+    await connection.execute(BUSINESS_STATS_LOCK, affected)
+    result = await connection.fetchrow(INGEST_UPSERT)
+    await connection.execute(BUSINESS_STATS_RECOMPUTE, affected)
+    return result['inserted'], result['updated']
+
+# ---------------------------------------------------------------------------
+# Reply cache
+# ---------------------------------------------------------------------------
+
+async def fetch_cached_reply(connection, cache_key: str, ttl_seconds: float) -> str | None:
+    return await connection.fetchval(CACHED_REPLY, cache_key, ttl_seconds)
+
+async def store_cached_reply(connection, cache_key: str, reply: str):
+    await connection.execute(CACHED_REPLY_UPSERT, cache_key, reply)
+
+async def prune_cached_replies(connection, ttl_seconds: float, limit: int) -> int:
+    return _row_count(await connection.execute(REPLY_CACHE_PRUNE, ttl_seconds, limit))
+
+# ---------------------------------------------------------------------------
+# Reply jobs
+# ---------------------------------------------------------------------------
+
+def _row_count(status: str) -> int:
+    # Command status strings look like "INSERT 0 42"
+    return int(status.split()[-1])
+
+async def create_job(connection, profile_id: int) -> int:
+    return await connection.fetchval(JOB_INSERT, profile_id)
+
+async def enqueue_job_items_by_ids(connection, job_id: int, profile_id: int, bypass_cache: bool, message_ids: list[str]) -> int:
+    return _row_count(await connection.execute(JOB_ITEMS_INSERT_BY_IDS, job_id, profile_id, bypass_cache, message_ids))
+
+async def enqueue_job_items_by_business(connection, job_id: int, profile_id: int, bypass_cache: bool,
+                                        business_place_id: str, only_unreplied: bool, limit: int) -> int:
+    return _row_count(await connection.execute(
+        JOB_ITEMS_INSERT_BY_BUSINESS, job_id, profile_id, bypass_cache, business_place_id, only_unreplied, limit
+    ))
+
+async def count_job_items_by_business(connection, business_place_id: str, only_unreplied: bool, limit: int) -> int:
+    return await connection.fetchval(JOB_ITEMS_COUNT_BY_BUSINESS, business_place_id, only_unreplied, limit)
+
+async def claim_job_items(connection, limit: int, lease_seconds: float) -> list[asyncpg.Record]:
+    return await connection.fetch(JOB_ITEMS_CLAIM, limit, lease_seconds)
+
+async def mark_job_item_succeeded(connection, item_id: int, response: str):
+    await connection.execute(JOB_ITEM_SUCCEEDED, item_id, response)
+
+async def defer_job_item(connection, item_id: int, delay_seconds: float, reason: str):
+    await connection.execute(JOB_ITEM_DEFER, item_id, delay_seconds, reason)
+
+async def mark_job_item_error(connection, item_id: int, status: str, error: str):
+    """
+    Record a failed attempt; status is 'queued' to retry or 'failed'.
+    """
+    await connection.execute(JOB_ITEM_FINISHED_WITH_ERROR, item_id, status, error)
+
+async def fetch_job_status(connection, job_id: int) -> asyncpg.Record | None:
+    return await connection.fetchrow(JOB_STATUS, job_id)
+
+async def fetch_job_results(connection, job_id: int) -> list[asyncpg.Record] | None:
+    """
+    Return the items of a job, or None if the job does not exist.
+    """
+    if await connection.fetchval(JOB_EXISTS, job_id) is None:
+        return None
+    return await connection.fetch(JOB_RESULTS, job_id)
+
+# ---------------------------------------------------------------------------
+# Advisory locks
+# ---------------------------------------------------------------------------
+
+async def try_advisory_lock(connection, key: int) -> bool:
+    """
+    Take a session-level advisory lock without waiting.
+    """
+    return await connection.fetchval(TRY_ADVISORY_LOCK, key)
+
+async def advisory_unlock(connection, key: int):
+    await connection.fetchval(ADVISORY_UNLOCK, key)
+
+# ---------------------------------------------------------------------------
+# Automatic replies
+# ---------------------------------------------------------------------------
+
+async def set_business_reply_profile(connection, business_place_id: str, profile_id: int, enabled: bool) -> asyncpg.Record:
+    return await connection.fetchrow(BUSINESS_REPLY_PROFILE_UPSERT, business_place_id, profile_id, enabled)
+
+async def delete_business_reply_profile(connection, business_place_id: str) -> bool:
+    return await connection.fetchval(BUSINESS_REPLY_PROFILE_DELETE, business_place_id) is not None
+
+async def fetch_auto_reply_candidates(connection, limit: int, max_attempts: int) -> list[asyncpg.Record]:
+    return await connection.fetch(AUTO_REPLY_CANDIDATES, limit, max_attempts)
+
+async def prune_auto_reply_queue(connection) -> int:
+    return _row_count(await connection.execute(AUTO_REPLY_QUEUE_PRUNE))
+
+async def dead_letter_auto_replies(connection, max_attempts: int) -> list[asyncpg.Record]:
+    """
+    Move queued reviews that used up their attempts to
+    auto_reply_dead_letters; returns their ids and last errors.
+    """
+    return await connection.fetch(AUTO_REPLY_QUEUE_DEAD_LETTER, max_attempts)
+
+async def dequeue_auto_replies(connection, review_ids: list[str]):
+    await connection.execute(AUTO_REPLY_QUEUE_DELETE, review_ids)
+
+async def retry_auto_replies(connection, review_ids: list[str], errors: list[str], retry_seconds: float):
+    """
+    Record failed attempts; each review is retried after retry_seconds,
+    doubled for every earlier attempt.
+    """
+    await connection.execute(AUTO_REPLY_QUEUE_RETRY, review_ids, errors, retry_seconds)
+
+async def save_auto_replies(connection, versions: list[tuple]) -> int:
+    """
+    Save reply versions (as for save_replies) of reviews that are still
+    unanswered; returns how many were saved.
+    """
+    columns = [list(column) for column in zip(*versions)]
+    return _row_count(await connection.execute(AUTO_REPLY_VERSIONS_INSERT, *columns))
+
+# ---------------------------------------------------------------------------
+# Rate limits
+# ---------------------------------------------------------------------------
+
+async def take_rate_limit(connection, tenant: str, budget: str, capacity: float, rate: float,
+                          cost: float, required: float) -> tuple[float, bool]:
+    """
+    Take `cost` from a shared token bucket if at least `required` is left.
+    Returns the bucket level afterwards and whether the cost was taken.
+    """
+    row = await connection.fetchrow(RATE_LIMIT_TAKE, tenant, budget, capacity, rate, cost, required)
+    return row['level'], row['granted']
+
+# ---------------------------------------------------------------------------
+# Reply token usage
+# ---------------------------------------------------------------------------
+
+async def insert_reply_usage(connection, rows: list[tuple]):
+    """
+    Insert (profile_id, review_id, model, prompt_tokens, completion_tokens,
+    latency_ms) rows with a single statement.
+    """
+    columns = [list(column) for column in zip(*rows)]
+    await connection.execute(REPLY_USAGE_BULK_INSERT, *columns)
+
+async def fetch_profile_usage(connection, profile_id: int, days: int) -> asyncpg.Record:
+    return await connection.fetchrow(PROFILE_USAGE, profile_id, days)
@@ -0,0 +1,231 @@
+"""
+Bulk review ingestion for scraped data.
+
+Review batches arrive as NDJSON or CSV with the columns of the reviews
+table (see database.INGEST_COLUMNS). Rows are parsed as the data streams
+in, COPY'd into a temporary staging table and merged into reviews with a
+single upsert on review_id. Existing replies are never overwritten. The
+whole import runs in one transaction. Also available from the command line:
+
+    python -m src.ingest reviews.ndjson
+    python -m src.ingest --format csv reviews.csv.gz
+"""
+import argparse
+import asyncio
+import codecs
+import csv
+import gzip
+import io
+import json
+import logging
+import sys
+from datetime import datetime, timezone
+
+import asyncpg
+
+from . import database
+from .config import INGEST_COPY_BATCH_SIZE
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Errors reported back per import; the rest are only counted
+MAX_REPORTED_ERRORS = 20
+
+# Timestamp formats seen in scraper output besides ISO 8601
+DATETIME_FORMATS = ("%m/%d/%Y %H:%M:%S", "%Y-%m-%d %H:%M:%S")
+
+def parse_datetime(value) -> datetime | None:
+    if value in (None, ""):
+        return None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        for datetime_format in DATETIME_FORMATS:
+            try:
+                parsed = datetime.strptime(value, datetime_format)
+                break
+            except ValueError:
+                continue
+        else:
+            raise ValueError(f"unrecognised datetime {value!r}")
+    # Stored as naive UTC
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+def optional_int(value) -> int | None:
+    return None if value in (None, "") else int(float(value))
+
+def optional_str(value) -> str | None:
+    return None if value in (None, "") else str(value)
+
+def to_record(line: int, fields: dict) -> tuple:
+    """
+    Convert one parsed review to a staging record in INGEST_COLUMNS order.
+    Raises ValueError when a required field is missing or malformed.
+    """
+    review_id = optional_str(fields.get("review_id"))
+    business_place_id = optional_str(fields.get("business_place_id"))
+    rating = fields.get("review_rating")
+    if review_id is None or business_place_id is None or rating in (None, ""):
+        raise ValueError("review_id, business_place_id and review_rating are required")
+    return (
+        line,
+        review_id,
+        business_place_id,
+        optional_str(fields.get("author_title")),
+        optional_str(fields.get("author_link")),
+        optional_int(fields.get("author_reviews_count")),
+        float(rating),
+        optional_str(fields.get("review_text")),
+        parse_datetime(fields.get("review_datetime_utc")),
+        optional_int(fields.get("review_timestamp")),
+        optional_str(fields.get("replies")),
+    )
+
+def complete_csv_prefix(text: str) -> int:
+    """
+    Length of the longest prefix of text made of whole CSV records: up to
+    the last newline outside a quoted field, i.e. preceded by an even
+    number of quotes.
+    """
+    end = text.rfind("\n")
+    while end >= 0 and text.count('"', 0, end) % 2:
+        end = text.rfind("\n", 0, end)
+    return end + 1
+
+class ReviewParser:
+    """
+    Incremental NDJSON/CSV parser: feed() takes raw bytes as they arrive
+    and returns the records completed so far. Malformed rows are counted
+    as skipped rather than failing the import.
+    """
+
+    def __init__(self, ingest_format: str):
+        self.format = ingest_format
+        self.line = 0
+        self.skipped = 0
+        self.errors = []
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._pending = ""
+        self._header = None
+
+    def _reject(self, error: str):
+        self.skipped += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(f"row {self.line}: {error}")
+
+    def _parse_text(self, text: str) -> list[tuple]:
+        records = []
+        if self.format == "csv":
+            rows = csv.reader(io.StringIO(text))
+            for row in rows:
+                if self._header is None:
+                    self._header = row
+                    continue
+                self.line += 1
+                if not row:
+                    continue
+                try:
+                    records.append(to_record(self.line, dict(zip(self._header, row))))
+                except (ValueError, TypeError) as e:
+                    self._reject(str(e))
+        else:
+            for raw in text.splitlines():
+                self.line += 1
+                if not raw.strip():
+                    continue
+                try:
+                    fields = json.loads(raw)
+                    if not isinstance(fields, dict):
+                        raise ValueError("expected a JSON object")
+                    records.append(to_record(self.line, fields))
+                except (ValueError, TypeError) as e:
+                    self._reject(str(e))
+        return records
+
+    def feed(self, data: bytes) -> list[tuple]:
+        self._pending += self._decoder.decode(data)
+        if self.format == "csv":
+            end = complete_csv_prefix(self._pending)
+        else:
+            end = self._pending.rfind("\n") + 1
+        text, self._pending = self._pending[:end], self._pending[end:]
+        return self._parse_text(text)
+
+    def close(self) -> list[tuple]:
+        """
+        Parse whatever is left once the input has ended.
+        """
+        text = self._pending + self._decoder.decode(b"", final=True)
+        self._pending = ""
+        return self._parse_text(text)
+
+async def ingest_stream(db_pool, chunks, ingest_format: str) -> dict:
+    """
+    Ingest reviews from an async iterable of byte chunks. Returns the
+    number of rows received, inserted, updated and skipped (malformed,
+    duplicated within the import, or identical to the stored review),
+    with the first few parse errors.
+    """
+    parser = ReviewParser(ingest_format)
+    received = 0
+    async with db_pool.acquire() as connection:
+        async with connection.transaction():
+            await database.create_ingest_staging(connection)
+
+            batch = []
+            async for chunk in chunks:
+                batch.extend(parser.feed(chunk))
+                if len(batch) >= INGEST_COPY_BATCH_SIZE:
+                    await database.copy_ingest_rows(connection, batch)
+                    received += len(batch)
+                    batch = []
+            batch.extend(parser.close())
+            if batch:
+                await database.copy_ingest_rows(connection, batch)
+                received += len(batch)
+
+            inserted, updated = await database.merge_ingest_staging(connection)
+
+    received += parser.skipped
+    result = {
+        "received": received,
+        "inserted": inserted,
+        "updated": updated,
+        "skipped": received - inserted - updated,
+        "errors": parser.errors
+    }
+    logger.info(f"Ingested reviews: {result['inserted']} inserted, {result['updated']} updated, {result['skipped']} skipped")
+    return result
+
+async def read_file(path: str, chunk_size: int = 1 << 20):
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rb") as f:
+        while True:
+            chunk = await asyncio.to_thread(f.read, chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+async def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Bulk-load scraped reviews")
+    parser.add_argument("paths", nargs="+", help="NDJSON or CSV files, optionally gzipped")
+    parser.add_argument("--format", choices=["ndjson", "csv"], default=None,
+                        help="input format (default: from the file extension)")
+    args = parser.parse_args(argv)
+
+    pool = await asyncpg.create_pool(**database.DB_CONFIG, min_size=1, max_size=1)
+    try:
+        for path in args.paths:
+            ingest_format = args.format or ("csv" if ".csv" in path else "ndjson")
+            result = await ingest_stream(pool, read_file(path), ingest_format)
+            print(f"{path}: {json.dumps(result)}")
+    finally:
+        await pool.close()
+    return 0
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(asyncio.run(main()))
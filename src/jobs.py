@@ -0,0 +1,138 @@
+import asyncio
+import logging
+
+from fastapi import HTTPException
+
+from . import database
+from .config import (
+    JOB_WORKERS,
+    JOB_BATCH_SIZE,
+    JOB_LEASE_SECONDS,
+    JOB_MAX_ATTEMPTS,
+    JOB_POLL_INTERVAL,
+    RATE_LIMIT_ENABLED,
+)
+from .profile_cache import profile_cache
+from .ratelimit import RateLimitExceeded, current_tenant, rate_limiter, tenant_key
+from .routes.message import fetch_generation_inputs, generate_reply, save_reply
+from .usage import usage_recorder
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+async def process_item(db_pool, item) -> None:
+    """
+    Generate and save the reply for one claimed job item, then record
+    the outcome. Failed items are re-queued until JOB_MAX_ATTEMPTS. The
+    tokens used are charged to the profile's rate limit, like replies
+    generated through /message; while the profile is over its token budget
+    the item is deferred without counting the attempt.
+    """
+    if item['attempts'] > JOB_MAX_ATTEMPTS:
+        # Reclaimed after its lease expired once too often
+        async with db_pool.acquire() as connection:
+            await database.mark_job_item_error(connection, item['id'], "failed", "Lease expired")
+        return
+
+    if RATE_LIMIT_ENABLED:
+        tenant = tenant_key(item['profile_id'])
+        try:
+            await rate_limiter.check_tokens(db_pool, tenant)
+        except RateLimitExceeded as e:
+            logger.info(f"Deferring job item {item['id']} for {e.retry_after:.1f}s: {str(e)}")
+            async with db_pool.acquire() as connection:
+                await database.defer_job_item(connection, item['id'], e.retry_after, str(e))
+            return
+        current_tenant.set(tenant)
+    try:
+        system_message, message_content, settings = await fetch_generation_inputs(
+            db_pool, item['profile_id'], item['message_id']
+        )
+        reply = await generate_reply(
+            system_message, message_content, db_pool, item['bypass_cache'],
+            profile_id=item['profile_id'], message_id=item['message_id'], settings=settings
+        )
+        await save_reply(db_pool, item['message_id'], item['profile_id'], reply)
+    except Exception as e:
+        error = e.detail if isinstance(e, HTTPException) else str(e)
+        # Missing profiles or reviews will not appear on retry
+        retry = not (isinstance(e, HTTPException) and e.status_code == 404) and item['attempts'] < JOB_MAX_ATTEMPTS
+        logger.error(f"Job item {item['id']} failed (attempt {item['attempts']}): {error}")
+        async with db_pool.acquire() as connection:
+            await database.mark_job_item_error(connection, item['id'], "queued" if retry else "failed", error)
+        return
+
+    async with db_pool.acquire() as connection:
+        await database.mark_job_item_succeeded(connection, item['id'], reply.text)
+
+class JobWorkerPool:
+    """
+    A pool of async workers draining the reply_job_items queue.
+    """
+
+    def __init__(self, workers: int, batch_size: int, poll_interval: float):
+        self.workers = workers
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self._tasks = []
+
+    async def _work(self, db_pool, worker_number: int):
+        while True:
+            try:
+                async with db_pool.acquire() as connection:
+                    items = await database.claim_job_items(connection, self.batch_size, JOB_LEASE_SECONDS)
+            except Exception as e:
+                logger.error(f"Job worker {worker_number} could not claim items: {str(e)}")
+                items = []
+
+            if not items:
+                await asyncio.sleep(self.poll_interval)
+                continue
+
+            await asyncio.gather(*[process_item(db_pool, item) for item in items], return_exceptions=True)
+
+    def start(self, db_pool):
+        if self._tasks or self.workers <= 0:
+            return
+        self._tasks = [
+            asyncio.create_task(self._work(db_pool, number)) for number in range(self.workers)
+        ]
+        logger.info(f"Started {self.workers} reply job workers")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+job_workers = JobWorkerPool(
+    workers=JOB_WORKERS,
+    batch_size=JOB_BATCH_SIZE,
+    poll_interval=JOB_POLL_INTERVAL
+)
+
+async def run_standalone():
+    """
+    Run job workers without the HTTP server, for scaling out workers
+    separately from the API.
+    """
+    db_pool = await database.init_db()
+    # Workers read profiles through the cache and record token usage, so
+    # they need the change listener and the usage flush loop as in the API
+    profile_cache.start_listener()
+    usage_recorder.start(db_pool)
+    job_workers.start(db_pool)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await job_workers.stop()
+        await profile_cache.stop_listener()
+        await usage_recorder.stop(db_pool)
+        await database.close_db()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    try:
+        asyncio.run(run_standalone())
+    except KeyboardInterrupt:
+        pass
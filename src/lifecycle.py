@@ -0,0 +1,51 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+class InFlight:
+    """
+    Counts reply generations in progress so shutdown can wait for them.
+    Generations run in shielded tasks that outlive a cancelled request, so
+    the server's own graceful shutdown does not cover them. Once draining
+    starts the worker reports not ready, and the load balancer stops
+    sending it new requests.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.draining = False
+        self._idle = None
+
+    @asynccontextmanager
+    async def track(self):
+        if self._idle is None:
+            self._idle = asyncio.Event()
+        self.count += 1
+        self._idle.clear()
+        try:
+            yield
+        finally:
+            self.count -= 1
+            if self.count == 0:
+                self._idle.set()
+
+    async def drain(self, timeout: float) -> bool:
+        """
+        Stop reporting ready and wait up to `timeout` seconds for the
+        generations in progress. Returns whether all of them finished.
+        """
+        self.draining = True
+        if self.count == 0:
+            return True
+        logger.info(f"Waiting for {self.count} reply generations to finish")
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            logger.warning(f"Shutting down with {self.count} reply generations unfinished")
+            return False
+
+in_flight = InFlight()
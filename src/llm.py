@@ -0,0 +1,161 @@
+import asyncio
+import functools
+import logging
+import random
+import time
+
+from . import metrics
+from .config import (
+    OPENAI_API_KEY,
+    OPENAI_BASE_URL,
+    OPENAI_MAX_CONCURRENCY,
+    OPENAI_TIMEOUT_SECONDS,
+    OPENAI_MAX_RETRIES,
+    OPENAI_RETRY_BASE_DELAY,
+    OPENAI_RETRY_MAX_DELAY,
+)
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# The OpenAI SDK takes about a third of the app's import time, so it is
+# imported with the client on first use (or by warm_up after startup)
+client = None
+
+def configured() -> bool:
+    """
+    Whether an API key or a base URL is set. Local model servers usually
+    need no key, so a base URL alone is enough.
+    """
+    return bool(OPENAI_API_KEY or OPENAI_BASE_URL)
+
+def get_client():
+    """
+    Return the async OpenAI client, building it on first use, or None when
+    OpenAI is not configured. Retries are handled below so the SDK's own
+    retry loop is disabled.
+    """
+    global client
+    if client is None and configured():
+        from openai import AsyncOpenAI
+        client = AsyncOpenAI(
+            api_key=OPENAI_API_KEY or "unused",
+            base_url=OPENAI_BASE_URL,
+            timeout=OPENAI_TIMEOUT_SECONDS,
+            max_retries=0
+        )
+    return client
+
+async def warm_up():
+    """
+    Import the SDK and build the client off the event loop, so the first
+    reply does not pay for it.
+    """
+    if configured():
+        await asyncio.to_thread(get_client)
+
+@functools.lru_cache(maxsize=1)
+def retryable_errors() -> tuple:
+    """
+    Errors worth another attempt; anything else (bad request, auth) fails fast.
+    """
+    import openai
+    return (
+        openai.APITimeoutError,
+        openai.APIConnectionError,
+        openai.RateLimitError,
+        openai.InternalServerError,
+    )
+
+def timeout_error() -> type:
+    import openai
+    return openai.APITimeoutError
+
+# Bounds the number of completions in flight for this process
+_semaphore = None
+
+def _get_semaphore():
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(OPENAI_MAX_CONCURRENCY)
+    return _semaphore
+
+def backoff_delay(attempt: int) -> float:
+    """
+    Full-jitter exponential backoff for the given (zero-based) attempt.
+    """
+    ceiling = min(OPENAI_RETRY_MAX_DELAY, OPENAI_RETRY_BASE_DELAY * (2 ** attempt))
+    return random.uniform(0, ceiling)
+
+async def create_chat_completion(**kwargs):
+    """
+    Call the chat completions API without blocking the event loop.
+    At most OPENAI_MAX_CONCURRENCY calls run at once; transient failures
+    are retried with jittered backoff, outside of the concurrency slot.
+    """
+    client = get_client()
+    if not client:
+        raise RuntimeError("OpenAI client is not configured")
+
+    model = kwargs.get("model", "unknown")
+    attempt = 0
+    while True:
+        try:
+            async with _get_semaphore():
+                start = time.perf_counter()
+                try:
+                    response = await client.chat.completions.create(**kwargs)
+                except Exception as e:
+                    metrics.record_openai_call(model, time.perf_counter() - start, error=e)
+                    raise
+                metrics.record_openai_call(model, time.perf_counter() - start, usage=getattr(response, "usage", None))
+                return response
+        except retryable_errors() as e:
+            if attempt >= OPENAI_MAX_RETRIES:
+                logger.error(f"OpenAI call failed after {attempt + 1} attempts: {str(e)}")
+                raise
+            delay = backoff_delay(attempt)
+            logger.warning(f"OpenAI call failed ({type(e).__name__}), retrying in {delay:.2f}s")
+            attempt += 1
+            await asyncio.sleep(delay)
+
+async def stream_chat_completion(**kwargs):
+    """
+    Stream the content deltas of a chat completion as they arrive.
+    The concurrency slot is held for the whole stream. Connection failures
+    are retried only until the first chunk has been received.
+    """
+    client = get_client()
+    if not client:
+        raise RuntimeError("OpenAI client is not configured")
+
+    model = kwargs.get("model", "unknown")
+    attempt = 0
+    while True:
+        received = False
+        try:
+            async with _get_semaphore():
+                start = time.perf_counter()
+                try:
+                    stream = await client.chat.completions.create(stream=True, **kwargs)
+                    async for chunk in stream:
+                        if not chunk.choices:
+                            continue
+                        delta = chunk.choices[0].delta.content
+                        if delta:
+                            received = True
+                            yield delta
+                except Exception as e:
+                    metrics.record_openai_call(model, time.perf_counter() - start, error=e)
+                    raise
+                # Streamed responses carry no usage, so only latency is recorded
+                metrics.record_openai_call(model, time.perf_counter() - start)
+            return
+        except retryable_errors() as e:
+            if received or attempt >= OPENAI_MAX_RETRIES:
+                logger.error(f"OpenAI stream failed after {attempt + 1} attempts: {str(e)}")
+                raise
+            delay = backoff_delay(attempt)
+            logger.warning(f"OpenAI stream failed ({type(e).__name__}), retrying in {delay:.2f}s")
+            attempt += 1
+            await asyncio.sleep(delay)
@@ -0,0 +1,159 @@
+import atexit
+import logging
+import os
+import queue
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+from .metrics import LOG_RECORDS_DROPPED, current_trace
+from .serialization import dumps
+from .config import (
+    LOG_LEVEL,
+    LOG_FORMAT,
+    LOG_DIRECTORY,
+    LOG_FILE,
+    LOG_MAX_BYTES,
+    LOG_BACKUP_COUNT,
+    LOG_QUEUE_SIZE,
+    LOG_FLUSH_TIMEOUT_SECONDS,
+    LOG_SAMPLE_RATES,
+)
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+class JSONFormatter(logging.Formatter):
+    """
+    One JSON object per line, with the request's trace ID when there is one.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        trace_id = getattr(record, "trace_id", None)
+        if trace_id:
+            entry["trace_id"] = trace_id
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return dumps(entry).decode("utf-8")
+
+class SamplingFilter(logging.Filter):
+    """
+    Keep one in every 1/rate INFO (and lower) records of the given loggers
+    and their children; warnings and errors always pass.
+    """
+
+    def __init__(self, rates: dict[str, float]):
+        super().__init__()
+        self.every = {name: max(1, round(1 / rate)) if rate > 0 else 0 for name, rate in rates.items()}
+        self._counts = dict.fromkeys(rates, 0)
+
+    def _sampled_logger(self, name: str) -> str | None:
+        while name:
+            if name in self.every:
+                return name
+            name = name.rpartition(".")[0]
+        return None
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.INFO:
+            return True
+        sampled = self._sampled_logger(record.name)
+        if sampled is None:
+            return True
+        every = self.every[sampled]
+        if every == 0:
+            return False
+        count = self._counts[sampled]
+        self._counts[sampled] = count + 1
+        return count % every == 0
+
+class BoundedQueueHandler(QueueHandler):
+    """
+    Hands records to the listener thread without blocking. When the queue
+    is full the record is dropped and counted rather than stalling the
+    event loop.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Resolve everything that depends on the calling context (message
+        # arguments, traceback, request trace) before crossing threads
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        trace = current_trace.get()
+        record.trace_id = trace.trace_id if trace is not None else None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc()
+
+class BoundedQueueListener(QueueListener):
+    """
+    QueueListener whose stop waits at most `timeout` seconds for queued
+    records to be written.
+    """
+
+    def __init__(self, log_queue: queue.Queue, *handlers, timeout: float):
+        super().__init__(log_queue, *handlers, respect_handler_level=True)
+        self.timeout = timeout
+
+    def stop(self):
+        if self._thread is None:
+            return
+        try:
+            self.queue.put(self._sentinel, timeout=self.timeout)
+        except queue.Full:
+            pass
+        self._thread.join(self.timeout)
+        self._thread = None
+
+def parse_sample_rates(value: str) -> dict[str, float]:
+    """
+    Parse "logger=rate,logger=rate" into a dict.
+    """
+    rates = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        name, _, rate = item.partition("=")
+        rates[name.strip()] = float(rate)
+    return rates
+
+def configure_logging() -> BoundedQueueListener:
+    """
+    Route all logging through a bounded queue to a listener thread that
+    writes JSON lines to a rotating file and to the console. Records are
+    sampled per LOG_SAMPLE_RATES before they are queued. The listener is
+    flushed at exit for at most LOG_FLUSH_TIMEOUT_SECONDS.
+    """
+    os.makedirs(LOG_DIRECTORY, exist_ok=True)
+    file_handler = RotatingFileHandler(
+        os.path.join(LOG_DIRECTORY, LOG_FILE), maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT
+    )
+    file_handler.setFormatter(JSONFormatter())
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(JSONFormatter() if LOG_FORMAT == "json" else logging.Formatter(TEXT_FORMAT))
+
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    queue_handler = BoundedQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(parse_sample_rates(LOG_SAMPLE_RATES)))
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(LOG_LEVEL)
+
+    listener = BoundedQueueListener(log_queue, file_handler, console_handler, timeout=LOG_FLUSH_TIMEOUT_SECONDS)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
@@ -1,31 +1,110 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from .routes import message, reviews, profiles
-from .database import init_db, close_db
-from .config import API_BASE_URL
+from .routes import message, reviews, profiles, jobs
+from . import llm
+from .database import init_db, close_db, ping
+from .lifecycle import in_flight
+from .profile_cache import profile_cache
+from .jobs import job_workers
+from .usage import usage_recorder
+from .cache import reply_cache
+from .singleflight import reply_flight
+from .autoreply import auto_replier
+from .config import API_BASE_URL, MIGRATE_ON_STARTUP, AUTO_REPLY_ENABLED, SHUTDOWN_GRACE_SECONDS, HEALTH_CHECK_TIMEOUT_SECONDS
+from .migrate import migrate
+from .logconfig import configure_logging
+from .metrics import MetricsMiddleware, InstrumentedPool, render_metrics, CONTENT_TYPE_LATEST
+import asyncio
 import logging
 import os
+import signal
 
-# Configure logging
-log_directory = "logs"
-if not os.path.exists(log_directory):
-    os.makedirs(log_directory)
-
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(os.path.join(log_directory, 'app.log')),
-        logging.StreamHandler()  # This will still show logs in console
-    ]
-)
+# Configure logging: records are written by a background thread, off the event loop
+configure_logging()
 logger = logging.getLogger(__name__)
 
+async def start_database(app: FastAPI):
+    """
+    Open the database pool, apply migrations and start the background
+    workers, retrying until the database is reachable. The server accepts
+    connections meanwhile: requests needing the database get 503 and
+    /health/ready fails until the pool is published on app.state. A failed
+    migration is not retried: the pool is closed and the error ends startup.
+    """
+    delay = 1
+    while True:
+        try:
+            pool = await init_db()
+            break
+        except Exception as e:
+            logger.error(f"Database unavailable, retrying in {delay}s: {str(e)}")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30)
+    logger.info("Database initialized successfully")
+
+    # Handlers and workers acquire through the wrapper so pool waits are measured
+    db_pool = InstrumentedPool(pool)
+    if MIGRATE_ON_STARTUP:
+        try:
+            async with db_pool.acquire() as connection:
+                await migrate(connection)
+        except Exception:
+            await close_db()
+            raise
+    profile_cache.start_listener()
+    job_workers.start(db_pool)
+    usage_recorder.start(db_pool)
+    reply_cache.start_pruning(db_pool)
+    if AUTO_REPLY_ENABLED:
+        auto_replier.start(db_pool)
+    app.state.db_pool = db_pool
+    logger.info("Database pool is available")
+
+def log_startup_failure(task: asyncio.Task):
+    """
+    Shut the server down when startup fails, as a SIGTERM would, instead of
+    leaving a live process that never becomes ready.
+    """
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"Error during startup, shutting down: {str(task.exception())}")
+        os.kill(os.getpid(), signal.SIGTERM)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    logger.info("Starting application...")
+    startup = asyncio.create_task(start_database(app))
+    startup.add_done_callback(log_startup_failure)
+    warm_up = asyncio.create_task(llm.warm_up())
+
+    yield
+
+    logger.info("Shutting down application...")
+    for task in (startup, warm_up):
+        task.cancel()
+    await asyncio.gather(startup, warm_up, return_exceptions=True)
+    # Background producers stop first; unfinished job items are picked up
+    # again once their lease expires
+    await auto_replier.stop()
+    await job_workers.stop()
+    await reply_cache.stop_pruning()
+    # Generations started by requests may still be running in their own
+    # tasks; let them finish and save before the pool closes
+    await in_flight.drain(SHUTDOWN_GRACE_SECONDS)
+    await profile_cache.stop_listener()
+    await usage_recorder.stop(app.state.db_pool)
+    await reply_flight.locks.close()
+    await close_db()
+    app.state.db_pool = None
+    logger.info("Application shutdown complete")
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Message Response API",
     description="API for generating responses using OpenAI's GPT models",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Configure CORS
@@ -37,6 +116,10 @@ app.add_middleware(
     allow_headers=["*"],  # Allows all headers
 )
 
+# Request latency histograms and per-request trace logs; added last so it
+# wraps every other middleware
+app.add_middleware(MetricsMiddleware)
+
 # Store database pool and API base URL
 app.state.db_pool = None
 app.state.api_base_url = API_BASE_URL
@@ -45,30 +128,48 @@ app.state.api_base_url = API_BASE_URL
 app.include_router(message.router)
 app.include_router(reviews.router)
 app.include_router(profiles.router)
-
-@app.on_event("startup")
-async def startup():
-    logger.info("Starting application...")
-    try:
-        app.state.db_pool = await init_db()
-        logger.info("Database initialized successfully")
-        if app.state.db_pool:
-            logger.info("Database pool is available")
-        else:
-            logger.error("Database pool is None after initialization")
-    except Exception as e:
-        logger.error(f"Error during startup: {str(e)}")
-        raise
-
-@app.on_event("shutdown")
-async def shutdown():
-    logger.info("Shutting down application...")
-    await close_db()
-    logger.info("Application shutdown complete")
+app.include_router(jobs.router)
 
 @app.get("/")
 async def root():
     return {
         "message": "Welcome to the Message Response API",
         "api_base_url": app.state.api_base_url
-    } 
\ No newline at end of file
+    } 
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics(req: Request):
+    """
+    Prometheus scrape endpoint.
+    """
+    return Response(
+        content=render_metrics(req.app.state.db_pool),
+        media_type=CONTENT_TYPE_LATEST
+    )
+
+@app.get("/health/live", include_in_schema=False)
+async def liveness():
+    """
+    The process is up and its event loop is serving requests.
+    """
+    return {"status": "ok"}
+
+@app.get("/health/ready", include_in_schema=False)
+async def readiness(req: Request):
+    """
+    The worker can serve traffic: it is not shutting down and its database
+    pool answers a query in time.
+    """
+    if in_flight.draining:
+        return JSONResponse(status_code=503, content={"status": "draining"})
+    db_pool = req.app.state.db_pool
+    if not db_pool:
+        return JSONResponse(status_code=503, content={"status": "database unavailable"})
+    try:
+        async with asyncio.timeout(HEALTH_CHECK_TIMEOUT_SECONDS):
+            async with db_pool.acquire() as connection:
+                await ping(connection)
+    except Exception as e:
+        logger.warning(f"Readiness check failed: {str(e)}")
+        return JSONResponse(status_code=503, content={"status": "database unavailable"})
+    return {"status": "ready", "generations_in_flight": in_flight.count}
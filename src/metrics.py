@@ -0,0 +1,238 @@
+import contextvars
+import logging
+import time
+import uuid
+from contextlib import asynccontextmanager, contextmanager
+
+from prometheus_client import Counter, Gauge, Histogram, CONTENT_TYPE_LATEST, generate_latest
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route",
+    ["method", "route", "status"]
+)
+REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress",
+    "HTTP requests currently being served"
+)
+POOL_SIZE = Gauge("db_pool_size", "Open connections in the database pool")
+POOL_IDLE = Gauge("db_pool_idle", "Idle connections in the database pool")
+POOL_MAX_SIZE = Gauge("db_pool_max_size", "Maximum size of the database pool")
+POOL_ACQUIRE_LATENCY = Histogram(
+    "db_pool_acquire_seconds",
+    "Time spent waiting for a database connection"
+)
+QUERY_LATENCY = Histogram(
+    "db_query_duration_seconds",
+    "Database query latency by query",
+    ["query"]
+)
+QUERY_ERRORS = Counter(
+    "db_query_errors_total",
+    "Database queries that raised an error",
+    ["query"]
+)
+OPENAI_LATENCY = Histogram(
+    "openai_request_duration_seconds",
+    "OpenAI API call latency",
+    ["model", "outcome"],
+    buckets=(0.25, 0.5, 1, 2, 4, 8, 16, 32, 64)
+)
+OPENAI_TOKENS = Counter(
+    "openai_tokens_total",
+    "Tokens used by OpenAI calls",
+    ["model", "kind"]
+)
+OPENAI_ERRORS = Counter(
+    "openai_errors_total",
+    "OpenAI API call errors",
+    ["model", "error"]
+)
+MODEL_FALLBACKS = Counter(
+    "model_fallbacks_total",
+    "Completions moved to the next model after a failure or slow answer",
+    ["model"]
+)
+MODEL_CIRCUIT_OPEN = Gauge(
+    "model_circuit_open",
+    "Whether a model's circuit breaker is open",
+    ["model"]
+)
+AUTO_REPLIES = Counter(
+    "auto_replies_total",
+    "Automatic replies to new reviews by outcome",
+    ["outcome"]
+)
+RATE_LIMIT_LEVEL = Gauge(
+    "rate_limit_bucket_level",
+    "Tokens left in a tenant's rate limit bucket",
+    ["tenant", "budget"]
+)
+RATE_LIMITED = Counter(
+    "rate_limited_requests_total",
+    "Requests rejected by a rate limit",
+    ["budget"]
+)
+LOG_RECORDS_DROPPED = Counter(
+    "log_records_dropped_total",
+    "Log records dropped because the logging queue was full"
+)
+REPLY_CACHE_LOOKUPS = Counter(
+    "reply_cache_lookups",
+    "Reply cache lookups by result",
+    ["result"]
+)
+
+# Label for each constant query of the data-access layer, filled by register_queries
+QUERY_NAMES = {}
+
+def register_queries(namespace: dict):
+    """
+    Label the module-level SQL constants of a namespace by their lowercased name.
+    """
+    for name, value in namespace.items():
+        if name.isupper() and isinstance(value, str):
+            QUERY_NAMES[value] = name.lower()
+
+class Trace:
+    """
+    Per-request trace: an ID and the time spent in each stage.
+    """
+
+    def __init__(self, trace_id: str):
+        self.trace_id = trace_id
+        self.stages = {}
+
+    def add(self, stage: str, seconds: float):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def summary(self) -> str:
+        return " ".join(f"{stage}={seconds * 1000:.1f}ms" for stage, seconds in self.stages.items())
+
+current_trace = contextvars.ContextVar("current_trace", default=None)
+
+def record_stage(stage: str, seconds: float):
+    trace = current_trace.get()
+    if trace is not None:
+        trace.add(stage, seconds)
+
+@contextmanager
+def timed_stage(stage: str):
+    """
+    Add the time spent in the block to the current request's trace.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - start)
+
+def record_query(logged_query):
+    """
+    asyncpg query logger: per-query latency, errors and the trace's db stage.
+    """
+    name = QUERY_NAMES.get(logged_query.query, "dynamic")
+    QUERY_LATENCY.labels(name).observe(logged_query.elapsed)
+    if logged_query.exception is not None:
+        QUERY_ERRORS.labels(name).inc()
+    record_stage("db", logged_query.elapsed)
+
+def record_openai_call(model: str, seconds: float, usage=None, error: Exception | None = None):
+    outcome = "error" if error is not None else "ok"
+    OPENAI_LATENCY.labels(model, outcome).observe(seconds)
+    record_stage("openai", seconds)
+    if error is not None:
+        OPENAI_ERRORS.labels(model, type(error).__name__).inc()
+    if usage is not None:
+        OPENAI_TOKENS.labels(model, "prompt").inc(usage.prompt_tokens)
+        OPENAI_TOKENS.labels(model, "completion").inc(usage.completion_tokens)
+
+class InstrumentedPool:
+    """
+    Wraps an asyncpg pool to time connection acquisition.
+    Everything else is delegated to the wrapped pool.
+    """
+
+    def __init__(self, pool):
+        self._pool = pool
+
+    @asynccontextmanager
+    async def acquire(self):
+        start = time.perf_counter()
+        async with self._pool.acquire() as connection:
+            waited = time.perf_counter() - start
+            POOL_ACQUIRE_LATENCY.observe(waited)
+            record_stage("pool_acquire", waited)
+            yield connection
+
+    def __getattr__(self, name):
+        return getattr(self._pool, name)
+
+def render_metrics(db_pool=None) -> bytes:
+    """
+    Refresh point-in-time gauges and render all metrics in the Prometheus
+    text format.
+    """
+    if db_pool is not None:
+        POOL_SIZE.set(db_pool.get_size())
+        POOL_IDLE.set(db_pool.get_idle_size())
+        POOL_MAX_SIZE.set(db_pool.get_max_size())
+    return generate_latest()
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording request latency per route template and
+    logging one trace record per request with its per-stage breakdown.
+    Latency covers the whole response, including streamed bodies.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        trace_id = headers.get(b"x-request-id", b"").decode("latin-1") or uuid.uuid4().hex
+        trace = Trace(trace_id)
+        token = current_trace.set(trace)
+        status = 500
+        start = time.perf_counter()
+
+        async def send_with_trace_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = [*message.get("headers", []), (b"x-trace-id", trace_id.encode("latin-1"))]
+            await send(message)
+
+        REQUESTS_IN_PROGRESS.inc()
+        try:
+            await self.app(scope, receive, send_with_trace_id)
+        finally:
+            elapsed = time.perf_counter() - start
+            REQUESTS_IN_PROGRESS.dec()
+            route = scope.get("route")
+            route_path = route.path if route is not None else "unmatched"
+            REQUEST_LATENCY.labels(scope["method"], route_path, str(status)).observe(elapsed)
+            logger.info(
+                f"trace={trace_id} {scope['method']} {route_path} status={status} "
+                f"total={elapsed * 1000:.1f}ms {trace.summary()}".rstrip()
+            )
+            current_trace.reset(token)
+
+__all__ = [
+    "CONTENT_TYPE_LATEST",
+    "InstrumentedPool",
+    "MetricsMiddleware",
+    "record_openai_call",
+    "record_query",
+    "register_queries",
+    "render_metrics",
+    "timed_stage",
+]
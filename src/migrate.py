@@ -0,0 +1,153 @@
+"""
+Versioned schema migrations.
+
+Migrations are the numbered .sql files in src/migrations. Each one runs
+once, in its own transaction, and is recorded in schema_migrations. Run
+from the command line with:
+
+    python -m src.migrate                 # apply pending migrations
+    python -m src.migrate --status        # list applied and pending migrations
+    python -m src.migrate --check-plans   # fail if a hot query uses a sequential scan
+"""
+import argparse
+import asyncio
+import logging
+import re
+import sys
+from pathlib import Path
+
+import asyncpg
+
+from . import database
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = Path(__file__).parent / "migrations"
+
+# Serializes migration runs across workers starting at the same time
+MIGRATION_LOCK_ID = 7_404_001
+
+# Hot queries and representative arguments for the plan check
+PLAN_CHECKS = [
+    ("profile by id", database.PROFILE_BY_ID, (1,)),
+    ("review for reply", database.REVIEW_FOR_REPLY, ("review",)),
+    ("reviews for reply by ids", database.REVIEWS_FOR_REPLY_BY_IDS, (["review"], True)),
+    ("unreplied reviews by business", database.REVIEWS_FOR_REPLY_BY_BUSINESS, ("place", True, 50)),
+    ("current reply", database.REPLY_FOR_REVIEW, ("review",)),
+    ("review page", database.review_page_query(["business_place_id = $1"], 2), ("place", 51)),
+    ("business stats", database.BUSINESS_STATS, (["place"],)),
+    ("job item claim", database.JOB_ITEMS_CLAIM, (8, 300.0)),
+    ("job status", database.JOB_STATUS, (1,)),
+]
+
+def discover_migrations() -> list[tuple[int, str, Path]]:
+    """
+    Return (version, name, path) for every migration file, in order.
+    """
+    migrations = []
+    for path in MIGRATIONS_DIR.glob("*.sql"):
+        match = re.match(r"^(\d+)_(.+)\.sql$", path.name)
+        if not match:
+            continue
+        migrations.append((int(match.group(1)), match.group(2), path))
+    migrations.sort()
+    versions = [version for version, _, _ in migrations]
+    if len(versions) != len(set(versions)):
+        raise RuntimeError("Duplicate migration version numbers")
+    return migrations
+
+async def applied_versions(connection) -> set[int]:
+    await connection.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        )
+    """)
+    rows = await connection.fetch("SELECT version FROM schema_migrations")
+    return {row['version'] for row in rows}
+
+async def migrate(connection) -> list[int]:
+    """
+    Apply every pending migration and return the versions applied.
+    """
+    await connection.execute("SELECT pg_advisory_lock($1)", MIGRATION_LOCK_ID)
+    try:
+        done = await applied_versions(connection)
+        applied = []
+        for version, name, path in discover_migrations():
+            if version in done:
+                continue
+            logger.info(f"Applying migration {version:04d}_{name}")
+            async with connection.transaction():
+                await connection.execute(path.read_text())
+                await connection.execute(
+                    "INSERT INTO schema_migrations (version, name) VALUES ($1, $2)", version, name
+                )
+            applied.append(version)
+        if applied:
+            logger.info(f"Applied {len(applied)} migrations")
+        return applied
+    finally:
+        await connection.execute("SELECT pg_advisory_unlock($1)", MIGRATION_LOCK_ID)
+
+def find_seq_scans(plan: dict) -> list[str]:
+    """
+    Return the relations read with a sequential scan anywhere in a plan tree.
+    """
+    relations = []
+    if plan.get("Node Type") == "Seq Scan":
+        relations.append(plan.get("Relation Name", "?"))
+    for child in plan.get("Plans", []):
+        relations.extend(find_seq_scans(child))
+    return relations
+
+async def check_query_plans(connection) -> list[str]:
+    """
+    EXPLAIN each hot query and report the ones that would scan a table
+    sequentially. Sequential scans are disabled for the check, so the
+    planner only picks one when no index can serve the query, whatever
+    the table sizes in this database.
+    """
+    failures = []
+    for label, query, args in PLAN_CHECKS:
+        async with connection.transaction():
+            await connection.execute("SET LOCAL enable_seqscan = off")
+            statement = await connection.prepare(query)
+            explained = await statement.explain(*args)
+        seq_scans = find_seq_scans(explained[0]["Plan"])
+        if seq_scans:
+            failures.append(f"{label}: sequential scan on {', '.join(seq_scans)}")
+    return failures
+
+async def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Apply database schema migrations")
+    parser.add_argument("--status", action="store_true", help="list applied and pending migrations")
+    parser.add_argument("--check-plans", action="store_true", help="fail if a hot query uses a sequential scan")
+    args = parser.parse_args(argv)
+
+    connection = await asyncpg.connect(**database.DB_CONFIG)
+    try:
+        if args.status:
+            done = await applied_versions(connection)
+            for version, name, _ in discover_migrations():
+                print(f"{'applied' if version in done else 'pending'}  {version:04d}_{name}")
+            return 0
+
+        await migrate(connection)
+
+        if args.check_plans:
+            failures = await check_query_plans(connection)
+            for failure in failures:
+                print(f"FAIL {failure}")
+            if failures:
+                return 1
+            print(f"All {len(PLAN_CHECKS)} hot queries use indexes")
+        return 0
+    finally:
+        await connection.close()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,22 @@
+-- Tables the API reads and writes. Existing databases already have them;
+-- IF NOT EXISTS keeps this a no-op there.
+CREATE TABLE IF NOT EXISTS profiles (
+    id SERIAL PRIMARY KEY,
+    profile_name TEXT NOT NULL,
+    profile_text_base TEXT NOT NULL,
+    profile_text_addon TEXT NOT NULL DEFAULT ''
+);
+
+CREATE TABLE IF NOT EXISTS reviews (
+    id BIGSERIAL PRIMARY KEY,
+    review_id TEXT NOT NULL,
+    business_place_id TEXT NOT NULL,
+    author_title TEXT NOT NULL DEFAULT '',
+    author_link TEXT,
+    author_reviews_count INTEGER NOT NULL DEFAULT 0,
+    review_rating DOUBLE PRECISION NOT NULL,
+    review_text TEXT,
+    review_datetime_utc TIMESTAMP,
+    review_timestamp BIGINT,
+    replies TEXT
+);
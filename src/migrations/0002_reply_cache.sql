@@ -0,0 +1,8 @@
+-- Persistent tier of the reply cache (used when REPLY_CACHE_PERSISTENT=true)
+CREATE TABLE IF NOT EXISTS reply_cache (
+    cache_key TEXT PRIMARY KEY,
+    reply TEXT NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS reply_cache_created_at_idx ON reply_cache (created_at);
@@ -0,0 +1,114 @@
+-- Per-business review statistics, kept current by a trigger on reviews
+CREATE TABLE IF NOT EXISTS business_review_stats (
+    business_place_id TEXT PRIMARY KEY,
+    review_count BIGINT NOT NULL DEFAULT 0,
+    rating_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+    rating_1 BIGINT NOT NULL DEFAULT 0,
+    rating_2 BIGINT NOT NULL DEFAULT 0,
+    rating_3 BIGINT NOT NULL DEFAULT 0,
+    rating_4 BIGINT NOT NULL DEFAULT 0,
+    rating_5 BIGINT NOT NULL DEFAULT 0,
+    replied_count BIGINT NOT NULL DEFAULT 0,
+    last_review_at TIMESTAMP,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+-- Add (sign = 1) or remove (sign = -1) one review's contribution
+CREATE OR REPLACE FUNCTION apply_review_stats(
+    p_business_place_id TEXT,
+    p_sign INTEGER,
+    p_rating DOUBLE PRECISION,
+    p_has_reply BOOLEAN,
+    p_review_at TIMESTAMP
+) RETURNS VOID AS $$
+DECLARE
+    v_star INTEGER := round(p_rating);
+BEGIN
+    INSERT INTO business_review_stats AS s (
+        business_place_id, review_count, rating_sum,
+        rating_1, rating_2, rating_3, rating_4, rating_5,
+        replied_count, last_review_at
+    )
+    VALUES (
+        p_business_place_id, p_sign, p_sign * coalesce(p_rating, 0),
+        CASE WHEN v_star = 1 THEN p_sign ELSE 0 END,
+        CASE WHEN v_star = 2 THEN p_sign ELSE 0 END,
+        CASE WHEN v_star = 3 THEN p_sign ELSE 0 END,
+        CASE WHEN v_star = 4 THEN p_sign ELSE 0 END,
+        CASE WHEN v_star = 5 THEN p_sign ELSE 0 END,
+        CASE WHEN p_has_reply THEN p_sign ELSE 0 END,
+        CASE WHEN p_sign > 0 THEN p_review_at END
+    )
+    ON CONFLICT (business_place_id) DO UPDATE SET
+        review_count = s.review_count + EXCLUDED.review_count,
+        rating_sum = s.rating_sum + EXCLUDED.rating_sum,
+        rating_1 = s.rating_1 + EXCLUDED.rating_1,
+        rating_2 = s.rating_2 + EXCLUDED.rating_2,
+        rating_3 = s.rating_3 + EXCLUDED.rating_3,
+        rating_4 = s.rating_4 + EXCLUDED.rating_4,
+        rating_5 = s.rating_5 + EXCLUDED.rating_5,
+        replied_count = s.replied_count + EXCLUDED.replied_count,
+        last_review_at = greatest(s.last_review_at, EXCLUDED.last_review_at),
+        updated_at = now();
+
+    -- Removing the newest review moves last_review_at back
+    IF p_sign < 0 AND p_review_at IS NOT NULL THEN
+        UPDATE business_review_stats
+        SET last_review_at = (
+            SELECT max(review_datetime_utc) FROM reviews
+            WHERE business_place_id = p_business_place_id
+        )
+        WHERE business_place_id = p_business_place_id
+          AND last_review_at = p_review_at;
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION reviews_stats_trigger() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM apply_review_stats(
+            OLD.business_place_id::text, -1, OLD.review_rating::double precision,
+            OLD.replies IS NOT NULL AND OLD.replies <> '', OLD.review_datetime_utc::timestamp
+        );
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM apply_review_stats(
+            NEW.business_place_id::text, 1, NEW.review_rating::double precision,
+            NEW.replies IS NOT NULL AND NEW.replies <> '', NEW.review_datetime_utc::timestamp
+        );
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Install the trigger and backfill together (migrations run in a transaction)
+-- so no write is counted twice or missed
+LOCK TABLE reviews IN SHARE ROW EXCLUSIVE MODE;
+
+DROP TRIGGER IF EXISTS reviews_stats ON reviews;
+CREATE TRIGGER reviews_stats
+AFTER INSERT OR DELETE OR UPDATE OF business_place_id, review_rating, replies, review_datetime_utc
+ON reviews
+FOR EACH ROW EXECUTE FUNCTION reviews_stats_trigger();
+
+-- Backfill statistics for reviews loaded before the trigger existed
+INSERT INTO business_review_stats (
+    business_place_id, review_count, rating_sum,
+    rating_1, rating_2, rating_3, rating_4, rating_5,
+    replied_count, last_review_at
+)
+SELECT
+    business_place_id,
+    COUNT(*),
+    coalesce(SUM(review_rating), 0)::double precision,
+    COUNT(*) FILTER (WHERE round(review_rating) = 1),
+    COUNT(*) FILTER (WHERE round(review_rating) = 2),
+    COUNT(*) FILTER (WHERE round(review_rating) = 3),
+    COUNT(*) FILTER (WHERE round(review_rating) = 4),
+    COUNT(*) FILTER (WHERE round(review_rating) = 5),
+    COUNT(*) FILTER (WHERE replies IS NOT NULL AND replies <> ''),
+    max(review_datetime_utc)
+FROM reviews
+GROUP BY business_place_id
+ON CONFLICT (business_place_id) DO NOTHING;
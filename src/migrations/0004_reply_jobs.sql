@@ -0,0 +1,24 @@
+-- Asynchronous reply-generation jobs; workers claim items with FOR UPDATE SKIP LOCKED
+CREATE TABLE IF NOT EXISTS reply_jobs (
+    id BIGSERIAL PRIMARY KEY,
+    profile_id INTEGER NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE TABLE IF NOT EXISTS reply_job_items (
+    id BIGSERIAL PRIMARY KEY,
+    job_id BIGINT NOT NULL REFERENCES reply_jobs (id) ON DELETE CASCADE,
+    profile_id INTEGER NOT NULL,
+    message_id TEXT NOT NULL,
+    bypass_cache BOOLEAN NOT NULL DEFAULT false,
+    status TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    response TEXT,
+    error TEXT,
+    lease_expires_at TIMESTAMPTZ,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS reply_job_items_job_id_idx ON reply_job_items (job_id);
+CREATE INDEX IF NOT EXISTS reply_job_items_claimable_idx ON reply_job_items (id)
+    WHERE status IN ('queued', 'running');
@@ -0,0 +1,11 @@
+-- Single-review lookups by the message routes and the reply UPDATEs
+CREATE INDEX IF NOT EXISTS reviews_review_id_idx ON reviews (review_id);
+
+-- /reviews/fetch pages and /reviews/export, in listing order
+CREATE INDEX IF NOT EXISTS reviews_business_listing_idx
+    ON reviews (business_place_id, review_datetime_utc DESC NULLS LAST, id DESC);
+
+-- Reviews still waiting for a reply, per business, newest first
+CREATE INDEX IF NOT EXISTS reviews_unreplied_idx
+    ON reviews (business_place_id, review_datetime_utc DESC)
+    WHERE replies IS NULL OR replies = '';
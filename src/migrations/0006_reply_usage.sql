@@ -0,0 +1,13 @@
+-- Token counts and latency of every generated reply, for per-profile cost tracking
+CREATE TABLE IF NOT EXISTS reply_usage (
+    id BIGSERIAL PRIMARY KEY,
+    profile_id INTEGER NOT NULL,
+    review_id TEXT NOT NULL,
+    model TEXT NOT NULL,
+    prompt_tokens INTEGER NOT NULL,
+    completion_tokens INTEGER NOT NULL,
+    latency_ms DOUBLE PRECISION NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS reply_usage_profile_idx ON reply_usage (profile_id, created_at);
@@ -0,0 +1,6 @@
+-- Per-profile completion settings; NULL falls back to the OPENAI_* defaults
+ALTER TABLE profiles ADD COLUMN IF NOT EXISTS model TEXT;
+ALTER TABLE profiles ADD COLUMN IF NOT EXISTS cheap_model TEXT;
+ALTER TABLE profiles ADD COLUMN IF NOT EXISTS fallback_model TEXT;
+ALTER TABLE profiles ADD COLUMN IF NOT EXISTS temperature DOUBLE PRECISION;
+ALTER TABLE profiles ADD COLUMN IF NOT EXISTS max_tokens INTEGER;
@@ -0,0 +1,50 @@
+-- Bulk ingestion upserts on review_id, which needs it to be unique.
+-- Fold duplicates into the oldest row first, keeping a reply if any copy
+-- has one, and move the other copies to reviews_duplicates rather than
+-- deleting them, so they can be checked and restored by hand.
+CREATE TABLE IF NOT EXISTS reviews_duplicates (LIKE reviews);
+
+UPDATE reviews AS kept
+SET replies = dup.replies
+FROM reviews AS dup
+WHERE dup.review_id = kept.review_id
+  AND dup.id > kept.id
+  AND (kept.replies IS NULL OR kept.replies = '')
+  AND dup.replies <> '';
+
+WITH moved AS (
+    DELETE FROM reviews AS dup
+    USING reviews AS kept
+    WHERE dup.review_id = kept.review_id
+      AND dup.id > kept.id
+    RETURNING dup.*
+)
+INSERT INTO reviews_duplicates
+SELECT * FROM moved;
+
+CREATE UNIQUE INDEX IF NOT EXISTS reviews_review_id_key ON reviews (review_id);
+DROP INDEX IF EXISTS reviews_review_id_idx;
+
+-- Bulk ingestion recomputes the statistics of the businesses it touched
+-- once, instead of once per row, by setting app.bulk_ingest for its
+-- transaction
+CREATE OR REPLACE FUNCTION reviews_stats_trigger() RETURNS TRIGGER AS $$
+BEGIN
+    IF current_setting('app.bulk_ingest', true) = 'on' THEN
+        RETURN NULL;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM apply_review_stats(
+            OLD.business_place_id::text, -1, OLD.review_rating::double precision,
+            OLD.replies IS NOT NULL AND OLD.replies <> '', OLD.review_datetime_utc::timestamp
+        );
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM apply_review_stats(
+            NEW.business_place_id::text, 1, NEW.review_rating::double precision,
+            NEW.replies IS NOT NULL AND NEW.replies <> '', NEW.review_datetime_utc::timestamp
+        );
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
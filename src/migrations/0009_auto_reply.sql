@@ -0,0 +1,38 @@
+-- Profile used to answer new reviews of a business automatically
+CREATE TABLE IF NOT EXISTS business_reply_profiles (
+    business_place_id TEXT PRIMARY KEY,
+    profile_id INTEGER NOT NULL REFERENCES profiles (id) ON DELETE CASCADE,
+    enabled BOOLEAN NOT NULL DEFAULT true,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+-- Highest review id the auto-replier has looked at; starts at the current
+-- newest review so existing reviews are not answered retroactively
+CREATE TABLE IF NOT EXISTS auto_reply_state (
+    id BOOLEAN PRIMARY KEY DEFAULT true CHECK (id),
+    last_review_id BIGINT NOT NULL
+);
+
+INSERT INTO auto_reply_state (last_review_id)
+SELECT coalesce(max(id), 0) FROM reviews
+ON CONFLICT (id) DO NOTHING;
+
+-- One notification per INSERT statement (not per row), carrying the
+-- highest new id, so bulk imports do not flood the listener
+CREATE OR REPLACE FUNCTION notify_new_reviews() RETURNS TRIGGER AS $$
+DECLARE
+    v_max_id BIGINT;
+BEGIN
+    SELECT max(id) INTO v_max_id FROM new_reviews;
+    IF v_max_id IS NOT NULL THEN
+        PERFORM pg_notify('new_reviews', v_max_id::text);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS reviews_notify_new ON reviews;
+CREATE TRIGGER reviews_notify_new
+AFTER INSERT ON reviews
+REFERENCING NEW TABLE AS new_reviews
+FOR EACH STATEMENT EXECUTE FUNCTION notify_new_reviews();
@@ -0,0 +1,9 @@
+-- Token buckets shared by all workers when RATE_LIMIT_SHARED is on
+CREATE UNLOGGED TABLE IF NOT EXISTS rate_limit_buckets (
+    tenant TEXT NOT NULL,
+    budget TEXT NOT NULL,
+    level DOUBLE PRECISION NOT NULL,
+    granted BOOLEAN NOT NULL,
+    updated_at TIMESTAMPTZ NOT NULL,
+    PRIMARY KEY (tenant, budget)
+);
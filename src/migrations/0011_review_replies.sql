@@ -0,0 +1,83 @@
+-- Generated replies, one row per version. Rows are only ever inserted, so
+-- saving a reply no longer rewrites the wide reviews row, and earlier
+-- versions are kept. reviews.replies keeps the reply imported with the
+-- review. There is no foreign key to reviews: the stats trigger below must
+-- still see the versions of a review while it is being deleted.
+CREATE TABLE IF NOT EXISTS review_replies (
+    id BIGSERIAL PRIMARY KEY,
+    review_id TEXT NOT NULL,
+    profile_id INTEGER,
+    model TEXT,
+    prompt_tokens INTEGER NOT NULL DEFAULT 0,
+    completion_tokens INTEGER NOT NULL DEFAULT 0,
+    latency_ms DOUBLE PRECISION,
+    reply TEXT NOT NULL,
+    -- Drafts are kept in the history but never become the current reply
+    status TEXT NOT NULL DEFAULT 'published' CHECK (status IN ('published', 'draft')),
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+-- The current reply of a review is its newest published version
+CREATE INDEX IF NOT EXISTS review_replies_current_idx
+    ON review_replies (review_id, id DESC)
+    WHERE status = 'published';
+
+-- Whether a review has a reply, imported or generated
+CREATE OR REPLACE FUNCTION review_has_reply(p_review_id TEXT, p_replies TEXT) RETURNS BOOLEAN AS $$
+    SELECT coalesce(p_replies, '') <> '' OR EXISTS (
+        SELECT 1 FROM review_replies
+        WHERE review_id = p_review_id AND status = 'published'
+    )
+$$ LANGUAGE sql STABLE;
+
+CREATE OR REPLACE FUNCTION reviews_stats_trigger() RETURNS TRIGGER AS $$
+BEGIN
+    IF current_setting('app.bulk_ingest', true) = 'on' THEN
+        RETURN NULL;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM apply_review_stats(
+            OLD.business_place_id::text, -1, OLD.review_rating::double precision,
+            review_has_reply(OLD.review_id, OLD.replies), OLD.review_datetime_utc::timestamp
+        );
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM apply_review_stats(
+            NEW.business_place_id::text, 1, NEW.review_rating::double precision,
+            review_has_reply(NEW.review_id, NEW.replies), NEW.review_datetime_utc::timestamp
+        );
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Count reviews that get their first reply from the inserted versions
+CREATE OR REPLACE FUNCTION review_replies_stats_trigger() RETURNS TRIGGER AS $$
+BEGIN
+    WITH first_replies AS (
+        SELECT r.business_place_id, count(*) AS replied
+        FROM (SELECT DISTINCT review_id FROM new_versions WHERE status = 'published') n
+        JOIN reviews r USING (review_id)
+        WHERE coalesce(r.replies, '') = ''
+          AND NOT EXISTS (
+              SELECT 1 FROM review_replies v
+              WHERE v.review_id = n.review_id
+                AND v.status = 'published'
+                AND NOT EXISTS (SELECT 1 FROM new_versions nv WHERE nv.id = v.id)
+          )
+        GROUP BY r.business_place_id
+    )
+    UPDATE business_review_stats AS s
+    SET replied_count = s.replied_count + f.replied,
+        updated_at = now()
+    FROM first_replies f
+    WHERE s.business_place_id = f.business_place_id;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS review_replies_stats ON review_replies;
+CREATE TRIGGER review_replies_stats
+AFTER INSERT ON review_replies
+REFERENCING NEW TABLE AS new_versions
+FOR EACH STATEMENT EXECUTE FUNCTION review_replies_stats_trigger();
@@ -0,0 +1,48 @@
+-- Reviews waiting for an automatic reply. Rows are added by the insert
+-- trigger in the transaction that inserts the review, so a review is
+-- queued whenever it commits, unlike an id watermark that passes ids of
+-- transactions still in progress. Rows are removed once answered and kept
+-- with a later next_attempt_at after a failure.
+CREATE TABLE IF NOT EXISTS auto_reply_queue (
+    review_id TEXT PRIMARY KEY,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    error TEXT,
+    enqueued_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS auto_reply_queue_due_idx
+    ON auto_reply_queue (next_attempt_at);
+
+-- Queue new unreplied reviews of businesses with auto-reply enabled, then
+-- wake the replier with one notification per INSERT statement
+CREATE OR REPLACE FUNCTION notify_new_reviews() RETURNS TRIGGER AS $$
+DECLARE
+    v_queued BIGINT;
+BEGIN
+    INSERT INTO auto_reply_queue (review_id)
+    SELECT n.review_id
+    FROM new_reviews n
+    JOIN business_reply_profiles d USING (business_place_id)
+    WHERE d.enabled
+      AND coalesce(n.replies, '') = ''
+    ON CONFLICT (review_id) DO NOTHING;
+    GET DIAGNOSTICS v_queued = ROW_COUNT;
+    IF v_queued > 0 THEN
+        PERFORM pg_notify('new_reviews', v_queued::text);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Carry over the reviews past the old watermark that are still unanswered
+INSERT INTO auto_reply_queue (review_id)
+SELECT r.review_id
+FROM reviews r
+JOIN business_reply_profiles d USING (business_place_id)
+WHERE d.enabled
+  AND r.id > (SELECT last_review_id FROM auto_reply_state)
+  AND NOT review_has_reply(r.review_id, r.replies)
+ON CONFLICT (review_id) DO NOTHING;
+
+DROP TABLE IF EXISTS auto_reply_state;
@@ -0,0 +1,74 @@
+-- Whether a review has a reply, imported (reviews.replies) or a published
+-- version in review_replies. Kept on the row so "unreplied" is a plain
+-- column test again, and the partial index below shrinks as reviews are
+-- answered instead of covering every review since 0011.
+ALTER TABLE reviews ADD COLUMN IF NOT EXISTS has_reply BOOLEAN NOT NULL DEFAULT false;
+
+UPDATE reviews SET has_reply = true
+WHERE NOT has_reply
+  AND review_has_reply(review_id, replies);
+
+CREATE OR REPLACE FUNCTION reviews_has_reply_trigger() RETURNS TRIGGER AS $$
+BEGIN
+    NEW.has_reply := review_has_reply(NEW.review_id, NEW.replies);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS reviews_has_reply ON reviews;
+CREATE TRIGGER reviews_has_reply
+BEFORE INSERT OR UPDATE OF review_id, replies ON reviews
+FOR EACH ROW EXECUTE FUNCTION reviews_has_reply_trigger();
+
+CREATE OR REPLACE FUNCTION reviews_stats_trigger() RETURNS TRIGGER AS $$
+BEGIN
+    IF current_setting('app.bulk_ingest', true) = 'on' THEN
+        RETURN NULL;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM apply_review_stats(
+            OLD.business_place_id::text, -1, OLD.review_rating::double precision,
+            OLD.has_reply, OLD.review_datetime_utc::timestamp
+        );
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM apply_review_stats(
+            NEW.business_place_id::text, 1, NEW.review_rating::double precision,
+            NEW.has_reply, NEW.review_datetime_utc::timestamp
+        );
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Mark reviews answered by the inserted versions, and count the ones that
+-- had no reply before. Setting has_reply alone fires neither the
+-- has_reply nor the stats trigger on reviews.
+CREATE OR REPLACE FUNCTION review_replies_stats_trigger() RETURNS TRIGGER AS $$
+BEGIN
+    WITH first_replies AS (
+        UPDATE reviews AS r
+        SET has_reply = true
+        FROM (SELECT DISTINCT review_id FROM new_versions WHERE status = 'published') n
+        WHERE r.review_id = n.review_id
+          AND NOT r.has_reply
+        RETURNING r.business_place_id
+    )
+    UPDATE business_review_stats AS s
+    SET replied_count = s.replied_count + f.replied,
+        updated_at = now()
+    FROM (
+        SELECT business_place_id, count(*) AS replied
+        FROM first_replies
+        GROUP BY business_place_id
+    ) f
+    WHERE s.business_place_id = f.business_place_id;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Reviews still waiting for a reply, per business, newest first
+DROP INDEX IF EXISTS reviews_unreplied_idx;
+CREATE INDEX reviews_unreplied_idx
+    ON reviews (business_place_id, review_datetime_utc DESC)
+    WHERE NOT has_reply;
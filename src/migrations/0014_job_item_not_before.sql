@@ -0,0 +1,3 @@
+-- Queued job items are not claimed before not_before; set when an item is
+-- deferred because its profile is over its token rate limit
+ALTER TABLE reply_job_items ADD COLUMN IF NOT EXISTS not_before TIMESTAMPTZ;
@@ -0,0 +1,91 @@
+-- Reviews without a reply, imported or generated, in a narrow table of
+-- their own. It shrinks as reviews are answered, like the partial index it
+-- replaces, but answering a review deletes a small row here instead of
+-- rewriting the wide reviews row (the has_reply flag of 0013).
+CREATE TABLE IF NOT EXISTS unreplied_reviews (
+    review_id TEXT PRIMARY KEY,
+    business_place_id TEXT NOT NULL,
+    review_datetime_utc TIMESTAMP
+);
+
+-- Reviews still waiting for a reply, per business, newest first
+CREATE INDEX IF NOT EXISTS unreplied_reviews_business_idx
+    ON unreplied_reviews (business_place_id, review_datetime_utc DESC);
+
+INSERT INTO unreplied_reviews (review_id, business_place_id, review_datetime_utc)
+SELECT review_id, business_place_id, review_datetime_utc
+FROM reviews
+WHERE NOT has_reply
+ON CONFLICT (review_id) DO NOTHING;
+
+-- Keep unreplied_reviews in step with inserts, deletes and changes of the
+-- imported reply or of the indexed columns
+CREATE OR REPLACE FUNCTION reviews_unreplied_trigger() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        DELETE FROM unreplied_reviews WHERE review_id = OLD.review_id;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') AND NOT review_has_reply(NEW.review_id, NEW.replies) THEN
+        INSERT INTO unreplied_reviews (review_id, business_place_id, review_datetime_utc)
+        VALUES (NEW.review_id, NEW.business_place_id, NEW.review_datetime_utc)
+        ON CONFLICT (review_id) DO UPDATE
+        SET business_place_id = EXCLUDED.business_place_id,
+            review_datetime_utc = EXCLUDED.review_datetime_utc;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS reviews_unreplied ON reviews;
+CREATE TRIGGER reviews_unreplied
+AFTER INSERT OR DELETE OR UPDATE OF review_id, business_place_id, review_datetime_utc, replies ON reviews
+FOR EACH ROW EXECUTE FUNCTION reviews_unreplied_trigger();
+
+CREATE OR REPLACE FUNCTION reviews_stats_trigger() RETURNS TRIGGER AS $$
+BEGIN
+    IF current_setting('app.bulk_ingest', true) = 'on' THEN
+        RETURN NULL;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM apply_review_stats(
+            OLD.business_place_id::text, -1, OLD.review_rating::double precision,
+            review_has_reply(OLD.review_id, OLD.replies), OLD.review_datetime_utc::timestamp
+        );
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM apply_review_stats(
+            NEW.business_place_id::text, 1, NEW.review_rating::double precision,
+            review_has_reply(NEW.review_id, NEW.replies), NEW.review_datetime_utc::timestamp
+        );
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Reviews answered by the inserted versions leave unreplied_reviews; the
+-- ones removed are exactly those getting their first reply
+CREATE OR REPLACE FUNCTION review_replies_stats_trigger() RETURNS TRIGGER AS $$
+BEGIN
+    WITH first_replies AS (
+        DELETE FROM unreplied_reviews AS u
+        USING (SELECT DISTINCT review_id FROM new_versions WHERE status = 'published') n
+        WHERE u.review_id = n.review_id
+        RETURNING u.business_place_id
+    )
+    UPDATE business_review_stats AS s
+    SET replied_count = s.replied_count + f.replied,
+        updated_at = now()
+    FROM (
+        SELECT business_place_id, count(*) AS replied
+        FROM first_replies
+        GROUP BY business_place_id
+    ) f
+    WHERE s.business_place_id = f.business_place_id;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS reviews_has_reply ON reviews;
+DROP FUNCTION IF EXISTS reviews_has_reply_trigger();
+DROP INDEX IF EXISTS reviews_unreplied_idx;
+ALTER TABLE reviews DROP COLUMN IF EXISTS has_reply;
@@ -0,0 +1,63 @@
+-- Writers applying per-review changes to business_review_stats hold a
+-- shared advisory lock on the business for their transaction. Bulk
+-- ingestion takes it exclusively before its upsert, so its recompute
+-- neither misses a concurrent change nor has one applied twice, including
+-- for businesses that have no statistics row to lock yet.
+CREATE OR REPLACE FUNCTION lock_business_stats_shared(p_business_place_id TEXT) RETURNS VOID AS $$
+BEGIN
+    PERFORM pg_advisory_xact_lock_shared(hashtext('business_review_stats'), hashtext(p_business_place_id));
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION reviews_stats_trigger() RETURNS TRIGGER AS $$
+BEGIN
+    IF current_setting('app.bulk_ingest', true) = 'on' THEN
+        RETURN NULL;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM lock_business_stats_shared(OLD.business_place_id::text);
+        PERFORM apply_review_stats(
+            OLD.business_place_id::text, -1, OLD.review_rating::double precision,
+            review_has_reply(OLD.review_id, OLD.replies), OLD.review_datetime_utc::timestamp
+        );
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM lock_business_stats_shared(NEW.business_place_id::text);
+        PERFORM apply_review_stats(
+            NEW.business_place_id::text, 1, NEW.review_rating::double precision,
+            review_has_reply(NEW.review_id, NEW.replies), NEW.review_datetime_utc::timestamp
+        );
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION review_replies_stats_trigger() RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM lock_business_stats_shared(b.business_place_id)
+    FROM (
+        SELECT DISTINCT u.business_place_id
+        FROM unreplied_reviews u
+        JOIN new_versions n USING (review_id)
+        WHERE n.status = 'published'
+        ORDER BY u.business_place_id
+    ) b;
+
+    WITH first_replies AS (
+        DELETE FROM unreplied_reviews AS u
+        USING (SELECT DISTINCT review_id FROM new_versions WHERE status = 'published') n
+        WHERE u.review_id = n.review_id
+        RETURNING u.business_place_id
+    )
+    UPDATE business_review_stats AS s
+    SET replied_count = s.replied_count + f.replied,
+        updated_at = now()
+    FROM (
+        SELECT business_place_id, count(*) AS replied
+        FROM first_replies
+        GROUP BY business_place_id
+    ) f
+    WHERE s.business_place_id = f.business_place_id;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,10 @@
+-- Queued reviews that used up AUTO_REPLY_MAX_ATTEMPTS, with their last
+-- error. They leave auto_reply_queue so it only holds work still to do;
+-- re-queue a review by inserting its id into auto_reply_queue again.
+CREATE TABLE IF NOT EXISTS auto_reply_dead_letters (
+    review_id TEXT PRIMARY KEY,
+    attempts INTEGER NOT NULL,
+    error TEXT,
+    enqueued_at TIMESTAMPTZ NOT NULL,
+    failed_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
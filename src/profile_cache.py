@@ -0,0 +1,131 @@
+import asyncio
+import hashlib
+import logging
+import time
+
+import asyncpg
+
+from . import database
+from .serialization import dumps
+from .config import PROFILE_CACHE_TTL_SECONDS, PROFILE_CACHE_CHANNEL
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+class ProfileCache:
+    """
+    Read-through cache of profiles shared by the message and profiles routers.
+    Entries are dropped explicitly when a profile changes, and other workers
+    are told to do the same through Postgres LISTEN/NOTIFY. A TTL bounds
+    staleness for changes made outside the API. A load that overlaps an
+    invalidation is returned but not stored, since it may predate the change.
+    """
+
+    def __init__(self, ttl_seconds: float, channel: str):
+        self.ttl_seconds = ttl_seconds
+        self.channel = channel
+        self._profiles = {}
+        self._listing = None
+        self._generation = 0
+        self._listener_task = None
+
+    async def get(self, db_pool, profile_id: int) -> dict | None:
+        """
+        Return the full profile row, loading it on a miss.
+        """
+        entry = self._profiles.get(profile_id)
+        if entry and entry[1] > time.monotonic():
+            return entry[0]
+
+        generation = self._generation
+        async with db_pool.acquire() as connection:
+            row = await database.fetch_profile(connection, profile_id)
+
+        if row is None:
+            return None
+        profile = dict(row)
+        if generation == self._generation:
+            self._profiles[profile_id] = (profile, time.monotonic() + self.ttl_seconds)
+        return profile
+
+    async def list_profiles(self, db_pool) -> tuple[bytes, str]:
+        """
+        Return the profile listing, encoded as JSON, and its ETag, loading
+        it on a miss.
+        """
+        if self._listing and self._listing[2] > time.monotonic():
+            return self._listing[0], self._listing[1]
+
+        generation = self._generation
+        async with db_pool.acquire() as connection:
+            rows = await database.fetch_profiles(connection)
+
+        body = dumps([dict(row) for row in rows])
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        if generation == self._generation:
+            self._listing = (body, etag, time.monotonic() + self.ttl_seconds)
+        return body, etag
+
+    def invalidate(self, profile_id: int | None = None):
+        """
+        Drop one profile (or every profile) and the cached listing.
+        """
+        self._generation += 1
+        if profile_id is None:
+            self._profiles.clear()
+        else:
+            self._profiles.pop(profile_id, None)
+        self._listing = None
+
+    async def publish_invalidation(self, connection, profile_id: int | None = None):
+        """
+        Invalidate locally and notify the other workers. Call it in the
+        transaction that changes the profile: the notification is sent when
+        that commits, and a failure to send it rolls the change back.
+        """
+        self.invalidate(profile_id)
+        payload = "*" if profile_id is None else str(profile_id)
+        await database.notify(connection, self.channel, payload)
+
+    def _on_notification(self, connection, pid, channel, payload):
+        self.invalidate(None if payload == "*" else int(payload))
+
+    async def _listen(self):
+        while True:
+            connection = None
+            try:
+                connection = await asyncpg.connect(**database.DB_CONFIG)
+                closed = asyncio.Event()
+                connection.add_termination_listener(lambda _: closed.set())
+                await connection.add_listener(self.channel, self._on_notification)
+                # Changes may have been missed while not listening
+                self.invalidate()
+                logger.info(f"Listening for profile changes on channel {self.channel}")
+                await closed.wait()
+                logger.warning("Profile change listener connection lost, reconnecting")
+            except asyncio.CancelledError:
+                if connection is not None and not connection.is_closed():
+                    await connection.close()
+                raise
+            except (OSError, asyncpg.PostgresError) as e:
+                logger.error(f"Profile change listener failed: {str(e)}")
+            self.invalidate()
+            await asyncio.sleep(5)
+
+    def start_listener(self):
+        if self._listener_task is None:
+            self._listener_task = asyncio.create_task(self._listen())
+
+    async def stop_listener(self):
+        if self._listener_task is not None:
+            self._listener_task.cancel()
+            try:
+                await self._listener_task
+            except asyncio.CancelledError:
+                pass
+            self._listener_task = None
+
+profile_cache = ProfileCache(
+    ttl_seconds=PROFILE_CACHE_TTL_SECONDS,
+    channel=PROFILE_CACHE_CHANNEL
+)
@@ -0,0 +1,109 @@
+import functools
+import logging
+
+from .config import PROMPT_MAX_TOKENS, PROMPT_PROFILE_MAX_TOKENS, PROMPT_REVIEW_MAX_TOKENS
+
+try:
+    import tiktoken
+except ImportError:  # optional: counts fall back to a character heuristic
+    tiktoken = None
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Tokenizer of the chat models in use
+ENCODING_NAME = "cl100k_base"
+
+# Chat format overhead per message (role and separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# Marks the cut when text is shortened to fit its budget
+ELLIPSIS = " [...] "
+
+@functools.lru_cache(maxsize=1)
+def _encoding():
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.get_encoding(ENCODING_NAME)
+    except Exception as e:
+        # The encoding is downloaded on first use and may be unavailable offline
+        logger.warning(f"tiktoken encoding unavailable, estimating token counts: {str(e)}")
+        return None
+
+def count_tokens(text: str) -> int:
+    """
+    Count tokens with tiktoken when installed, else estimate at about four
+    characters per token (which over-counts English slightly).
+    """
+    encoding = _encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    return (len(text) + 3) // 4
+
+def truncate_to_budget(text: str, max_tokens: int) -> str:
+    """
+    Shorten text to at most max_tokens, keeping its beginning and its end
+    (where reviews usually state their verdict) around an ellipsis.
+    """
+    if max_tokens <= 0:
+        return ""
+    if count_tokens(text) <= max_tokens:
+        return text
+
+    keep = max(max_tokens - count_tokens(ELLIPSIS), 1)
+    head_size = keep * 2 // 3
+    tail_size = keep - head_size
+    encoding = _encoding()
+    if encoding is not None:
+        tokens = encoding.encode(text)
+        head = encoding.decode(tokens[:head_size])
+        tail = encoding.decode(tokens[-tail_size:]) if tail_size else ""
+    else:
+        head = text[:head_size * 4]
+        tail = text[-tail_size * 4:] if tail_size else ""
+    return f"{head.rstrip()}{ELLIPSIS}{tail.lstrip()}"
+
+@functools.lru_cache(maxsize=1024)
+def system_prefix(profile_text_base: str, profile_text_addon: str) -> tuple[str, int]:
+    """
+    Build the system message for a profile and count its tokens, once per
+    distinct profile text. Editing a profile changes the key, so stale
+    prefixes are never reused.
+    """
+    profile_text = truncate_to_budget(f"{profile_text_base}\n{profile_text_addon}", PROMPT_PROFILE_MAX_TOKENS)
+    system_message = f"You are an AI assistant with the following personality profile: {profile_text}"
+    return system_message, count_tokens(system_message) + MESSAGE_OVERHEAD_TOKENS
+
+def build_system_message(profile_row) -> str:
+    """
+    Create the system message with the personality profile.
+    """
+    return system_prefix(profile_row['profile_text_base'], profile_row['profile_text_addon'])[0]
+
+def build_message_content(message_row, system_message: str | None = None) -> str:
+    """
+    Create the user message from a review's text, author and rating. The
+    review text is shortened so the whole prompt, including the system
+    message when given, stays within PROMPT_MAX_TOKENS.
+    """
+    username = message_row['username'].split(' ')[0]
+    suffix = f" - sent by {username} who gave a rating of {message_row['rating']} stars"
+
+    budget = PROMPT_REVIEW_MAX_TOKENS
+    if system_message is not None:
+        system_tokens = count_tokens(system_message) + MESSAGE_OVERHEAD_TOKENS
+        budget = min(budget, PROMPT_MAX_TOKENS - system_tokens - count_tokens(suffix) - MESSAGE_OVERHEAD_TOKENS)
+
+    review_text = message_row['message'] or ""
+    shortened = truncate_to_budget(review_text, budget)
+    if shortened != review_text:
+        logger.info(f"Review text shortened from {count_tokens(review_text)} to {count_tokens(shortened)} tokens")
+    return f"{shortened}{suffix}"
+
+def prompt_tokens(messages: list[dict]) -> int:
+    """
+    Count the prompt tokens of chat messages, for calls whose response
+    carries no usage (streams).
+    """
+    return sum(count_tokens(message["content"]) + MESSAGE_OVERHEAD_TOKENS for message in messages)
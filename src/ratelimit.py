@@ -0,0 +1,204 @@
+import asyncio
+import contextvars
+import logging
+import math
+import time
+from collections import OrderedDict
+
+import asyncpg
+from fastapi import HTTPException
+
+from . import database, metrics
+from .config import (
+    RATE_LIMIT_ENABLED,
+    RATE_LIMIT_REQUESTS_PER_MINUTE,
+    RATE_LIMIT_REQUEST_BURST,
+    RATE_LIMIT_TOKENS_PER_MINUTE,
+    RATE_LIMIT_TOKEN_BURST,
+    RATE_LIMIT_SHARED,
+    RATE_LIMIT_MAX_TENANTS,
+)
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Tenant whose request is being served, charged for the tokens its replies use
+current_tenant = contextvars.ContextVar("current_tenant", default=None)
+
+class RateLimitExceeded(Exception):
+    def __init__(self, budget: str, retry_after: float):
+        super().__init__(f"{budget} rate limit exceeded, retry in {retry_after:.1f}s")
+        self.budget = budget
+        self.retry_after = retry_after
+
+class TokenBucket:
+    """
+    Holds up to `capacity` tokens and refills at `rate` tokens per second.
+    """
+
+    def __init__(self, capacity: float, rate: float):
+        self.capacity = capacity
+        self.rate = rate
+        self.level = capacity
+        self.updated = time.monotonic()
+
+    def take(self, cost: float, required: float) -> bool:
+        """
+        Take `cost` tokens if at least `required` are left. The level may go
+        negative when the cost is larger, so usage measured after the fact
+        is still paid back before the next request is admitted.
+        """
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.level < required:
+            return False
+        self.level -= cost
+        return True
+
+class TenantRateLimiter:
+    """
+    Per-tenant token buckets for two budgets: `requests` counts replies
+    asked for, `tokens` counts OpenAI tokens used. A request is admitted
+    while its tenant has requests left and its token bucket is not in debt;
+    the tokens its replies use are charged once known (see `charge`).
+
+    Buckets live in this process, keeping the least recently used
+    `max_tenants`, or in Postgres when `shared` so all workers draw from
+    the same budget at the cost of one statement per check. Bucket levels
+    are exported for the same `max_tenants` most recent tenants only.
+    """
+
+    def __init__(self, requests_per_minute: float, request_burst: float, tokens_per_minute: float,
+                 token_burst: float, shared: bool = False, max_tenants: int = 10000):
+        self.budgets = {
+            "requests": (request_burst, requests_per_minute / 60),
+            "tokens": (token_burst, tokens_per_minute / 60),
+        }
+        self.shared = shared
+        self.max_tenants = max_tenants
+        self._buckets = OrderedDict()
+        self._observed = OrderedDict()
+        self._db_pool = None
+        self._pending = set()
+
+    def _bucket(self, tenant: str, budget: str) -> TokenBucket:
+        key = (tenant, budget)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(*self.budgets[budget])
+            while len(self._buckets) > self.max_tenants * len(self.budgets):
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket
+
+    def _observe(self, tenant: str, budget: str, level: float):
+        """
+        Export a bucket level, dropping the series of the least recently
+        seen tenant once more than `max_tenants` are exported.
+        """
+        metrics.RATE_LIMIT_LEVEL.labels(tenant, budget).set(level)
+        self._observed[tenant] = True
+        self._observed.move_to_end(tenant)
+        while len(self._observed) > self.max_tenants:
+            evicted, _ = self._observed.popitem(last=False)
+            for name in self.budgets:
+                try:
+                    metrics.RATE_LIMIT_LEVEL.remove(evicted, name)
+                except KeyError:
+                    pass
+
+    async def _take(self, db_pool, tenant: str, budget: str, cost: float, required: float) -> bool:
+        capacity, rate = self.budgets[budget]
+        if self.shared and db_pool is not None:
+            async with db_pool.acquire() as connection:
+                level, granted = await database.take_rate_limit(
+                    connection, tenant, budget, capacity, rate, cost, required
+                )
+        else:
+            bucket = self._bucket(tenant, budget)
+            granted = bucket.take(cost, required)
+            level = bucket.level
+        self._observe(tenant, budget, level)
+        if not granted:
+            metrics.RATE_LIMITED.labels(budget).inc()
+            raise RateLimitExceeded(budget, (required - level) / rate)
+        return granted
+
+    async def acquire(self, db_pool, tenant: str, requests: int = 1):
+        """
+        Admit `requests` replies for a tenant or raise RateLimitExceeded.
+        Tokens used by the replies are then charged to the same tenant.
+        """
+        # A batch larger than the burst is admitted from a full bucket and
+        # charged in full, leaving the tenant in debt until it refills
+        required = min(requests, self.budgets["requests"][0])
+        await self.check_tokens(db_pool, tenant)
+        await self._take(db_pool, tenant, "requests", requests, required)
+        self._db_pool = db_pool
+        current_tenant.set(tenant)
+
+    async def check_tokens(self, db_pool, tenant: str):
+        """
+        Raise RateLimitExceeded while the tenant's token bucket is in debt,
+        without taking anything.
+        """
+        await self._take(db_pool, tenant, "tokens", 0, 0)
+        self._db_pool = db_pool
+
+    def charge(self, tokens: int):
+        """
+        Charge the tokens used by a reply to the tenant being served, if any.
+        """
+        tenant = current_tenant.get()
+        if tenant is None or tokens <= 0:
+            return
+        if not self.shared or self._db_pool is None:
+            bucket = self._bucket(tenant, "tokens")
+            bucket.take(tokens, -math.inf)
+            self._observe(tenant, "tokens", bucket.level)
+            return
+        # Keep the write off the reply path
+        task = asyncio.create_task(self._charge_shared(tenant, tokens))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def _charge_shared(self, tenant: str, tokens: int):
+        try:
+            await self._take(self._db_pool, tenant, "tokens", tokens, -math.inf)
+        except (OSError, asyncpg.PostgresError) as e:
+            logger.error(f"Failed to charge {tokens} tokens to {tenant}: {str(e)}")
+
+def tenant_key(profile_id: int) -> str:
+    """
+    Identify the tenant of a request by its profile. Nothing the client
+    sends can be chosen freely to start from a fresh bucket.
+    """
+    return f"profile:{profile_id}"
+
+async def enforce_rate_limit(profile_id: int, db_pool, requests: int = 1):
+    """
+    Apply the tenant's rate limits to a /message request, raising 429 with
+    Retry-After when a budget is exhausted.
+    """
+    if not RATE_LIMIT_ENABLED:
+        return
+    try:
+        await rate_limiter.acquire(db_pool, tenant_key(profile_id), requests)
+    except RateLimitExceeded as e:
+        logger.warning(f"Rate limited profile {profile_id}: {str(e)}")
+        raise HTTPException(
+            status_code=429,
+            detail=f"Too many {e.budget}, retry later",
+            headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))}
+        )
+
+rate_limiter = TenantRateLimiter(
+    requests_per_minute=RATE_LIMIT_REQUESTS_PER_MINUTE,
+    request_burst=RATE_LIMIT_REQUEST_BURST,
+    tokens_per_minute=RATE_LIMIT_TOKENS_PER_MINUTE,
+    token_burst=RATE_LIMIT_TOKEN_BURST,
+    shared=RATE_LIMIT_SHARED,
+    max_tenants=RATE_LIMIT_MAX_TENANTS
+)
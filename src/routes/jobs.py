@@ -0,0 +1,164 @@
+from fastapi import APIRouter, HTTPException, Request
+from pydantic import BaseModel
+from datetime import datetime
+import logging
+import asyncpg
+from .. import database
+from ..config import JOB_MAX_ITEMS
+from ..ratelimit import enforce_rate_limit
+from .message import BatchMessageRequest
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Initialize router
+router = APIRouter(
+    prefix="/jobs",
+    tags=["jobs"]
+)
+
+class JobSubmitResponse(BaseModel):
+    job_id: int
+    total: int
+
+class JobStatusResponse(BaseModel):
+    job_id: int
+    profile_id: int
+    created_at: datetime
+    status: str
+    total: int
+    queued: int
+    running: int
+    succeeded: int
+    failed: int
+
+class JobItemResult(BaseModel):
+    message_id: str
+    status: str
+    attempts: int
+    response: str | None
+    error: str | None
+
+class JobResultsResponse(BaseModel):
+    job_id: int
+    results: list[JobItemResult]
+
+def get_db_pool(req: Request):
+    db_pool = req.app.state.db_pool
+    if not db_pool:
+        logger.error("Database connection pool not available")
+        raise HTTPException(
+            status_code=503,
+            detail="Database service unavailable"
+        )
+    return db_pool
+
+@router.post("/submit", response_model=JobSubmitResponse)
+async def submit_job(request: BatchMessageRequest, req: Request):
+    """
+    Enqueue reply generation for many reviews and return a job ID at once.
+    Takes the same selection as /message/get_responses_batch. The work is
+    done by job workers; poll /jobs/{job_id} for progress. Each item
+    counts as one request against the profile's rate limit, checked
+    before the job is created.
+    """
+    if (request.message_ids is None) == (request.business_place_id is None):
+        raise HTTPException(
+            status_code=400,
+            detail="Provide exactly one of message_ids or business_place_id"
+        )
+
+    if request.message_ids is not None and len(request.message_ids) > JOB_MAX_ITEMS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {JOB_MAX_ITEMS} reviews can be submitted per job"
+        )
+
+    db_pool = get_db_pool(req)
+    try:
+        if request.message_ids is not None:
+            message_ids = list(dict.fromkeys(request.message_ids))
+            requested = len(message_ids)
+        else:
+            async with db_pool.acquire() as connection:
+                requested = await database.count_job_items_by_business(
+                    connection, request.business_place_id, request.only_unreplied, JOB_MAX_ITEMS
+                )
+        # Checked without holding a connection: the shared limiter takes its own
+        await enforce_rate_limit(request.profile_id, db_pool, max(1, requested))
+
+        async with db_pool.acquire() as connection:
+            async with connection.transaction():
+                job_id = await database.create_job(connection, request.profile_id)
+
+                if request.message_ids is not None:
+                    total = await database.enqueue_job_items_by_ids(
+                        connection, job_id, request.profile_id, request.bypass_cache, message_ids
+                    )
+                else:
+                    total = await database.enqueue_job_items_by_business(
+                        connection, job_id, request.profile_id, request.bypass_cache,
+                        request.business_place_id, request.only_unreplied, JOB_MAX_ITEMS
+                    )
+
+        logger.info(f"Submitted job {job_id} with {total} items")
+        return JobSubmitResponse(job_id=job_id, total=total)
+    except asyncpg.PostgresError as e:
+        logger.error(f"Database error while submitting job: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to submit job")
+
+@router.get("/{job_id}", response_model=JobStatusResponse)
+async def get_job_status(job_id: int, req: Request):
+    """
+    Report the progress of a job as counts of items per status.
+    """
+    db_pool = get_db_pool(req)
+    try:
+        async with db_pool.acquire() as connection:
+            row = await database.fetch_job_status(connection, job_id)
+    except asyncpg.PostgresError as e:
+        logger.error(f"Database error while fetching job status: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to fetch job status")
+
+    if not row:
+        raise HTTPException(status_code=404, detail=f"Job with ID {job_id} not found")
+
+    if row['queued'] + row['running'] == 0:
+        status = "completed"
+    elif row['queued'] == row['total']:
+        status = "queued"
+    else:
+        status = "running"
+
+    return JobStatusResponse(
+        job_id=row['id'],
+        profile_id=row['profile_id'],
+        created_at=row['created_at'],
+        status=status,
+        total=row['total'],
+        queued=row['queued'],
+        running=row['running'],
+        succeeded=row['succeeded'],
+        failed=row['failed']
+    )
+
+@router.get("/{job_id}/results", response_model=JobResultsResponse)
+async def get_job_results(job_id: int, req: Request):
+    """
+    Return the per-review outcome of a job.
+    """
+    db_pool = get_db_pool(req)
+    try:
+        async with db_pool.acquire() as connection:
+            rows = await database.fetch_job_results(connection, job_id)
+    except asyncpg.PostgresError as e:
+        logger.error(f"Database error while fetching job results: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to fetch job results")
+
+    if rows is None:
+        raise HTTPException(status_code=404, detail=f"Job with ID {job_id} not found")
+
+    return JobResultsResponse(
+        job_id=job_id,
+        results=[JobItemResult(**dict(row)) for row in rows]
+    )
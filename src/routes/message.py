@@ -1,38 +1,203 @@
 from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from openai import OpenAI
-import os
-from dotenv import load_dotenv
+import asyncio
+import json
 import logging
+import time
 import asyncpg
+from .. import database, llm, routing
+from ..cache import cache_key, reply_cache
+from ..profile_cache import profile_cache
+from ..singleflight import reply_flight
+from ..ratelimit import enforce_rate_limit, rate_limiter
+from ..lifecycle import in_flight
+from ..prompts import build_system_message, build_message_content, count_tokens, prompt_tokens
+from ..usage import usage_recorder
+from ..config import MESSAGE_BATCH_MAX_SIZE, MESSAGE_BATCH_CONCURRENCY
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
-# Load environment variables
-load_dotenv()
-
 # Initialize router
 router = APIRouter(
     prefix="/message",
     tags=["message"]
 )
 
-# Initialize OpenAI client with optional API key
-api_key = os.getenv("OPENAI_API_KEY")
-client = OpenAI(api_key=api_key) if api_key else None
-
 class MessageRequest(BaseModel):
     profile_id: int
     message_id: str
+    bypass_cache: bool = False
 
 class MessageResponse(BaseModel):
     response: str
 
+class BatchMessageRequest(BaseModel):
+    profile_id: int
+    message_ids: list[str] | None = None
+    business_place_id: str | None = None
+    only_unreplied: bool = True
+    bypass_cache: bool = False
+
+class BatchMessageResult(BaseModel):
+    message_id: str
+    response: str | None = None
+    error: str | None = None
+
+class BatchMessageResponse(BaseModel):
+    profile_id: int
+    results: list[BatchMessageResult]
+    succeeded: int
+    failed: int
+
+class GeneratedReply(BaseModel):
+    """
+    A reply and how it was produced; replies served from the cache have no
+    model, tokens or latency.
+    """
+    text: str
+    model: str | None = None
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    latency_ms: float | None = None
+
+    def version(self, message_id: str, profile_id: int | None) -> tuple:
+        """
+        The review_replies row saving this reply (see database.save_replies).
+        """
+        return (message_id, profile_id, self.model, self.prompt_tokens, self.completion_tokens,
+                self.latency_ms, self.text)
+
+def completion_params(system_message: str, message_content: str, settings: dict | None = None) -> dict:
+    """
+    Build the chat completion arguments for a reply, for the first model
+    of the routed settings (see routing.completion_settings).
+    """
+    settings = settings or routing.default_settings()
+    return {
+        "model": settings["models"][0],
+        "messages": [
+            {"role": "system", "content": system_message},
+            {"role": "user", "content": message_content}
+        ],
+        "temperature": settings["temperature"],
+        "max_tokens": settings["max_tokens"]
+    }
+
+def record_usage(params: dict, profile_id: int | None, message_id: str | None, reply: str, latency: float,
+                 usage=None, model: str | None = None) -> GeneratedReply:
+    """
+    Record the token usage of a generated reply for its profile. Counts
+    come from the API response when it has them and are counted locally
+    otherwise. `model` is the model that answered, if not the first one.
+    The tokens are also charged to the rate limit of the tenant served.
+    Returns the reply with its model, tokens and latency.
+    """
+    generated = GeneratedReply(text=reply, model=model or params["model"], latency_ms=latency * 1000)
+    if usage is not None:
+        generated.prompt_tokens, generated.completion_tokens = usage.prompt_tokens, usage.completion_tokens
+    if profile_id is None or message_id is None:
+        return generated
+    if usage is None:
+        generated.prompt_tokens, generated.completion_tokens = prompt_tokens(params["messages"]), count_tokens(reply)
+    usage_recorder.record(
+        profile_id, message_id, generated.model, generated.prompt_tokens, generated.completion_tokens,
+        generated.latency_ms
+    )
+    rate_limiter.charge(generated.prompt_tokens + generated.completion_tokens)
+    return generated
+
+async def generate_reply(system_message: str, message_content: str, db_pool=None, bypass_cache: bool = False,
+                         profile_id: int | None = None, message_id: str | None = None,
+                         settings: dict | None = None) -> GeneratedReply:
+    """
+    Make the API call to OpenAI and return the generated reply.
+    The routed settings pick the models to try, falling back from one to
+    the next. Identical requests are served from the reply cache unless
+    bypassed. Token usage is recorded when the profile and review are given.
+    """
+    settings = settings or routing.default_settings()
+    params = completion_params(system_message, message_content, settings)
+    key = cache_key(params)
+    if not bypass_cache:
+        cached_reply = await reply_cache.get(key, db_pool)
+        if cached_reply is not None:
+            return GeneratedReply(text=cached_reply)
+
+    start = time.perf_counter()
+    response = await routing.create_chat_completion(params, settings["models"])
+    reply = response.choices[0].message.content
+    generated = record_usage(
+        params, profile_id, message_id, reply, time.perf_counter() - start,
+        getattr(response, "usage", None), getattr(response, "model", None)
+    )
+    await reply_cache.set(key, reply, db_pool)
+    return generated
+
+def format_sse(data: dict, event: str | None = None) -> str:
+    """
+    Format a payload as a Server-Sent Events message.
+    """
+    message = f"event: {event}\n" if event else ""
+    return message + f"data: {json.dumps(data)}\n\n"
+
+async def fetch_generation_inputs(db_pool, profile_id: int, message_id: str) -> tuple[str, str, dict]:
+    """
+    Load the profile and review needed to generate a reply.
+    Returns the system message, the user message content and the
+    completion settings routed for the review.
+    """
+    try:
+        # First fetch the profile, usually from the profile cache
+        profile_row = await profile_cache.get(db_pool, profile_id)
+
+        if not profile_row:
+            raise HTTPException(
+                status_code=404,
+                detail=f"Profile with ID {profile_id} not found"
+            )
+
+        async with db_pool.acquire() as connection:
+            # Then fetch the message, username, and rating
+            message_row = await database.fetch_review_for_reply(connection, message_id)
+            
+            if not message_row:
+                raise HTTPException(
+                    status_code=404,
+                    detail=f"Review with ID {message_id} not found"
+                )
+            
+    except asyncpg.PostgresError as e:
+        logger.error(f"Database error while fetching data: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Database error: {str(e)}"
+        )
+
+    # The system message is built once per profile text; the review text is
+    # shortened to what is left of the prompt budget
+    system_message = build_system_message(profile_row)
+    settings = routing.completion_settings(profile_row, message_row)
+    return system_message, build_message_content(message_row, system_message), settings
+
+async def save_reply(db_pool, message_id: str, profile_id: int, reply: GeneratedReply):
+    """
+    Save a generated reply as the review's new reply version. Failures are
+    logged, not raised.
+    """
+    try:
+        async with db_pool.acquire() as connection:
+            await database.save_replies(connection, [reply.version(message_id, profile_id)])
+            logger.info(f"Successfully saved response for review {message_id}")
+    except asyncpg.PostgresError as e:
+        logger.error(f"Database error while saving response: {str(e)}")
+        # Don't raise an error here as we still want to return the response to the user
+
 @router.post("/get_response", response_model=MessageResponse)
 async def get_message_response(request: MessageRequest, req: Request):
     try:
-        if not client:
+        if not llm.get_client():
             raise HTTPException(
                 status_code=500,
                 detail="OpenAI API key not configured. Please set OPENAI_API_KEY environment variable."
@@ -47,83 +212,236 @@ async def get_message_response(request: MessageRequest, req: Request):
                 detail="Database service unavailable"
             )
 
-        # Fetch profile and message from database
+        await enforce_rate_limit(request.profile_id, db_pool)
+
+        async def generate_and_save() -> str:
+            async with in_flight.track():
+                # Fetch profile and message from database
+                system_message, message_content, settings = await fetch_generation_inputs(
+                    db_pool, request.profile_id, request.message_id
+                )
+
+                # Make the API call to OpenAI
+                ai_response = await generate_reply(
+                    system_message, message_content, db_pool, request.bypass_cache,
+                    profile_id=request.profile_id, message_id=request.message_id, settings=settings
+                )
+
+                # Save the response to the database
+                await save_reply(db_pool, request.message_id, request.profile_id, ai_response)
+                return ai_response.text
+
+        async def read_saved_reply() -> tuple[int | None, str | None]:
+            async with db_pool.acquire() as connection:
+                row = await database.fetch_reply(connection, request.message_id)
+            return (row['version_id'], row['reply']) if row else (None, None)
+
+        # Concurrent requests for the same review and profile, in this or
+        # another worker, share one generation and one write
+        ai_response = await reply_flight.run(
+            request.profile_id, request.message_id, generate_and_save, read_saved_reply, request.bypass_cache
+        )
+        
+        return MessageResponse(response=ai_response)
+    
+    except HTTPException as he:
+        raise he
+    except llm.timeout_error():
+        logger.error("Timed out waiting for OpenAI in get_message_response")
+        raise HTTPException(status_code=504, detail="Timed out generating response")
+    except routing.CircuitOpenError as e:
+        logger.error(f"No model available in get_message_response: {str(e)}")
+        raise HTTPException(status_code=503, detail="Reply generation is temporarily unavailable")
+    except Exception as e:
+        logger.error(f"Unexpected error in get_message_response: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e)) 
+
+@router.post("/get_response_stream")
+async def get_message_response_stream(request: MessageRequest, req: Request):
+    """
+    Generate a reply and relay it as Server-Sent Events while it is produced.
+    Each token arrives as a `data: {"delta": ...}` message, followed by a
+    final `done` event carrying the full reply. The reply is saved as a new
+    version only once the stream has completed.
+    """
+    if not llm.get_client():
+        raise HTTPException(
+            status_code=500,
+            detail="OpenAI API key not configured. Please set OPENAI_API_KEY environment variable."
+        )
+
+    db_pool = req.app.state.db_pool
+    if not db_pool:
+        logger.error("Database connection pool not available")
+        raise HTTPException(
+            status_code=503,
+            detail="Database service unavailable"
+        )
+
+    await enforce_rate_limit(request.profile_id, db_pool)
+
+    # Resolve the inputs before streaming so lookup errors are proper HTTP errors
+    system_message, message_content, settings = await fetch_generation_inputs(
+        db_pool, request.profile_id, request.message_id
+    )
+
+    params = completion_params(system_message, message_content, settings)
+    key = cache_key(params)
+    cached_reply = None if request.bypass_cache else await reply_cache.get(key, db_pool)
+
+    async def event_stream():
+        if cached_reply is not None:
+            await save_reply(db_pool, request.message_id, request.profile_id, GeneratedReply(text=cached_reply))
+            yield format_sse({"delta": cached_reply})
+            yield format_sse({"response": cached_reply}, event="done")
+            return
+
+        async with in_flight.track():
+            parts = []
+            start = time.perf_counter()
+            try:
+                async for delta in routing.stream_chat_completion(params, settings["models"]):
+                    parts.append(delta)
+                    yield format_sse({"delta": delta})
+            except Exception as e:
+                logger.error(f"Error while streaming response for review {request.message_id}: {str(e)}")
+                yield format_sse({"detail": str(e)}, event="error")
+                return
+
+            ai_response = "".join(parts)
+            generated = record_usage(
+                params, request.profile_id, request.message_id, ai_response, time.perf_counter() - start
+            )
+            await reply_cache.set(key, ai_response, db_pool)
+            await save_reply(db_pool, request.message_id, request.profile_id, generated)
+            yield format_sse({"response": ai_response}, event="done")
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.get("/cache_stats")
+async def get_cache_stats():
+    """
+    Report reply cache size and hit/miss counters for this process.
+    """
+    return reply_cache.stats()
+
+@router.post("/get_responses_batch", response_model=BatchMessageResponse)
+async def get_message_responses_batch(request: BatchMessageRequest, req: Request):
+    """
+    Generate replies for many reviews with a single profile.
+    Reviews are selected either by an explicit list of review IDs or by
+    business place ID. Reviews are loaded in one query, generated
+    concurrently and saved as new reply versions with one INSERT.
+    """
+    try:
+        if not llm.get_client():
+            raise HTTPException(
+                status_code=500,
+                detail="OpenAI API key not configured. Please set OPENAI_API_KEY environment variable."
+            )
+
+        if (request.message_ids is None) == (request.business_place_id is None):
+            raise HTTPException(
+                status_code=400,
+                detail="Provide exactly one of message_ids or business_place_id"
+            )
+
+        if request.message_ids is not None and len(request.message_ids) > MESSAGE_BATCH_MAX_SIZE:
+            raise HTTPException(
+                status_code=400,
+                detail=f"At most {MESSAGE_BATCH_MAX_SIZE} reviews can be processed per batch"
+            )
+
+        db_pool = req.app.state.db_pool
+        if not db_pool:
+            logger.error("Database connection pool not available")
+            raise HTTPException(
+                status_code=503,
+                detail="Database service unavailable"
+            )
+
+        # Fetch the profile and every requested review in one query
         try:
+            profile_row = await profile_cache.get(db_pool, request.profile_id)
+
+            if not profile_row:
+                raise HTTPException(
+                    status_code=404,
+                    detail=f"Profile with ID {request.profile_id} not found"
+                )
+
             async with db_pool.acquire() as connection:
-                # First fetch the profile
-                profile_query = """
-                    SELECT profile_text_base, profile_text_addon
-                    FROM profiles
-                    WHERE id = $1
-                """
-                profile_row = await connection.fetchrow(profile_query, request.profile_id)
-                
-                if not profile_row:
-                    raise HTTPException(
-                        status_code=404,
-                        detail=f"Profile with ID {request.profile_id} not found"
+                if request.message_ids is not None:
+                    message_rows = await database.fetch_reviews_for_reply_by_ids(
+                        connection, request.message_ids, request.only_unreplied
                     )
-                
-                # Combine profile texts with a newline
-                profile_text = f"{profile_row['profile_text_base']}\n{profile_row['profile_text_addon']}"
-                
-                # Then fetch the message, username, and rating
-                message_query = """
-                    SELECT review_text as message, author_title as username, review_rating as rating
-                    FROM reviews
-                    WHERE review_id = $1
-                """
-                message_row = await connection.fetchrow(message_query, request.message_id)
-                
-                if not message_row:
-                    raise HTTPException(
-                        status_code=404,
-                        detail=f"Review with ID {request.message_id} not found"
+                else:
+                    message_rows = await database.fetch_reviews_for_reply_by_business(
+                        connection, request.business_place_id, request.only_unreplied, MESSAGE_BATCH_MAX_SIZE
                     )
-                
-                message_content = f"{message_row['message']} - sent by {message_row['username'].split(' ')[0]} who gave a rating of {message_row['rating']} stars"
         except asyncpg.PostgresError as e:
-            logger.error(f"Database error while fetching data: {str(e)}")
+            logger.error(f"Database error while fetching batch data: {str(e)}")
             raise HTTPException(
                 status_code=500,
                 detail=f"Database error: {str(e)}"
             )
-            
-        # Create the system message with the personality profile
-        system_message = f"You are an AI assistant with the following personality profile: {profile_text}"
-        
-        # Make the API call to OpenAI
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": system_message},
-                {"role": "user", "content": message_content}
-            ],
-            temperature=0.7,
-            max_tokens=500
+
+        # Each review to answer counts as one request
+        await enforce_rate_limit(request.profile_id, db_pool, max(1, len(message_rows)))
+
+        system_message = build_system_message(profile_row)
+        semaphore = asyncio.Semaphore(MESSAGE_BATCH_CONCURRENCY)
+        generated = {}
+
+        async def generate_one(message_row) -> BatchMessageResult:
+            async with semaphore:
+                try:
+                    reply = await generate_reply(
+                        system_message, build_message_content(message_row, system_message), db_pool,
+                        request.bypass_cache, profile_id=request.profile_id, message_id=message_row['review_id'],
+                        settings=routing.completion_settings(profile_row, message_row)
+                    )
+                    generated[message_row['review_id']] = reply
+                    return BatchMessageResult(message_id=message_row['review_id'], response=reply.text)
+                except Exception as e:
+                    logger.error(f"Failed to generate response for review {message_row['review_id']}: {str(e)}")
+                    return BatchMessageResult(message_id=message_row['review_id'], error=str(e))
+
+        results = await asyncio.gather(*[generate_one(row) for row in message_rows])
+
+        # Report requested reviews that were not loaded
+        if request.message_ids is not None:
+            found = {row['review_id'] for row in message_rows}
+            for message_id in dict.fromkeys(request.message_ids):
+                if message_id not in found:
+                    reason = "Review not found or already replied" if request.only_unreplied else "Review not found"
+                    results.append(BatchMessageResult(message_id=message_id, error=reason))
+
+        # Save all generated responses with a single INSERT
+        if generated:
+            try:
+                async with db_pool.acquire() as connection:
+                    await database.save_replies(
+                        connection,
+                        [reply.version(message_id, request.profile_id) for message_id, reply in generated.items()]
+                    )
+                    logger.info(f"Successfully saved {len(generated)} batch responses")
+            except asyncpg.PostgresError as e:
+                logger.error(f"Database error while saving batch responses: {str(e)}")
+
+        return BatchMessageResponse(
+            profile_id=request.profile_id,
+            results=results,
+            succeeded=len(generated),
+            failed=len(results) - len(generated)
         )
-        
-        # Extract the response
-        ai_response = response.choices[0].message.content
 
-        # Save the response to the database
-        try:
-            async with db_pool.acquire() as connection:
-                update_query = """
-                    UPDATE reviews
-                    SET replies = $1
-                    WHERE review_id = $2
-                """
-                await connection.execute(update_query, ai_response, request.message_id)
-                logger.info(f"Successfully saved response for review {request.message_id}")
-        except asyncpg.PostgresError as e:
-            logger.error(f"Database error while saving response: {str(e)}")
-            # Don't raise an error here as we still want to return the response to the user
-        
-        return MessageResponse(response=ai_response)
-    
     except HTTPException as he:
         raise he
     except Exception as e:
-        logger.error(f"Unexpected error in get_message_response: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
+        logger.error(f"Unexpected error in get_message_responses_batch: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
@@ -1,8 +1,10 @@
-from fastapi import APIRouter, HTTPException, Request
+from fastapi import APIRouter, HTTPException, Query, Request, Response
 from typing import List, Dict
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 import logging
 import asyncpg
+from .. import database
+from ..profile_cache import profile_cache
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -12,15 +14,25 @@ router = APIRouter(
     tags=["profiles"]
 )
 
-class ProfileInput(BaseModel):
+class ModelSettings(BaseModel):
+    """
+    Per-profile completion settings; unset fields use the OPENAI_* defaults.
+    """
+    model: str | None = None
+    cheap_model: str | None = None
+    fallback_model: str | None = None
+    temperature: float | None = Field(default=None, ge=0, le=2)
+    max_tokens: int | None = Field(default=None, ge=1)
+
+class ProfileInput(ModelSettings):
     profile_name: str
     profile_text_addon: str
 
-class ProfileUpdateInput(BaseModel):
+class ProfileUpdateInput(ModelSettings):
     profile_name: str | None = None
     profile_text_addon: str | None = None
 
-class ProfileResponse(BaseModel):
+class ProfileResponse(ModelSettings):
     id: int
     profile_name: str
     profile_text_base: str
@@ -31,12 +43,29 @@ class ProfileListResponse(BaseModel):
     profile_name: str
     profile_text_addon: str
 
+class BusinessReplyProfileInput(BaseModel):
+    profile_id: int
+    enabled: bool = True
+
+class BusinessReplyProfileResponse(BusinessReplyProfileInput):
+    business_place_id: str
+
+class ProfileUsageResponse(BaseModel):
+    profile_id: int
+    days: int
+    replies: int
+    prompt_tokens: int
+    completion_tokens: int
+    average_latency_ms: float | None
+
 @router.get("/fetch_profiles", response_model=List[ProfileListResponse])
 async def fetch_profiles(req: Request):
     """
     Fetch all profiles from the database.
     Returns a list of all profiles with their complete information.
     Note: profile_text_base is excluded from the response.
+    The listing is served from the profile cache with an ETag; a request
+    whose If-None-Match matches gets an empty 304 response.
     """
     try:
         db_pool = req.app.state.db_pool
@@ -47,13 +76,13 @@ async def fetch_profiles(req: Request):
                 detail="Database service unavailable"
             )
 
-        async with db_pool.acquire() as conn:
-            profiles = await conn.fetch("""
-                SELECT id, profile_name, profile_text_addon 
-                FROM profiles
-                ORDER BY id
-            """)
-            return [dict(profile) for profile in profiles]
+        body, etag = await profile_cache.list_profiles(db_pool)
+        if req.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers={"ETag": etag})
+        # The listing is cached already encoded
+        return Response(content=body, media_type="application/json", headers={"ETag": etag})
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error fetching profiles: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to fetch profiles")
@@ -77,19 +106,14 @@ async def add_profiles(profile: ProfileInput, req: Request):
         # Set the profile_text_base value
         profile_text_base = "You are a friendly customer service representative known for your warm, empathetic approach. When replying to a negative review, keep your response brief (2–3 sentences). Acknowledge the customer's feelings, offer a sincere apology, and invite them to reach out for further assistance—all while maintaining a respectful, conversational tone. Please ensure you follow the directions given to you."
         
-        async with db_pool.acquire() as conn:
-            profile_id = await conn.fetchval("""
-                INSERT INTO profiles (profile_name, profile_text_base, profile_text_addon)
-                VALUES ($1, $2, $3)
-                RETURNING id
-            """, profile.profile_name, profile_text_base, profile.profile_text_addon)
-            
-            # Fetch the newly created profile
-            new_profile = await conn.fetchrow("""
-                SELECT id, profile_name, profile_text_base, profile_text_addon
-                FROM profiles
-                WHERE id = $1
-            """, profile_id)
+        async with db_pool.acquire() as conn, conn.transaction():
+            # Insert the profile and get the created row back
+            new_profile = await database.insert_profile(
+                conn, profile.profile_name, profile_text_base, profile.profile_text_addon,
+                profile.model_dump(include=set(ModelSettings.model_fields))
+            )
+
+            await profile_cache.publish_invalidation(conn, new_profile['id'])
             
             return dict(new_profile)
     except Exception as e:
@@ -102,7 +126,8 @@ async def update_profile(profile_id: int, profile: ProfileUpdateInput, req: Requ
     Update an existing profile in the database.
     Takes a profile ID and the fields to update.
     Returns the updated profile.
-    Note: profile_text_base cannot be updated through this endpoint.
+    Note: profile_text_base cannot be updated through this endpoint, and
+    model settings can be changed but not cleared.
     """
     try:
         db_pool = req.app.state.db_pool
@@ -113,59 +138,27 @@ async def update_profile(profile_id: int, profile: ProfileUpdateInput, req: Requ
                 detail="Database service unavailable"
             )
 
-        async with db_pool.acquire() as conn:
-            # First check if the profile exists
-            existing_profile = await conn.fetchrow("""
-                SELECT id, profile_name, profile_text_base, profile_text_addon
-                FROM profiles
-                WHERE id = $1
-            """, profile_id)
+        if not profile.model_dump(exclude_none=True):
+            raise HTTPException(
+                status_code=400,
+                detail="No fields provided for update"
+            )
+
+        async with db_pool.acquire() as conn, conn.transaction():
+            # Fields left as None keep their current value, so a single
+            # statement covers every combination of provided fields
+            updated_profile = await database.update_profile(
+                conn, profile_id, profile.profile_name, profile.profile_text_addon,
+                profile.model_dump(include=set(ModelSettings.model_fields))
+            )
             
-            if not existing_profile:
+            if not updated_profile:
                 raise HTTPException(
                     status_code=404,
                     detail=f"Profile with ID {profile_id} not found"
                 )
 
-            # Build the update query dynamically based on provided fields
-            update_fields = []
-            query_params = []
-            param_count = 1
-
-            if profile.profile_name is not None:
-                update_fields.append(f"profile_name = ${param_count}")
-                query_params.append(profile.profile_name)
-                param_count += 1
-
-            if profile.profile_text_addon is not None:
-                update_fields.append(f"profile_text_addon = ${param_count}")
-                query_params.append(profile.profile_text_addon)
-                param_count += 1
-
-            if not update_fields:
-                raise HTTPException(
-                    status_code=400,
-                    detail="No fields provided for update"
-                )
-
-            # Add profile_id as the last parameter
-            query_params.append(profile_id)
-            
-            # Construct and execute the update query
-            update_query = f"""
-                UPDATE profiles 
-                SET {', '.join(update_fields)}
-                WHERE id = ${param_count}
-                RETURNING id, profile_name, profile_text_base, profile_text_addon
-            """
-            
-            updated_profile = await conn.fetchrow(update_query, *query_params)
-            
-            if not updated_profile:
-                raise HTTPException(
-                    status_code=500,
-                    detail="Failed to update profile"
-                )
+            await profile_cache.publish_invalidation(conn, profile_id)
             
             return dict(updated_profile)
 
@@ -191,22 +184,17 @@ async def delete_profile(profile_id: int, req: Request):
                 detail="Database service unavailable"
             )
 
-        async with db_pool.acquire() as conn:
-            # First check if the profile exists
-            existing_profile = await conn.fetchrow("""
-                SELECT id FROM profiles WHERE id = $1
-            """, profile_id)
+        async with db_pool.acquire() as conn, conn.transaction():
+            # Delete the profile, reporting whether it existed
+            deleted = await database.delete_profile(conn, profile_id)
             
-            if not existing_profile:
+            if not deleted:
                 raise HTTPException(
                     status_code=404,
                     detail=f"Profile with ID {profile_id} not found"
                 )
 
-            # Delete the profile
-            await conn.execute("""
-                DELETE FROM profiles WHERE id = $1
-            """, profile_id)
+            await profile_cache.publish_invalidation(conn, profile_id)
             
             return {"message": f"Profile with ID {profile_id} was successfully deleted"}
 
@@ -214,4 +202,96 @@ async def delete_profile(profile_id: int, req: Request):
         raise
     except Exception as e:
         logger.error(f"Error deleting profile: {str(e)}")
-        raise HTTPException(status_code=500, detail="Failed to delete profile") 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="Failed to delete profile") 
+
+@router.get("/usage/{profile_id}", response_model=ProfileUsageResponse)
+async def fetch_profile_usage(profile_id: int, req: Request, days: int = Query(default=30, ge=1)):
+    """
+    Report the replies generated with a profile over the last `days` days,
+    with their total prompt and completion tokens and average latency.
+    Usage is written in batches, so the last few seconds may be missing.
+    """
+    try:
+        db_pool = req.app.state.db_pool
+        if not db_pool:
+            logger.error("Database connection pool not available")
+            raise HTTPException(
+                status_code=503,
+                detail="Database service unavailable"
+            )
+
+        async with db_pool.acquire() as conn:
+            usage = await database.fetch_profile_usage(conn, profile_id, days)
+
+        return ProfileUsageResponse(profile_id=profile_id, days=days, **dict(usage))
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching profile usage: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to fetch profile usage")
+
+@router.put("/business_defaults/{business_place_id}", response_model=BusinessReplyProfileResponse)
+async def set_business_reply_profile(business_place_id: str, profile: BusinessReplyProfileInput, req: Request):
+    """
+    Set the profile used to reply automatically to new reviews of a business.
+    Set `enabled` to false to pause automatic replies without losing the setting.
+    """
+    try:
+        db_pool = req.app.state.db_pool
+        if not db_pool:
+            logger.error("Database connection pool not available")
+            raise HTTPException(
+                status_code=503,
+                detail="Database service unavailable"
+            )
+
+        async with db_pool.acquire() as conn:
+            try:
+                row = await database.set_business_reply_profile(
+                    conn, business_place_id, profile.profile_id, profile.enabled
+                )
+            except asyncpg.ForeignKeyViolationError:
+                raise HTTPException(
+                    status_code=404,
+                    detail=f"Profile with ID {profile.profile_id} not found"
+                )
+
+        return BusinessReplyProfileResponse(**dict(row))
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error setting business reply profile: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to set business reply profile")
+
+@router.delete("/business_defaults/{business_place_id}")
+async def delete_business_reply_profile(business_place_id: str, req: Request):
+    """
+    Stop replying automatically to new reviews of a business.
+    """
+    try:
+        db_pool = req.app.state.db_pool
+        if not db_pool:
+            logger.error("Database connection pool not available")
+            raise HTTPException(
+                status_code=503,
+                detail="Database service unavailable"
+            )
+
+        async with db_pool.acquire() as conn:
+            deleted = await database.delete_business_reply_profile(conn, business_place_id)
+
+        if not deleted:
+            raise HTTPException(
+                status_code=404,
+                detail=f"No reply profile set for business {business_place_id}"
+            )
+
+        return {"message": f"Automatic replies for business {business_place_id} were disabled"}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error deleting business reply profile: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to delete business reply profile")
@@ -1,8 +1,19 @@
-from fastapi import APIRouter, HTTPException, Request
-from pydantic import BaseModel
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
 from datetime import datetime
+from typing import Literal
+import base64
+import binascii
+import csv
+import io
+import json
 import logging
+import zlib
 import asyncpg
+from .. import database, ingest
+from ..serialization import dumps, json_response
+from ..config import REVIEWS_PAGE_SIZE, REVIEWS_PAGE_SIZE_MAX, REVIEWS_EXPORT_BATCH_SIZE
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -13,8 +24,29 @@ router = APIRouter(
     tags=["reviews"]
 )
 
-class BusinessReviewRequest(BaseModel):
+class ReviewFilters(BaseModel):
+    min_rating: float | None = None
+    max_rating: float | None = None
+    since: datetime | None = None
+    until: datetime | None = None
+    has_reply: bool | None = None
+
+class BusinessReviewRequest(ReviewFilters):
     business_place_id: str
+    cursor: str | None = None
+    limit: int = Field(default=REVIEWS_PAGE_SIZE, ge=1)
+
+class ReviewExportRequest(ReviewFilters):
+    business_place_ids: list[str]
+    format: Literal["ndjson", "csv"] = "ndjson"
+    gzip: bool = False
+
+class IngestResponse(BaseModel):
+    received: int
+    inserted: int
+    updated: int
+    skipped: int
+    errors: list[str]
 
 class Review(BaseModel):
     id: int
@@ -34,6 +66,155 @@ class BusinessReviewResponse(BaseModel):
     reviews: list[Review]
     total_reviews: int
     average_rating: float
+    rating_distribution: dict[int, int] = {}
+    reply_coverage: float = 0.0
+    next_cursor: str | None = None
+
+class BusinessStatsRequest(BaseModel):
+    business_place_ids: list[str]
+
+class BusinessStats(BaseModel):
+    business_place_id: str
+    total_reviews: int
+    average_rating: float
+    rating_distribution: dict[int, int]
+    reply_coverage: float
+    last_review_at: datetime | None
+
+def rating_distribution(row) -> dict[int, int]:
+    """
+    Collect the per-star counts (rating_1 .. rating_5) of a stats row.
+    """
+    return {star: row[f'rating_{star}'] for star in range(1, 6)}
+
+def reply_coverage(replied_reviews: int, total_reviews: int) -> float:
+    """
+    Percentage of reviews that have a reply.
+    """
+    return round(100.0 * replied_reviews / total_reviews, 2) if total_reviews else 0.0
+
+# Columns of an exported review, in CSV column order
+EXPORT_COLUMNS = [
+    "id",
+    "review_id",
+    "username",
+    "rating",
+    "timestamp",
+    "review_text",
+    "business_place_id",
+    "n_review_user",
+    "replies",
+    "review_timestamp",
+    "url_user",
+]
+
+def review_dict(row) -> dict:
+    """
+    Convert a review record to a dict in the shape of Review, for direct
+    encoding with serialization.dumps.
+    """
+    return {
+        "id": row['id'],
+        "review_id": row['review_id'],
+        "username": row['username'],
+        "rating": float(row['rating']),
+        "timestamp": row['timestamp'],
+        "review_text": row['review_text'] if row['review_text'] is not None else "",
+        "business_place_id": row['business_place_id'],
+        "n_review_user": row['n_review_user'],
+        "replies": row['replies'],
+        "review_timestamp": row['review_timestamp'],
+        "url_user": row['url_user']
+    }
+
+def export_row(row) -> dict:
+    """
+    Convert a review record to plain JSON-compatible values, matching the
+    shape of Review.
+    """
+    exported = review_dict(row)
+    if exported["timestamp"] is not None:
+        exported["timestamp"] = exported["timestamp"].isoformat()
+    return exported
+
+def encode_export_rows(rows: list, export_format: str, include_header: bool = False) -> bytes:
+    """
+    Encode a batch of review records as NDJSON lines or CSV rows.
+    """
+    if export_format == "csv":
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS)
+        if include_header:
+            writer.writeheader()
+        writer.writerows(export_row(row) for row in rows)
+        return buffer.getvalue().encode("utf-8")
+    return b"".join(dumps(review_dict(row)) + b"\n" for row in rows)
+
+def encode_cursor(timestamp: datetime | None, review_pk: int) -> str:
+    """
+    Encode the sort key of the last review on a page as an opaque cursor.
+    """
+    payload = {"t": timestamp.isoformat() if timestamp else None, "id": review_pk}
+    return base64.urlsafe_b64encode(json.dumps(payload).encode("utf-8")).decode("ascii")
+
+def decode_cursor(cursor: str) -> tuple[datetime | None, int]:
+    """
+    Decode a cursor produced by encode_cursor.
+    Raises ValueError if the cursor is malformed.
+    """
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        timestamp = datetime.fromisoformat(payload["t"]) if payload["t"] else None
+        return timestamp, int(payload["id"])
+    except (binascii.Error, UnicodeError, ValueError, KeyError, TypeError) as e:
+        raise ValueError("Invalid cursor") from e
+
+def add_filter_clauses(filters: ReviewFilters, clauses: list[str], params: list):
+    """
+    Append the WHERE clauses and parameters for the rating, date and reply
+    filters, numbering parameters after those already present.
+    """
+    def add(clause: str, value):
+        params.append(value)
+        clauses.append(clause.replace("?", f"${len(params)}"))
+
+    if filters.min_rating is not None:
+        add("review_rating >= ?", filters.min_rating)
+    if filters.max_rating is not None:
+        add("review_rating <= ?", filters.max_rating)
+    if filters.since is not None:
+        add("review_datetime_utc >= ?", filters.since)
+    if filters.until is not None:
+        add("review_datetime_utc < ?", filters.until)
+    if filters.has_reply is True:
+        clauses.append(f"NOT {database.UNREPLIED}")
+    elif filters.has_reply is False:
+        clauses.append(database.UNREPLIED)
+
+def build_review_filters(request: BusinessReviewRequest) -> tuple[list[str], list]:
+    """
+    Build the WHERE clauses and parameters for the listing filters.
+    Reviews are ordered by (review_datetime_utc DESC NULLS LAST, id DESC),
+    and the cursor condition continues strictly after the given sort key.
+    """
+    clauses = ["business_place_id = $1"]
+    params = [request.business_place_id]
+    add_filter_clauses(request, clauses, params)
+
+    if request.cursor is not None:
+        cursor_timestamp, cursor_id = decode_cursor(request.cursor)
+        if cursor_timestamp is None:
+            params.append(cursor_id)
+            clauses.append(f"(review_datetime_utc IS NULL AND id < ${len(params)})")
+        else:
+            params.extend([cursor_timestamp, cursor_id])
+            ts, pk = f"${len(params) - 1}", f"${len(params)}"
+            clauses.append(
+                f"(review_datetime_utc < {ts} OR (review_datetime_utc = {ts} AND id < {pk})"
+                f" OR review_datetime_utc IS NULL)"
+            )
+
+    return clauses, params
 
 @router.post("/fetch", response_model=BusinessReviewResponse)
 async def fetch_reviews(request: BusinessReviewRequest, req: Request):
@@ -46,75 +227,45 @@ async def fetch_reviews(request: BusinessReviewRequest, req: Request):
                 detail="Database service unavailable"
             )
 
+        limit = min(request.limit, REVIEWS_PAGE_SIZE_MAX)
+        try:
+            clauses, params = build_review_filters(request)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
         logger.info(f"Fetching reviews for business place ID: {request.business_place_id}")
         try:
             async with db_pool.acquire() as connection:
-                # Fetch reviews for the business
-                reviews_query = """
-                    SELECT 
-                        id,
-                        review_id,
-                        author_title as username,
-                        review_rating as rating,
-                        review_datetime_utc as timestamp,
-                        review_text,
-                        business_place_id,
-                        author_reviews_count as n_review_user,
-                        replies,
-                        review_timestamp,
-                        author_link as url_user
-                    FROM reviews
-                    WHERE business_place_id = $1
-                    ORDER BY review_datetime_utc DESC
-                """
-                
-                # Get review statistics
-                stats_query = """
-                    SELECT 
-                        COUNT(*) as total_reviews,
-                        AVG(review_rating) as average_rating
-                    FROM reviews
-                    WHERE business_place_id = $1
-                """
-                
-                # Execute both queries
-                reviews = await connection.fetch(reviews_query, request.business_place_id)
-                stats = await connection.fetchrow(stats_query, request.business_place_id)
+                # Fetch one page of reviews for the business (plus one row to
+                # tell whether another page follows) together with the
+                # business-wide statistics, in a single round trip. The
+                # statistics come from the trigger-maintained summary table.
+                rows = await database.fetch_review_page(connection, clauses, params, limit + 1)
+
+                # The stats row is always present; page columns are NULL when
+                # no review matched
+                stats = rows[0]
+                reviews = [row for row in rows if row['id'] is not None]
                 
                 logger.info(f"Found {len(reviews)} reviews for the business")
+
+                next_cursor = None
+                if len(reviews) > limit:
+                    reviews = reviews[:limit]
+                    next_cursor = encode_cursor(reviews[-1]['timestamp'], reviews[-1]['id'])
                 
-                if not reviews:
-                    return BusinessReviewResponse(
-                        business_place_id=request.business_place_id,
-                        reviews=[],
-                        total_reviews=0,
-                        average_rating=0.0
-                    )
-                
-                # Convert the reviews to Pydantic models
-                review_list = [
-                    Review(
-                        id=row['id'],
-                        review_id=row['review_id'],
-                        username=row['username'],
-                        rating=float(row['rating']),
-                        timestamp=row['timestamp'],
-                        review_text=row['review_text'] if row['review_text'] is not None else "",
-                        business_place_id=row['business_place_id'],
-                        n_review_user=row['n_review_user'],
-                        replies=row['replies'],
-                        review_timestamp=row['review_timestamp'],
-                        url_user=row['url_user']
-                    )
-                    for row in reviews
-                ]
-                
-                return BusinessReviewResponse(
-                    business_place_id=request.business_place_id,
-                    reviews=review_list,
-                    total_reviews=stats['total_reviews'],
-                    average_rating=float(stats['average_rating']) if stats['average_rating'] is not None else 0.0
-                )
+                # Encode the records directly; building a Review per row
+                # and validating the response model again costs more than
+                # the query on large pages
+                return json_response({
+                    "business_place_id": request.business_place_id,
+                    "reviews": [review_dict(row) for row in reviews],
+                    "total_reviews": stats['total_reviews'],
+                    "average_rating": float(stats['average_rating']) if stats['average_rating'] is not None else 0.0,
+                    "rating_distribution": rating_distribution(stats),
+                    "reply_coverage": reply_coverage(stats['replied_reviews'], stats['total_reviews']),
+                    "next_cursor": next_cursor
+                })
                 
         except asyncpg.PostgresError as e:
             logger.error(f"Database error: {str(e)}")
@@ -123,9 +274,166 @@ async def fetch_reviews(request: BusinessReviewRequest, req: Request):
                 detail="Database error occurred"
             )
             
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error fetching reviews: {str(e)}")
         raise HTTPException(
             status_code=500,
             detail=str(e)
-        ) 
\ No newline at end of file
+        )
+
+@router.post("/stats", response_model=list[BusinessStats])
+async def fetch_review_stats(request: BusinessStatsRequest, req: Request):
+    """
+    Fetch review statistics for one or more businesses.
+    Statistics are read from the business_review_stats summary table,
+    which is kept current by a trigger on reviews, so the cost does not
+    depend on the number of reviews. Businesses without reviews report zeros.
+    """
+    try:
+        db_pool = req.app.state.db_pool
+        if not db_pool:
+            logger.error("Database connection pool not available")
+            raise HTTPException(
+                status_code=503,
+                detail="Database service unavailable"
+            )
+
+        try:
+            async with db_pool.acquire() as connection:
+                rows = await database.fetch_business_stats(connection, request.business_place_ids)
+        except asyncpg.PostgresError as e:
+            logger.error(f"Database error: {str(e)}")
+            raise HTTPException(
+                status_code=500,
+                detail="Database error occurred"
+            )
+
+        rows_by_id = {row['business_place_id']: row for row in rows}
+        results = []
+        for business_place_id in dict.fromkeys(request.business_place_ids):
+            row = rows_by_id.get(business_place_id)
+            if row is None:
+                results.append(BusinessStats(
+                    business_place_id=business_place_id,
+                    total_reviews=0,
+                    average_rating=0.0,
+                    rating_distribution={star: 0 for star in range(1, 6)},
+                    reply_coverage=0.0,
+                    last_review_at=None
+                ))
+                continue
+            results.append(BusinessStats(
+                business_place_id=business_place_id,
+                total_reviews=row['review_count'],
+                average_rating=float(row['rating_sum'] / row['review_count']) if row['review_count'] else 0.0,
+                rating_distribution=rating_distribution(row),
+                reply_coverage=reply_coverage(row['replied_count'], row['review_count']),
+                last_review_at=row['last_review_at']
+            ))
+        return results
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching review stats: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=str(e)
+        )
+
+
+@router.post("/export")
+async def export_reviews(request: ReviewExportRequest, req: Request):
+    """
+    Export reviews and their replies for one or more businesses.
+    Rows are read through a server-side cursor and streamed as NDJSON or
+    CSV in batches, so memory use does not grow with the result size.
+    Accepts the same filters as /reviews/fetch, and optionally gzips the
+    stream on the fly.
+    """
+    db_pool = req.app.state.db_pool
+    if not db_pool:
+        logger.error("Database connection pool not available")
+        raise HTTPException(
+            status_code=503,
+            detail="Database service unavailable"
+        )
+
+    clauses = ["business_place_id = ANY($1::text[])"]
+    params = [request.business_place_ids]
+    add_filter_clauses(request, clauses, params)
+
+    async def generate_rows():
+        exported = 0
+        try:
+            async with db_pool.acquire() as connection:
+                # Server-side cursors only live inside a transaction
+                async with connection.transaction(readonly=True):
+                    cursor = await database.open_review_export_cursor(connection, clauses, params)
+                    include_header = True
+                    while True:
+                        rows = await cursor.fetch(REVIEWS_EXPORT_BATCH_SIZE)
+                        chunk = encode_export_rows(rows, request.format, include_header)
+                        include_header = False
+                        if chunk:
+                            yield chunk
+                        exported += len(rows)
+                        if len(rows) < REVIEWS_EXPORT_BATCH_SIZE:
+                            break
+            logger.info(f"Exported {exported} reviews for {len(request.business_place_ids)} businesses")
+        except asyncpg.PostgresError as e:
+            # Headers are already sent, so the stream is cut short
+            logger.error(f"Database error during export after {exported} rows: {str(e)}")
+
+    async def gzip_stream(chunks):
+        compressor = zlib.compressobj(wbits=31)
+        async for chunk in chunks:
+            compressed = compressor.compress(chunk)
+            if compressed:
+                yield compressed
+        yield compressor.flush()
+
+    media_type = "text/csv" if request.format == "csv" else "application/x-ndjson"
+    headers = {"Content-Disposition": f'attachment; filename="reviews.{request.format}"'}
+    body = generate_rows()
+    if request.gzip:
+        headers["Content-Encoding"] = "gzip"
+        body = gzip_stream(body)
+
+    return StreamingResponse(body, media_type=media_type, headers=headers)
+
+@router.post("/ingest", response_model=IngestResponse)
+async def ingest_reviews(req: Request, format: Literal["ndjson", "csv"] = Query(default="ndjson")):
+    """
+    Bulk-load scraped reviews streamed in the request body as NDJSON or
+    CSV (optionally with Content-Encoding: gzip), upserting on review_id.
+    Existing replies are kept. The import is all or nothing; malformed
+    rows are skipped and reported.
+    """
+    db_pool = req.app.state.db_pool
+    if not db_pool:
+        logger.error("Database connection pool not available")
+        raise HTTPException(
+            status_code=503,
+            detail="Database service unavailable"
+        )
+
+    async def body_chunks():
+        decompressor = zlib.decompressobj(wbits=31) if req.headers.get("content-encoding") == "gzip" else None
+        async for chunk in req.stream():
+            yield decompressor.decompress(chunk) if decompressor else chunk
+        if decompressor:
+            yield decompressor.flush()
+
+    try:
+        return await ingest.ingest_stream(db_pool, body_chunks(), format)
+    except zlib.error as e:
+        raise HTTPException(status_code=400, detail=f"Invalid gzip body: {str(e)}")
+    except asyncpg.PostgresError as e:
+        logger.error(f"Database error during ingestion: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail="Database error occurred"
+        )
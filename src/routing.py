@@ -0,0 +1,166 @@
+import asyncio
+import logging
+import time
+
+from . import llm, metrics
+from .config import (
+    OPENAI_MODEL,
+    OPENAI_CHEAP_MODEL,
+    OPENAI_FALLBACK_MODEL,
+    OPENAI_TEMPERATURE,
+    OPENAI_MAX_TOKENS,
+    ROUTING_SHORT_REVIEW_TOKENS,
+    ROUTING_POSITIVE_RATING,
+    MODEL_LATENCY_BUDGET_SECONDS,
+    CIRCUIT_FAILURE_THRESHOLD,
+    CIRCUIT_RESET_SECONDS,
+)
+from .prompts import count_tokens
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Failures that make the next model worth trying
+def fallback_errors() -> tuple:
+    return (asyncio.TimeoutError, *llm.retryable_errors())
+
+class CircuitOpenError(Exception):
+    """
+    Every candidate model is failing and is not being called for now.
+    """
+
+class CircuitBreaker:
+    """
+    Per-model circuit breaker. After `failure_threshold` consecutive
+    failures a model is skipped for `reset_seconds`; then a single trial
+    call is let through, which closes the circuit on success or reopens it
+    on failure. Calls ending any other way (a request error, a
+    cancellation, a closed stream) only give the trial back.
+    """
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._failures = {}
+        self._opened_at = {}
+        self._trial = set()
+
+    def allow(self, model: str) -> bool:
+        opened_at = self._opened_at.get(model)
+        if opened_at is None:
+            return True
+        if model in self._trial or time.monotonic() - opened_at < self.reset_seconds:
+            return False
+        self._trial.add(model)
+        return True
+
+    def record_success(self, model: str):
+        self._failures.pop(model, None)
+        self._trial.discard(model)
+        if self._opened_at.pop(model, None) is not None:
+            logger.info(f"Circuit for model {model} closed")
+            metrics.MODEL_CIRCUIT_OPEN.labels(model).set(0)
+
+    def release(self, model: str):
+        """
+        End a call without an outcome, letting the next one be a trial.
+        """
+        self._trial.discard(model)
+
+    def record_failure(self, model: str):
+        self._trial.discard(model)
+        failures = self._failures.get(model, 0) + 1
+        self._failures[model] = failures
+        if failures >= self.failure_threshold:
+            if model not in self._opened_at:
+                logger.warning(f"Circuit for model {model} opened after {failures} consecutive failures")
+                metrics.MODEL_CIRCUIT_OPEN.labels(model).set(1)
+            self._opened_at[model] = time.monotonic()
+
+circuit_breaker = CircuitBreaker(
+    failure_threshold=CIRCUIT_FAILURE_THRESHOLD,
+    reset_seconds=CIRCUIT_RESET_SECONDS
+)
+
+def completion_settings(profile_row, message_row) -> dict:
+    """
+    Choose the completion settings for a review: the profile's settings
+    over the OPENAI_* defaults, with short or positive reviews routed to
+    the cheap model when one is configured. `models` lists the models to
+    try in order.
+    """
+    primary = profile_row.get('model') or OPENAI_MODEL
+    cheap = profile_row.get('cheap_model') or OPENAI_CHEAP_MODEL
+    fallback = profile_row.get('fallback_model') or OPENAI_FALLBACK_MODEL
+
+    review_text = message_row['message'] or ""
+    easy = (
+        count_tokens(review_text) <= ROUTING_SHORT_REVIEW_TOKENS
+        or float(message_row['rating']) >= ROUTING_POSITIVE_RATING
+    )
+    candidates = [cheap, primary, fallback] if cheap and easy else [primary, fallback]
+
+    temperature = profile_row.get('temperature')
+    max_tokens = profile_row.get('max_tokens')
+    return {
+        "models": [model for model in dict.fromkeys(candidates) if model],
+        "temperature": OPENAI_TEMPERATURE if temperature is None else temperature,
+        "max_tokens": max_tokens or OPENAI_MAX_TOKENS
+    }
+
+def default_settings() -> dict:
+    return {
+        "models": [model for model in dict.fromkeys([OPENAI_MODEL, OPENAI_FALLBACK_MODEL]) if model],
+        "temperature": OPENAI_TEMPERATURE,
+        "max_tokens": OPENAI_MAX_TOKENS
+    }
+
+async def create_chat_completion(params: dict, models: list[str]):
+    """
+    Run a chat completion on the first healthy model of `models`. Every
+    model but the last has MODEL_LATENCY_BUDGET_SECONDS to answer; on
+    timeout or a transient error the next model is tried.
+    """
+    error = None
+    for i, model in enumerate(models):
+        if not circuit_breaker.allow(model):
+            continue
+        last = i == len(models) - 1
+        try:
+            call = llm.create_chat_completion(**{**params, "model": model})
+            response = await (call if last else asyncio.wait_for(call, MODEL_LATENCY_BUDGET_SECONDS))
+        except fallback_errors() as e:
+            circuit_breaker.record_failure(model)
+            if last:
+                raise
+            reason = "latency budget exceeded" if isinstance(e, asyncio.TimeoutError) else type(e).__name__
+            logger.warning(f"Model {model} failed ({reason}), falling back")
+            metrics.MODEL_FALLBACKS.labels(model).inc()
+            error = e
+            continue
+        finally:
+            circuit_breaker.release(model)
+        circuit_breaker.record_success(model)
+        return response
+
+    if error is not None:
+        raise error
+    raise CircuitOpenError(f"All models are unavailable: {', '.join(models)}")
+
+async def stream_chat_completion(params: dict, models: list[str]):
+    """
+    Stream a chat completion from the first healthy model. Streams do not
+    fall back, since tokens may already have been relayed.
+    """
+    model = next((model for model in models if circuit_breaker.allow(model)), None)
+    if model is None:
+        raise CircuitOpenError(f"All models are unavailable: {', '.join(models)}")
+    try:
+        async for delta in llm.stream_chat_completion(**{**params, "model": model}):
+            yield delta
+    except fallback_errors():
+        circuit_breaker.record_failure(model)
+        raise
+    finally:
+        circuit_breaker.release(model)
+    circuit_breaker.record_success(model)
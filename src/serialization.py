@@ -0,0 +1,35 @@
+import datetime
+import decimal
+import json
+
+from fastapi import Response
+
+try:
+    import orjson
+except ImportError:  # optional: falls back to the standard library encoder
+    orjson = None
+
+def _default(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def dumps(payload) -> bytes:
+    """
+    Encode plain dicts, lists and scalars (including datetimes and integer
+    dict keys) as compact JSON bytes, matching what FastAPI produces for
+    the equivalent response models.
+    """
+    if orjson is not None:
+        return orjson.dumps(payload, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(payload, default=_default, separators=(",", ":")).encode("utf-8")
+
+def json_response(payload, headers: dict | None = None) -> Response:
+    """
+    Encode a response directly, skipping response model validation. Use only
+    with payloads already in the shape of the route's response_model, which
+    still documents the schema.
+    """
+    return Response(content=dumps(payload), media_type="application/json", headers=headers)
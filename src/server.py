@@ -0,0 +1,39 @@
+"""
+Run the API with WEB_CONCURRENCY worker processes:
+
+    python -m src.server
+
+Each worker is an independent process with its own database pool, caches
+and OpenAI client; anything shared between them goes through Postgres.
+Set DB_CONNECTION_BUDGET to the connections the API may use in total and
+each worker's pool is sized to its share. On SIGTERM the workers stop
+accepting connections and get SHUTDOWN_GRACE_SECONDS to finish what is
+in flight.
+"""
+import logging
+
+import uvicorn
+
+from .config import WEB_CONCURRENCY, SERVER_HOST, SERVER_PORT, SHUTDOWN_GRACE_SECONDS
+from .database import POOL_CONFIG, dedicated_connections
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    logger.info(
+        f"Starting {WEB_CONCURRENCY} workers with pools of up to {POOL_CONFIG['max_size']} connections "
+        f"(+{dedicated_connections()} dedicated) each"
+    )
+    uvicorn.run(
+        "src.main:app",
+        host=SERVER_HOST,
+        port=SERVER_PORT,
+        workers=WEB_CONCURRENCY,
+        timeout_graceful_shutdown=SHUTDOWN_GRACE_SECONDS,
+        proxy_headers=True
+    )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+import asyncio
+import hashlib
+import logging
+import time
+
+import asyncpg
+
+from . import database
+from .config import SINGLE_FLIGHT_CROSS_PROCESS, SINGLE_FLIGHT_WAIT_SECONDS, SINGLE_FLIGHT_POLL_INTERVAL
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+def advisory_key(*parts) -> int:
+    """
+    Map a key to a signed 64-bit advisory lock ID.
+    """
+    digest = hashlib.sha1(":".join(str(part) for part in parts).encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big", signed=True)
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key in this process: the first
+    caller runs the work and every caller awaits the same result. The work
+    runs in its own task, so it completes for the others even if the caller
+    that started it goes away.
+    """
+
+    def __init__(self):
+        self._calls = {}
+
+    async def do(self, key, fn):
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.create_task(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._finished(key, done))
+        else:
+            logger.info(f"Joining in-flight call for {key}")
+        return await asyncio.shield(task)
+
+    def _finished(self, key, task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            # Mark the exception as retrieved if every caller went away
+            task.exception()
+
+class AdvisoryLocks:
+    """
+    Session-level Postgres advisory locks held on one dedicated connection
+    per process, so a long-held lock never ties up a pool connection.
+    In-process coalescing guarantees a key is held at most once per
+    process. Locks vanish with the connection, which is reopened on demand.
+    """
+
+    def __init__(self):
+        self._connection = None
+        self._lock = None
+
+    async def _get_connection(self):
+        if self._connection is None or self._connection.is_closed():
+            self._connection = await asyncpg.connect(**database.DB_CONFIG)
+        return self._connection
+
+    def _get_lock(self):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    async def try_acquire(self, key: int) -> bool:
+        async with self._get_lock():
+            return await database.try_advisory_lock(await self._get_connection(), key)
+
+    async def release(self, key: int):
+        async with self._get_lock():
+            if self._connection is not None and not self._connection.is_closed():
+                await database.advisory_unlock(self._connection, key)
+
+    async def close(self):
+        if self._connection is not None and not self._connection.is_closed():
+            await self._connection.close()
+        self._connection = None
+
+    async def run_exclusive(self, key: int, fn, read_result, wait_seconds: float, poll_interval: float):
+        """
+        Run fn while holding the advisory lock for key. If another process
+        holds it, wait for it to finish and return the stored result when
+        its version changed meanwhile (the other process produced it);
+        otherwise run fn anyway. read_result() returns a (version, result)
+        pair, version None while there is no stored result. Without a
+        database connection fn runs unlocked.
+        """
+        try:
+            acquired = await self.try_acquire(key)
+        except (OSError, asyncpg.PostgresError) as e:
+            logger.warning(f"Advisory lock unavailable, continuing without it: {str(e)}")
+            return await fn()
+
+        if not acquired:
+            before, _ = await read_result()
+            deadline = time.monotonic() + wait_seconds
+            while not acquired and time.monotonic() < deadline:
+                await asyncio.sleep(poll_interval)
+                try:
+                    acquired = await self.try_acquire(key)
+                except (OSError, asyncpg.PostgresError) as e:
+                    logger.warning(f"Advisory lock lost while waiting: {str(e)}")
+                    break
+
+            after, result = await read_result()
+            if after is not None and after != before:
+                if acquired:
+                    await self.release(key)
+                logger.info(f"Result for advisory key {key} was produced by another process")
+                return result
+            if not acquired:
+                logger.warning(f"Gave up waiting for advisory key {key}, continuing without it")
+                return await fn()
+
+        try:
+            return await fn()
+        finally:
+            try:
+                await self.release(key)
+            except (OSError, asyncpg.PostgresError) as e:
+                logger.warning(f"Failed to release advisory lock {key}: {str(e)}")
+
+class ReplyFlight:
+    """
+    Single-flight for reply generation keyed by (profile_id, message_id,
+    bypass_cache): in process through SingleFlight and, optionally, across
+    processes through an advisory lock, so a reply is generated and written
+    once. Requests bypassing the cache only share a generation with each
+    other, never with one that may return a cached reply.
+    """
+
+    def __init__(self, cross_process: bool, wait_seconds: float, poll_interval: float):
+        self.cross_process = cross_process
+        self.wait_seconds = wait_seconds
+        self.poll_interval = poll_interval
+        self.flights = SingleFlight()
+        self.locks = AdvisoryLocks()
+
+    async def run(self, profile_id: int, message_id: str, generate, read_reply, bypass_cache: bool = False):
+        """
+        Return the reply produced by generate(), sharing one generation
+        between concurrent callers. read_reply() reads the stored reply
+        and its version id, used when another process generated it.
+        """
+        async def generate_once():
+            if not self.cross_process:
+                return await generate()
+            return await self.locks.run_exclusive(
+                advisory_key("reply", profile_id, message_id, bypass_cache),
+                generate,
+                read_reply,
+                self.wait_seconds,
+                self.poll_interval
+            )
+
+        return await self.flights.do((profile_id, message_id, bypass_cache), generate_once)
+
+reply_flight = ReplyFlight(
+    cross_process=SINGLE_FLIGHT_CROSS_PROCESS,
+    wait_seconds=SINGLE_FLIGHT_WAIT_SECONDS,
+    poll_interval=SINGLE_FLIGHT_POLL_INTERVAL
+)
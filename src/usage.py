@@ -0,0 +1,69 @@
+import asyncio
+import logging
+from collections import deque
+
+import asyncpg
+
+from . import database
+from .config import USAGE_FLUSH_INTERVAL, USAGE_BUFFER_MAX
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+class UsageRecorder:
+    """
+    Buffers per-reply token usage and writes it to reply_usage in bulk from
+    a background task, keeping the inserts off the request path. Usage is
+    a metric: rows still buffered when the process dies are lost, and the
+    oldest rows are dropped if the buffer overflows.
+    """
+
+    def __init__(self, flush_interval: float, max_buffer: int):
+        self.flush_interval = flush_interval
+        self._rows = deque(maxlen=max_buffer)
+        self._task = None
+
+    def record(self, profile_id: int, review_id: str, model: str, prompt_tokens: int, completion_tokens: int, latency_ms: float):
+        if len(self._rows) == self._rows.maxlen:
+            logger.warning("Usage buffer full, dropping the oldest row")
+        self._rows.append((profile_id, review_id, model, prompt_tokens, completion_tokens, latency_ms))
+
+    async def flush(self, db_pool):
+        """
+        Write the buffered rows; they are kept for the next flush on failure.
+        """
+        if not self._rows:
+            return
+        rows = list(self._rows)
+        self._rows.clear()
+        try:
+            async with db_pool.acquire() as connection:
+                await database.insert_reply_usage(connection, rows)
+        except (asyncpg.PostgresError, OSError) as e:
+            logger.error(f"Failed to record reply usage: {str(e)}")
+            self._rows.extendleft(reversed(rows))
+
+    async def _run(self, db_pool):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush(db_pool)
+
+    def start(self, db_pool):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(db_pool))
+
+    async def stop(self, db_pool):
+        """
+        Stop the flush loop and write what is left.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if db_pool:
+            await self.flush(db_pool)
+
+usage_recorder = UsageRecorder(flush_interval=USAGE_FLUSH_INTERVAL, max_buffer=USAGE_BUFFER_MAX)
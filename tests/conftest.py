@@ -0,0 +1,26 @@
+import pytest
+from contextlib import asynccontextmanager
+from unittest.mock import MagicMock, AsyncMock
+from src.main import app
+from src.profile_cache import profile_cache
+
+@pytest.fixture
+def db_connection():
+    """Install a fake database pool on the app and yield its connection"""
+    connection = MagicMock()
+    connection.fetch = AsyncMock(return_value=[])
+    connection.fetchrow = AsyncMock(return_value=None)
+    connection.fetchval = AsyncMock(return_value=None)
+    connection.execute = AsyncMock()
+
+    @asynccontextmanager
+    async def acquire():
+        yield connection
+
+    pool = MagicMock()
+    pool.acquire = acquire
+    app.state.db_pool = pool
+    profile_cache.invalidate()
+    yield connection
+    app.state.db_pool = None
+    profile_cache.invalidate()
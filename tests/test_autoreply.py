@@ -0,0 +1,95 @@
+import asyncio
+import time
+from fastapi.testclient import TestClient
+from unittest.mock import patch, AsyncMock
+from src import autoreply
+from src.main import app
+from src.routes.message import GeneratedReply
+
+client = TestClient(app)
+
+PROFILE = {"id": 1, "profile_text_base": "Friendly owner", "profile_text_addon": ""}
+
+def candidate(review_id, profile_id=1):
+    return {"review_id": review_id, "message": "Great food", "username": "sam", "rating": 5, "profile_id": profile_id}
+
+def test_drain_answers_queued_reviews_in_batches(db_connection):
+    """Queued reviews are answered batch by batch and leave the queue"""
+    replier = autoreply.AutoReplier(window_seconds=0, batch_size=2, concurrency=2, max_per_minute=6000, poll_seconds=1)
+    batches = [[candidate("r1"), candidate("r2")], [candidate("r3")], []]
+
+    with patch.object(autoreply.database, "prune_auto_reply_queue", AsyncMock(return_value=0)), \
+            patch.object(autoreply.database, "dead_letter_auto_replies", AsyncMock(return_value=[])), \
+            patch.object(autoreply.database, "fetch_auto_reply_candidates", AsyncMock(side_effect=batches)) as candidates, \
+            patch.object(autoreply.database, "dequeue_auto_replies", AsyncMock()) as dequeue, \
+            patch.object(autoreply.database, "save_auto_replies", AsyncMock(side_effect=[2, 1])) as save, \
+            patch.object(autoreply.profile_cache, "get", AsyncMock(return_value=PROFILE)), \
+            patch.object(autoreply, "generate_reply", AsyncMock(return_value=GeneratedReply(text="Thanks!", model="m"))):
+        asyncio.run(replier.drain(app.state.db_pool))
+
+    assert candidates.await_count == 3
+    assert [call.args[1] for call in dequeue.await_args_list] == [["r1", "r2"], ["r3"]]
+    assert save.await_args_list[0].args[1] == [
+        ("r1", 1, "m", 0, 0, None, "Thanks!"),
+        ("r2", 1, "m", 0, 0, None, "Thanks!"),
+    ]
+
+def test_drain_dead_letters_exhausted_reviews(db_connection):
+    """Reviews out of attempts leave the queue before new candidates are fetched"""
+    replier = autoreply.AutoReplier(window_seconds=0, batch_size=2, concurrency=2, max_per_minute=6000, poll_seconds=1,
+                                    max_attempts=3)
+    dead_letter = AsyncMock(return_value=[{"review_id": "r1", "error": "boom"}])
+
+    with patch.object(autoreply.database, "prune_auto_reply_queue", AsyncMock(return_value=0)), \
+            patch.object(autoreply.database, "dead_letter_auto_replies", dead_letter), \
+            patch.object(autoreply.database, "fetch_auto_reply_candidates", AsyncMock(return_value=[])):
+        asyncio.run(replier.drain(app.state.db_pool))
+
+    assert dead_letter.await_args.args[1] == 3
+
+def test_failed_generation_stays_queued_for_retry(db_connection):
+    """One failing review does not stop the rest of its batch and is retried later"""
+    replier = autoreply.AutoReplier(window_seconds=0, batch_size=2, concurrency=2, max_per_minute=6000, poll_seconds=1,
+                                    retry_seconds=30)
+    generate = AsyncMock(side_effect=[RuntimeError("boom"), GeneratedReply(text="Thanks!")])
+
+    with patch.object(autoreply.database, "save_auto_replies", AsyncMock(return_value=1)) as save, \
+            patch.object(autoreply.database, "dequeue_auto_replies", AsyncMock()) as dequeue, \
+            patch.object(autoreply.database, "retry_auto_replies", AsyncMock()) as retry, \
+            patch.object(autoreply.profile_cache, "get", AsyncMock(return_value=PROFILE)), \
+            patch.object(autoreply, "generate_reply", generate):
+        saved = asyncio.run(replier.process_batch(app.state.db_pool, [candidate("r1"), candidate("r2")]))
+
+    assert saved == 1
+    assert len(save.await_args.args[1]) == 1
+    assert dequeue.await_args.args[1] == ["r2"]
+    assert retry.await_args.args[1:] == (["r1"], ["boom"], 30)
+
+def test_rate_limiter_spaces_acquisitions():
+    """After the burst, acquisitions wait for the bucket to refill"""
+    limiter = autoreply.RateLimiter(rate_per_minute=1200, burst=2)
+
+    async def run():
+        start = time.monotonic()
+        for _ in range(4):
+            await limiter.acquire()
+        return time.monotonic() - start
+
+    assert asyncio.run(run()) >= 0.09
+
+def test_set_business_reply_profile(db_connection):
+    """Setting a business default returns the stored setting"""
+    db_connection.fetchrow.return_value = {"business_place_id": "place-1", "profile_id": 3, "enabled": True}
+
+    response = client.put("/profiles/business_defaults/place-1", json={"profile_id": 3})
+
+    assert response.status_code == 200
+    assert response.json() == {"business_place_id": "place-1", "profile_id": 3, "enabled": True}
+
+def test_delete_missing_business_reply_profile(db_connection):
+    """Deleting a business without a default returns 404"""
+    db_connection.fetchval.return_value = None
+
+    response = client.delete("/profiles/business_defaults/place-1")
+
+    assert response.status_code == 404
@@ -0,0 +1,51 @@
+import asyncio
+import httpx
+from fastapi.testclient import TestClient
+from bench.dataset import Dataset
+from bench.fake_openai import create_app
+from bench.load import percentile, run_scenario, scenarios
+from bench.standin import StandInPool
+from src.main import app
+
+def test_percentile_uses_nearest_rank():
+    """Percentiles pick an observed value"""
+    values = [float(v) for v in range(1, 101)]
+    assert percentile(values, 50) == 50.0
+    assert percentile(values, 99) == 99.0
+    assert percentile([], 95) == 0.0
+
+def test_fake_openai_reports_usage():
+    """The fake server answers in the chat completions shape with usage"""
+    client = TestClient(create_app(latency=0, tokens_per_second=0, completion_tokens=5))
+    response = client.post("/v1/chat/completions", json={
+        "model": "gpt-3.5-turbo",
+        "messages": [{"role": "user", "content": "Hello there"}]
+    })
+    body = response.json()
+    assert body["choices"][0]["message"]["content"] == "thanks thanks thanks thanks thanks"
+    assert body["usage"]["completion_tokens"] == 5
+
+def test_standin_serves_review_pages():
+    """The read scenarios run end to end against the stand-in pool"""
+    dataset = Dataset(businesses=2, reviews_per_business=10, profiles=1)
+    previous = app.state.db_pool
+    app.state.db_pool = StandInPool(dataset)
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+            streams = scenarios(dataset, page_size=5, bypass_cache=True)
+            reviews = await run_scenario(client, "reviews_fetch", streams["reviews_fetch"], 4, 2)
+            profiles = await run_scenario(client, "profiles_fetch", streams["profiles_fetch"], 4, 2)
+            page = await client.post("/reviews/fetch", json={"business_place_id": dataset.business_ids[0], "limit": 5})
+            return reviews, profiles, page.json()
+
+    try:
+        reviews, profiles, page = asyncio.run(run())
+    finally:
+        app.state.db_pool = previous
+
+    assert reviews["requests"] == 4 and reviews["errors"] == 0
+    assert profiles["errors"] == 0
+    assert page["total_reviews"] == 10
+    assert len(page["reviews"]) == 5
+    assert page["next_cursor"] is not None
@@ -0,0 +1,63 @@
+import asyncio
+from unittest.mock import patch, MagicMock, AsyncMock
+from prometheus_client import REGISTRY
+from src.cache import ReplyCache, cache_key
+
+def test_cache_key_depends_on_all_params():
+    """Keys are stable for equal params and change with any field"""
+    params = {"model": "m", "messages": [{"role": "user", "content": "hi"}], "temperature": 0.7}
+    assert cache_key(params) == cache_key(dict(reversed(list(params.items()))))
+    assert cache_key(params) != cache_key({**params, "temperature": 0.2})
+
+def test_reply_cache_counts_hits_and_misses():
+    """Lookups are counted and stored replies are returned"""
+    def lookups(result):
+        return REGISTRY.get_sample_value("reply_cache_lookups_total", {"result": result}) or 0.0
+
+    hits, misses = lookups("hit"), lookups("miss")
+    cache = ReplyCache(max_entries=10, max_bytes=1024, ttl_seconds=60)
+    assert asyncio.run(cache.get("k")) is None
+    asyncio.run(cache.set("k", "reply"))
+    assert asyncio.run(cache.get("k")) == "reply"
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert (lookups("hit"), lookups("miss")) == (hits + 1, misses + 1)
+
+def test_reply_cache_evicts_least_recently_used():
+    """The least recently used entry is evicted once the entry limit is hit"""
+    cache = ReplyCache(max_entries=2, max_bytes=1024, ttl_seconds=60)
+    asyncio.run(cache.set("a", "1"))
+    asyncio.run(cache.set("b", "2"))
+    asyncio.run(cache.get("a"))
+    asyncio.run(cache.set("c", "3"))
+    assert asyncio.run(cache.get("b")) is None
+    assert asyncio.run(cache.get("a")) == "1"
+
+def test_reply_cache_evicts_by_size():
+    """Entries are evicted to stay under the byte limit"""
+    cache = ReplyCache(max_entries=10, max_bytes=10, ttl_seconds=60)
+    asyncio.run(cache.set("a", "12345"))
+    asyncio.run(cache.set("b", "123456"))
+    assert asyncio.run(cache.get("a")) is None
+    assert cache.stats()["bytes"] == 6
+
+def test_reply_cache_expires_entries():
+    """Entries older than the TTL are not returned"""
+    cache = ReplyCache(max_entries=10, max_bytes=1024, ttl_seconds=60)
+    with patch("src.cache.time.monotonic", return_value=0):
+        asyncio.run(cache.set("k", "reply"))
+    with patch("src.cache.time.monotonic", return_value=61):
+        assert asyncio.run(cache.get("k")) is None
+
+def test_prune_deletes_expired_rows_in_batches():
+    """Expired persistent rows are deleted until a batch comes back short"""
+    cache = ReplyCache(max_entries=10, max_bytes=1024, ttl_seconds=60, persistent=True, prune_batch_size=2)
+    connection = MagicMock()
+    connection.execute = AsyncMock(side_effect=["DELETE 2", "DELETE 2", "DELETE 1"])
+    pool = MagicMock()
+    pool.acquire.return_value.__aenter__ = AsyncMock(return_value=connection)
+    pool.acquire.return_value.__aexit__ = AsyncMock(return_value=False)
+
+    assert asyncio.run(cache.prune(pool)) == 5
+    assert connection.execute.await_args.args[1:] == (60, 2)
@@ -0,0 +1,43 @@
+import asyncio
+from unittest.mock import MagicMock, AsyncMock
+import asyncpg
+from src import database
+
+def test_init_connection_prepares_hot_statements():
+    """Every hot statement is prepared once when a connection is opened"""
+    connection = MagicMock()
+    connection.prepare = AsyncMock()
+
+    asyncio.run(database.init_connection(connection))
+
+    prepared = [call.args[0] for call in connection.prepare.await_args_list]
+    assert prepared == database.HOT_STATEMENTS
+
+def test_init_connection_skips_missing_tables():
+    """A statement on a table that does not exist yet does not fail the connection"""
+    connection = MagicMock()
+    connection.prepare = AsyncMock(side_effect=asyncpg.UndefinedTableError("missing"))
+
+    asyncio.run(database.init_connection(connection))
+
+    assert connection.prepare.await_count == len(database.HOT_STATEMENTS)
+
+def test_init_connection_skips_missing_columns():
+    """A database from before the profile settings migration still opens connections"""
+    connection = MagicMock()
+    connection.prepare = AsyncMock(side_effect=asyncpg.UndefinedColumnError("column \"model\" does not exist"))
+
+    asyncio.run(database.init_connection(connection))
+
+    assert connection.prepare.await_count == len(database.HOT_STATEMENTS)
+
+def test_update_profile_uses_one_static_statement():
+    """Partial profile updates share one statement text"""
+    connection = MagicMock()
+    connection.fetchrow = AsyncMock(return_value=None)
+
+    asyncio.run(database.update_profile(connection, 1, "Name", None))
+    asyncio.run(database.update_profile(connection, 1, None, "Addon"))
+
+    queries = {call.args[0] for call in connection.fetchrow.await_args_list}
+    assert queries == {database.PROFILE_UPDATE}
@@ -0,0 +1,88 @@
+import gzip
+import json
+from datetime import datetime
+from unittest.mock import AsyncMock
+from fastapi.testclient import TestClient
+from src import database
+from src.ingest import ReviewParser
+from src.main import app
+
+client = TestClient(app)
+
+def _review(review_id, **fields):
+    return {"review_id": review_id, "business_place_id": "place", "review_rating": 4, **fields}
+
+def test_ndjson_parser_handles_split_lines_and_bad_rows():
+    """Rows split across chunks are joined and malformed rows are skipped"""
+    data = "\n".join([
+        json.dumps(_review("r1", review_datetime_utc="2024-03-01T12:00:00+00:00")),
+        "not json",
+        json.dumps({"review_id": "r3"}),
+        json.dumps(_review("r4", review_datetime_utc="03/02/2024 08:30:00")),
+    ]).encode("utf-8")
+
+    parser = ReviewParser("ndjson")
+    records = []
+    for i in range(0, len(data), 7):
+        records.extend(parser.feed(data[i:i + 7]))
+    records.extend(parser.close())
+
+    assert [record[1] for record in records] == ["r1", "r4"]
+    assert records[0][8] == datetime(2024, 3, 1, 12, 0)
+    assert records[1][8] == datetime(2024, 3, 2, 8, 30)
+    assert parser.skipped == 2
+    assert len(parser.errors) == 2
+
+def test_csv_parser_keeps_quoted_newlines_across_chunks():
+    """A quoted field containing a newline is not split into two rows"""
+    data = (
+        "review_id,business_place_id,review_rating,review_text\n"
+        'r1,place,5,"Great food,\nlovely staff"\n'
+        "r2,place,3,Fine\n"
+    ).encode("utf-8")
+
+    parser = ReviewParser("csv")
+    records = parser.feed(data[:50]) + parser.feed(data[50:]) + parser.close()
+
+    assert [(record[1], record[7]) for record in records] == [("r1", "Great food,\nlovely staff"), ("r2", "Fine")]
+    assert parser.skipped == 0
+
+def test_ingest_endpoint_copies_then_upserts(db_connection):
+    """Rows are COPY'd into staging and merged with one upsert"""
+    db_connection.copy_records_to_table = AsyncMock()
+    db_connection.fetch.return_value = [{"business_place_id": "place"}]
+    db_connection.fetchrow.return_value = {"inserted": 1, "updated": 1}
+    body = "\n".join(json.dumps(_review(f"r{i}")) for i in range(3)) + "\n{broken"
+
+    response = client.post(
+        "/reviews/ingest?format=ndjson",
+        content=gzip.compress(body.encode("utf-8")),
+        headers={"Content-Encoding": "gzip"}
+    )
+
+    assert response.status_code == 200
+    result = response.json()
+    assert {key: result[key] for key in ("received", "inserted", "updated", "skipped")} == {
+        "received": 4, "inserted": 1, "updated": 1, "skipped": 2
+    }
+    assert result["errors"][0].startswith("row 4:")
+    copied = db_connection.copy_records_to_table.await_args
+    assert copied.args[0] == "review_staging"
+    assert len(copied.kwargs["records"]) == 3
+    assert copied.kwargs["columns"] == database.INGEST_COLUMNS
+    assert db_connection.fetchrow.await_args.args[0] == database.INGEST_UPSERT
+    assert db_connection.execute.await_args.args == (database.BUSINESS_STATS_RECOMPUTE, ["place"])
+
+def test_ingest_locks_business_stats_before_upsert(db_connection):
+    """Statistics of the affected businesses are locked before the upsert writes to them"""
+    db_connection.copy_records_to_table = AsyncMock()
+    db_connection.fetch.return_value = [{"business_place_id": "place"}]
+    db_connection.fetchrow.return_value = {"inserted": 1, "updated": 0}
+
+    response = client.post("/reviews/ingest?format=ndjson", content=json.dumps(_review("r1")))
+
+    assert response.status_code == 200
+    queries = [c.args[0] for c in db_connection.mock_calls if c.args and c.args[0] in (
+        database.BUSINESS_STATS_LOCK, database.INGEST_UPSERT, database.BUSINESS_STATS_RECOMPUTE
+    )]
+    assert queries == [database.BUSINESS_STATS_LOCK, database.INGEST_UPSERT, database.BUSINESS_STATS_RECOMPUTE]
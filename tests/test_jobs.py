@@ -0,0 +1,127 @@
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import datetime
+from unittest.mock import patch, MagicMock, AsyncMock
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from src import jobs, ratelimit
+from src.main import app
+from src.routes.message import GeneratedReply
+
+client = TestClient(app)
+
+def _item(attempts=1):
+    return {"id": 7, "job_id": 1, "profile_id": 1, "message_id": "r1", "bypass_cache": False, "attempts": attempts}
+
+def _pool(connection):
+    @asynccontextmanager
+    async def acquire():
+        yield connection
+
+    pool = MagicMock()
+    pool.acquire = acquire
+    return pool
+
+def test_submit_job_enqueues_items(db_connection):
+    """Submitting a job inserts one item per review and returns its ID"""
+    @asynccontextmanager
+    async def transaction():
+        yield
+
+    db_connection.transaction = transaction
+    db_connection.fetchval.return_value = 12
+    db_connection.execute.return_value = "INSERT 0 2"
+
+    response = client.post("/jobs/submit", json={"profile_id": 1, "message_ids": ["r1", "r2", "r1"]})
+
+    assert response.status_code == 200
+    assert response.json() == {"job_id": 12, "total": 2}
+    assert db_connection.execute.await_args.args[-1] == ["r1", "r2"]
+
+def test_get_job_status_reports_progress(db_connection):
+    """Status is derived from per-item counts"""
+    db_connection.fetchrow.return_value = {
+        "id": 12, "profile_id": 1, "created_at": datetime(2024, 5, 1),
+        "total": 4, "queued": 1, "running": 1, "succeeded": 1, "failed": 1
+    }
+
+    response = client.get("/jobs/12")
+
+    assert response.status_code == 200
+    assert response.json()["status"] == "running"
+    assert response.json()["succeeded"] == 1
+
+def test_process_item_saves_reply_and_marks_success():
+    """A generated reply is saved as a version and its text recorded on the item"""
+    connection = MagicMock()
+    connection.execute = AsyncMock()
+    reply = GeneratedReply(text="Thanks!", model="gpt-4o-mini", prompt_tokens=40, completion_tokens=3)
+
+    with patch.object(jobs, "fetch_generation_inputs", AsyncMock(return_value=("s", "m", None))), \
+            patch.object(jobs, "generate_reply", AsyncMock(return_value=reply)):
+        asyncio.run(jobs.process_item(_pool(connection), _item(attempts=1)))
+
+    save, succeeded = connection.execute.await_args_list
+    assert save.args[1:] == (["r1"], [1], ["gpt-4o-mini"], [40], [3], [None], ["Thanks!"])
+    assert succeeded.args[1:] == (7, "Thanks!")
+
+def test_process_item_requeues_transient_failures():
+    """A failed item goes back to the queue while attempts remain"""
+    connection = MagicMock()
+    connection.execute = AsyncMock()
+
+    with patch.object(jobs, "fetch_generation_inputs", AsyncMock(return_value=("s", "m", None))), \
+            patch.object(jobs, "generate_reply", AsyncMock(side_effect=Exception("boom"))):
+        asyncio.run(jobs.process_item(_pool(connection), _item(attempts=1)))
+
+    assert connection.execute.await_args.args[1:] == (7, "queued", "boom")
+
+def test_process_item_fails_missing_reviews_permanently():
+    """A missing review is not retried"""
+    connection = MagicMock()
+    connection.execute = AsyncMock()
+    not_found = HTTPException(status_code=404, detail="Review with ID r1 not found")
+
+    with patch.object(jobs, "fetch_generation_inputs", AsyncMock(side_effect=not_found)):
+        asyncio.run(jobs.process_item(_pool(connection), _item(attempts=1)))
+
+    assert connection.execute.await_args.args[1:] == (7, "failed", "Review with ID r1 not found")
+
+def test_process_item_defers_while_tokens_are_in_debt():
+    """An item of a profile over its token budget is put back without generating"""
+    connection = MagicMock()
+    connection.execute = AsyncMock()
+    limiter = ratelimit.TenantRateLimiter(
+        requests_per_minute=60, request_burst=2, tokens_per_minute=600, token_burst=100
+    )
+    limiter._bucket("profile:1", "tokens").take(160, 0)
+    generate = AsyncMock()
+
+    with patch.object(jobs, "RATE_LIMIT_ENABLED", True), \
+            patch.object(jobs, "rate_limiter", limiter), \
+            patch.object(jobs, "generate_reply", generate):
+        asyncio.run(jobs.process_item(_pool(connection), _item(attempts=1)))
+
+    generate.assert_not_awaited()
+    query, item_id, delay, _ = connection.execute.await_args.args
+    assert "not_before" in query and item_id == 7 and delay > 5
+
+def test_worker_keeps_polling_after_unexpected_errors():
+    """An unexpected error while claiming is logged and the worker polls again"""
+    claim = AsyncMock(side_effect=[RuntimeError("bug"), [], []])
+    workers = jobs.JobWorkerPool(workers=1, batch_size=10, poll_interval=0)
+
+    async def run():
+        task = asyncio.create_task(workers._work(_pool(MagicMock()), 0))
+        for _ in range(100):
+            if claim.await_count == 3 or task.done():
+                break
+            await asyncio.sleep(0)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        return task
+
+    with patch.object(jobs.database, "claim_job_items", claim):
+        task = asyncio.run(run())
+
+    assert task.cancelled()
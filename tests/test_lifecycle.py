@@ -0,0 +1,99 @@
+import asyncio
+import pytest
+from contextlib import asynccontextmanager
+from fastapi.testclient import TestClient
+from unittest.mock import patch, AsyncMock, MagicMock
+from src import database, lifecycle, main
+from src.main import app
+
+client = TestClient(app)
+
+def test_pool_size_follows_connection_budget():
+    """Workers split the budget after their dedicated connections"""
+    assert database.pool_max_size(0, 4, 3, 10) == 10
+    assert database.pool_max_size(40, 4, 3, 10) == 7
+    assert database.pool_max_size(100, 2, 3, 10) == 10
+    with pytest.raises(ValueError):
+        database.pool_max_size(8, 4, 3, 10)
+
+def test_drain_waits_for_generations():
+    """Shutdown waits for a tracked generation to finish"""
+    in_flight = lifecycle.InFlight()
+    finished = []
+
+    async def generation():
+        async with in_flight.track():
+            await asyncio.sleep(0.01)
+            finished.append(True)
+
+    async def run():
+        task = asyncio.create_task(generation())
+        await asyncio.sleep(0)
+        drained = await in_flight.drain(1)
+        await task
+        return drained
+
+    assert asyncio.run(run()) is True
+    assert finished == [True]
+    assert in_flight.draining
+
+def test_ready_with_pool(db_connection):
+    """A worker whose pool answers is ready"""
+    db_connection.fetchval.return_value = 1
+    response = client.get("/health/ready")
+    assert response.status_code == 200
+    assert response.json()["status"] == "ready"
+
+def test_not_ready_without_pool_or_while_draining(db_connection):
+    """Readiness fails while draining, and without a database"""
+    with patch.object(lifecycle.in_flight, "draining", True):
+        assert client.get("/health/ready").status_code == 503
+    app.state.db_pool = None
+    assert client.get("/health/ready").status_code == 503
+    assert client.get("/health/live").status_code == 200
+
+def test_startup_does_not_wait_for_database():
+    """The server answers while the pool is still being opened"""
+    async def unreachable():
+        await asyncio.Event().wait()
+
+    with patch.object(main, "init_db", side_effect=unreachable), \
+            patch.object(main.llm, "warm_up", AsyncMock()), \
+            patch.object(main, "close_db", AsyncMock()), \
+            patch.object(main.usage_recorder, "stop", AsyncMock()), \
+            patch.object(main.reply_flight.locks, "close", AsyncMock()), \
+            patch.object(lifecycle.in_flight, "draining", False):
+        with TestClient(app) as started:
+            assert started.get("/health/live").status_code == 200
+            assert started.get("/health/ready").status_code == 503
+
+def _pool():
+    @asynccontextmanager
+    async def acquire():
+        yield MagicMock()
+
+    pool = MagicMock()
+    pool.acquire = acquire
+    return pool
+
+def test_migration_failure_closes_pool_and_ends_startup():
+    """A failed migration is not retried: the pool is closed and the server shut down"""
+    async def run():
+        task = asyncio.create_task(main.start_database(app))
+        await asyncio.gather(task, return_exceptions=True)
+        return task
+
+    with patch.object(main, "init_db", AsyncMock(return_value=object())), \
+            patch.object(main, "InstrumentedPool", lambda pool: _pool()), \
+            patch.object(main, "MIGRATE_ON_STARTUP", True), \
+            patch.object(main, "migrate", AsyncMock(side_effect=RuntimeError("bad migration"))), \
+            patch.object(main, "close_db", AsyncMock()) as close, \
+            patch.object(main.profile_cache, "start_listener") as listener, \
+            patch.object(main.os, "kill") as kill:
+        task = asyncio.run(run())
+        main.log_startup_failure(task)
+
+    assert isinstance(task.exception(), RuntimeError)
+    close.assert_awaited_once()
+    listener.assert_not_called()
+    kill.assert_called_once_with(main.os.getpid(), main.signal.SIGTERM)
@@ -0,0 +1,70 @@
+import asyncio
+import httpx
+import openai
+import pytest
+from unittest.mock import patch, MagicMock
+from src import llm
+
+def _timeout_error():
+    return openai.APITimeoutError(request=httpx.Request("POST", "https://api.openai.com"))
+
+def _fake_client(create):
+    fake = MagicMock()
+    fake.chat.completions.create = create
+    return fake
+
+def test_create_chat_completion_retries_transient_errors():
+    """Transient errors are retried and the eventual result is returned"""
+    calls = []
+
+    async def create(**kwargs):
+        calls.append(kwargs)
+        if len(calls) < 3:
+            raise _timeout_error()
+        return "ok"
+
+    with patch.object(llm, "client", _fake_client(create)), \
+            patch.object(llm, "backoff_delay", return_value=0):
+        result = asyncio.run(llm.create_chat_completion(model="m", messages=[]))
+
+    assert result == "ok"
+    assert len(calls) == 3
+
+def test_create_chat_completion_gives_up_after_max_retries():
+    """The last transient error is raised once retries are exhausted"""
+    async def create(**kwargs):
+        raise _timeout_error()
+
+    with patch.object(llm, "client", _fake_client(create)), \
+            patch.object(llm, "backoff_delay", return_value=0), \
+            patch.object(llm, "OPENAI_MAX_RETRIES", 1):
+        with pytest.raises(openai.APITimeoutError):
+            asyncio.run(llm.create_chat_completion(model="m", messages=[]))
+
+def test_create_chat_completion_bounds_concurrency():
+    """No more than the configured number of calls are in flight at once"""
+    in_flight = 0
+    peak = 0
+
+    async def create(**kwargs):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return "ok"
+
+    async def run():
+        await asyncio.gather(*[
+            llm.create_chat_completion(model="m", messages=[]) for _ in range(10)
+        ])
+
+    with patch.object(llm, "client", _fake_client(create)), \
+            patch.object(llm, "_semaphore", asyncio.Semaphore(2)):
+        asyncio.run(run())
+
+    assert peak == 2
+
+def test_backoff_delay_is_capped():
+    """Jittered delays never exceed the configured maximum"""
+    assert all(0 <= llm.backoff_delay(attempt) <= llm.OPENAI_RETRY_MAX_DELAY for attempt in range(20))
@@ -0,0 +1,48 @@
+import json
+import logging
+import queue
+from src import logconfig, metrics
+
+def make_record(name, level=logging.INFO, msg="hello %s", args=("world",), exc_info=None):
+    return logging.LogRecord(name, level, __file__, 1, msg, args, exc_info)
+
+def test_sampling_keeps_one_in_n_info_records():
+    """Busy loggers and their children are sampled; warnings always pass"""
+    sampler = logconfig.SamplingFilter({"src.routes": 0.25})
+    kept = [sampler.filter(make_record("src.routes.reviews")) for _ in range(8)]
+    assert kept.count(True) == 2
+    assert sampler.filter(make_record("src.routes.reviews", logging.WARNING))
+    assert sampler.filter(make_record("src.jobs"))
+
+def test_queued_record_is_formatted_as_json():
+    """Message, trace ID and traceback are resolved before queueing"""
+    log_queue = queue.Queue()
+    handler = logconfig.BoundedQueueHandler(log_queue)
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        import sys
+        record = make_record("src.main", logging.ERROR, exc_info=sys.exc_info())
+
+    token = metrics.current_trace.set(metrics.Trace("abc123"))
+    try:
+        handler.handle(record)
+    finally:
+        metrics.current_trace.reset(token)
+
+    entry = json.loads(logconfig.JSONFormatter().format(log_queue.get_nowait()))
+    assert entry["message"] == "hello world"
+    assert entry["trace_id"] == "abc123"
+    assert entry["level"] == "ERROR"
+    assert "ValueError: boom" in entry["exception"]
+
+def test_full_queue_drops_instead_of_blocking():
+    """A full queue drops the record and counts it"""
+    handler = logconfig.BoundedQueueHandler(queue.Queue(maxsize=1))
+    before = metrics.LOG_RECORDS_DROPPED._value.get()
+    handler.handle(make_record("src.main"))
+    handler.handle(make_record("src.main"))
+    assert metrics.LOG_RECORDS_DROPPED._value.get() == before + 1
+
+def test_parse_sample_rates():
+    assert logconfig.parse_sample_rates("a=0.1, b.c=0.5,") == {"a": 0.1, "b.c": 0.5}
@@ -0,0 +1,86 @@
+from unittest.mock import patch, MagicMock, AsyncMock
+from fastapi.testclient import TestClient
+from src.main import app
+from src.routes import message
+
+client = TestClient(app)
+
+PROFILE_ROW = {"profile_text_base": "Be kind.", "profile_text_addon": "Sign as Bob."}
+
+def _review_row(review_id, text="Great food"):
+    return {"review_id": review_id, "message": text, "username": "Jane Doe", "rating": 5}
+
+def test_get_responses_batch_generates_and_bulk_saves(db_connection):
+    """Replies are generated per review and saved as versions with one INSERT"""
+    connection = db_connection
+    connection.fetchrow.return_value = PROFILE_ROW
+    connection.fetch.return_value = [_review_row("r1"), _review_row("r2")]
+
+    async def fake_generate(system_message, message_content, db_pool=None, bypass_cache=False, **usage_ids):
+        return message.GeneratedReply(
+            text=f"Thanks! ({message_content.split(' - ')[0]})", model="gpt-4o-mini",
+            prompt_tokens=40, completion_tokens=5, latency_ms=120.0
+        )
+
+    with patch.object(message.llm, "client", MagicMock()), \
+            patch.object(message, "generate_reply", side_effect=fake_generate):
+        response = client.post(
+            "/message/get_responses_batch",
+            json={"profile_id": 1, "message_ids": ["r1", "r2", "missing"]}
+        )
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["succeeded"] == 2
+    assert body["failed"] == 1
+    by_id = {item["message_id"]: item for item in body["results"]}
+    assert by_id["r1"]["response"] == "Thanks! (Great food)"
+    assert by_id["missing"]["error"] is not None
+
+    # One SELECT for all reviews and one INSERT for all replies
+    assert connection.fetch.await_count == 1
+    assert connection.execute.await_count == 1
+    query, ids, profile_ids, models, prompt_tokens, _, _, replies = connection.execute.await_args.args
+    assert "INSERT INTO review_replies" in query
+    assert ids == ["r1", "r2"]
+    assert profile_ids == [1, 1]
+    assert models == ["gpt-4o-mini"] * 2
+    assert prompt_tokens == [40, 40]
+    assert replies == ["Thanks! (Great food)"] * 2
+
+def test_get_responses_batch_requires_exactly_one_selector():
+    """Either message_ids or business_place_id must be given, not both"""
+    with patch.object(message.llm, "client", MagicMock()):
+        response = client.post(
+            "/message/get_responses_batch",
+            json={"profile_id": 1, "message_ids": ["r1"], "business_place_id": "abc"}
+        )
+    assert response.status_code == 400
+
+def test_get_response_stream_relays_tokens_and_saves_on_completion(db_connection):
+    """Tokens are relayed as SSE events and the full reply is saved at the end"""
+    async def fake_inputs(db_pool, profile_id, message_id):
+        return "system", "content", message.routing.default_settings()
+
+    async def fake_stream(**kwargs):
+        for token in ["Thank ", "you", "!"]:
+            yield token
+
+    save_reply = AsyncMock()
+    with patch.object(message.llm, "client", MagicMock()), \
+            patch.object(message, "fetch_generation_inputs", side_effect=fake_inputs), \
+            patch.object(message.llm, "stream_chat_completion", side_effect=fake_stream), \
+            patch.object(message, "save_reply", save_reply):
+        response = client.post(
+            "/message/get_response_stream",
+            json={"profile_id": 1, "message_id": "r1", "bypass_cache": True}
+        )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert response.text.count('data: {"delta"') == 3
+    assert 'event: done\ndata: {"response": "Thank you!"}' in response.text
+    _, message_id, profile_id, reply = save_reply.await_args.args
+    assert (message_id, profile_id, reply.text) == ("r1", 1, "Thank you!")
+    assert reply.model == "gpt-3.5-turbo"
+    assert reply.completion_tokens > 0
@@ -0,0 +1,69 @@
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import patch, MagicMock
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+from src import llm, metrics, database
+from src.main import app
+
+client = TestClient(app)
+
+def _sample(name, labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+def test_requests_are_timed_by_route_template_and_traced(db_connection):
+    """Latency is labelled by route template and the trace ID is echoed back"""
+    labels = {"method": "GET", "route": "/profiles/fetch_profiles", "status": "200"}
+    before = _sample("http_request_duration_seconds_count", labels)
+
+    response = client.get("/profiles/fetch_profiles", headers={"X-Request-ID": "abc123"})
+
+    assert response.headers["x-trace-id"] == "abc123"
+    assert _sample("http_request_duration_seconds_count", labels) == before + 1
+
+def test_metrics_endpoint_exports_pool_gauges(db_connection):
+    """Scrapes refresh the pool gauges and use the Prometheus text format"""
+    pool = app.state.db_pool
+    pool.get_size.return_value = 4
+    pool.get_idle_size.return_value = 3
+    pool.get_max_size.return_value = 10
+
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert "db_pool_idle 3.0" in response.text
+    assert "http_request_duration_seconds" in response.text
+
+def test_query_logger_labels_known_queries():
+    """Constant queries are labelled by name and everything else as dynamic"""
+    before = _sample("db_query_duration_seconds_count", {"query": "profile_by_id"})
+    errors = _sample("db_query_errors_total", {"query": "dynamic"})
+
+    metrics.record_query(SimpleNamespace(query=database.PROFILE_BY_ID, elapsed=0.01, exception=None))
+    metrics.record_query(SimpleNamespace(query="SELECT 1", elapsed=0.01, exception=RuntimeError()))
+
+    assert _sample("db_query_duration_seconds_count", {"query": "profile_by_id"}) == before + 1
+    assert _sample("db_query_errors_total", {"query": "dynamic"}) == errors + 1
+
+def test_openai_tokens_and_stage_timing_are_recorded():
+    """Completion usage is counted and the call time lands in the trace"""
+    async def create(**kwargs):
+        return SimpleNamespace(usage=SimpleNamespace(prompt_tokens=12, completion_tokens=5))
+
+    fake = MagicMock()
+    fake.chat.completions.create = create
+    labels = {"model": "test-model", "kind": "completion"}
+    before = _sample("openai_tokens_total", labels)
+
+    async def run():
+        trace = metrics.Trace("t")
+        metrics.current_trace.set(trace)
+        await llm.create_chat_completion(model="test-model", messages=[])
+        return trace
+
+    with patch.object(llm, "client", fake):
+        trace = asyncio.run(run())
+
+    assert _sample("openai_tokens_total", labels) == before + 5
+    assert "openai" in trace.stages
@@ -0,0 +1,25 @@
+import re
+from src.migrate import discover_migrations, find_seq_scans, PLAN_CHECKS
+
+def test_migrations_are_numbered_in_order():
+    """Migration files are discovered in version order without gaps"""
+    versions = [version for version, _, _ in discover_migrations()]
+    assert versions == list(range(1, len(versions) + 1))
+
+def test_find_seq_scans_walks_nested_plans():
+    """Sequential scans are found anywhere in the plan tree"""
+    plan = {
+        "Node Type": "Nested Loop",
+        "Plans": [
+            {"Node Type": "Index Scan", "Relation Name": "profiles"},
+            {"Node Type": "Limit", "Plans": [{"Node Type": "Seq Scan", "Relation Name": "reviews"}]}
+        ]
+    }
+    assert find_seq_scans(plan) == ["reviews"]
+    assert find_seq_scans({"Node Type": "Index Only Scan", "Relation Name": "reviews"}) == []
+
+def test_plan_checks_supply_every_parameter():
+    """Each checked query gets one sample argument per placeholder"""
+    for label, query, args in PLAN_CHECKS:
+        placeholders = {int(n) for n in re.findall(r"\$(\d+)", query)}
+        assert placeholders == set(range(1, len(args) + 1)), label
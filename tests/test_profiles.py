@@ -0,0 +1,60 @@
+import asyncio
+from unittest.mock import MagicMock, AsyncMock
+from fastapi.testclient import TestClient
+from src.main import app
+from src.profile_cache import ProfileCache
+
+client = TestClient(app)
+
+PROFILES = [{"id": 1, "profile_name": "Friendly", "profile_text_addon": "Sign as Bob."}]
+
+def test_fetch_profiles_is_cached_with_etag(db_connection):
+    """Repeated polling is served from cache and matching ETags get a 304"""
+    db_connection.fetch.return_value = PROFILES
+
+    first = client.get("/profiles/fetch_profiles")
+    assert first.status_code == 200
+    assert first.json() == PROFILES
+    etag = first.headers["etag"]
+
+    second = client.get("/profiles/fetch_profiles", headers={"If-None-Match": etag})
+    assert second.status_code == 304
+    assert second.content == b""
+    assert db_connection.fetch.await_count == 1
+
+def test_update_profile_invalidates_cache(db_connection):
+    """Updating a profile drops the cached listing and notifies other workers"""
+    db_connection.fetch.return_value = PROFILES
+    etag = client.get("/profiles/fetch_profiles").headers["etag"]
+
+    updated = {"id": 1, "profile_name": "Formal", "profile_text_base": "Base", "profile_text_addon": "Sign as Bob."}
+    db_connection.fetchrow.return_value = updated
+    response = client.put("/profiles/update_profile/1", json={"profile_name": "Formal"})
+    assert response.status_code == 200
+    assert db_connection.execute.await_args.args[1:] == ("profile_changes", "1")
+    # The notification is sent by the transaction that saves the change
+    db_connection.transaction.assert_called_once()
+
+    db_connection.fetch.return_value = [{"id": 1, "profile_name": "Formal", "profile_text_addon": "Sign as Bob."}]
+    refreshed = client.get("/profiles/fetch_profiles", headers={"If-None-Match": etag})
+    assert refreshed.status_code == 200
+    assert refreshed.json()[0]["profile_name"] == "Formal"
+
+def test_profile_loaded_across_an_invalidation_is_not_cached():
+    """A row read before a concurrent update is not kept in the cache"""
+    cache = ProfileCache(ttl_seconds=60, channel="profile_changes")
+    connection = MagicMock()
+
+    async def fetch_during_update(query, profile_id):
+        cache.invalidate(profile_id)
+        return {"id": profile_id, "profile_name": "Old"}
+
+    connection.fetchrow = AsyncMock(side_effect=fetch_during_update)
+    pool = MagicMock()
+    pool.acquire.return_value.__aenter__ = AsyncMock(return_value=connection)
+    pool.acquire.return_value.__aexit__ = AsyncMock(return_value=False)
+
+    profile = asyncio.run(cache.get(pool, 1))
+
+    assert profile["profile_name"] == "Old"
+    assert 1 not in cache._profiles
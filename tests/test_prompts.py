@@ -0,0 +1,66 @@
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import patch, MagicMock, AsyncMock
+from src import prompts
+from src.routes import message
+from src.usage import UsageRecorder
+
+def test_truncate_to_budget_keeps_start_and_end():
+    """Oversized text is cut to the budget around an ellipsis"""
+    text = "Start of the review. " + "filler " * 2000 + "Final verdict: great."
+    shortened = prompts.truncate_to_budget(text, 50)
+
+    assert prompts.count_tokens(shortened) <= 50
+    assert shortened.startswith("Start of the review.")
+    assert shortened.endswith("great.")
+    assert prompts.truncate_to_budget("Short review", 50) == "Short review"
+
+def test_message_content_fits_prompt_budget():
+    """The review text is shortened so the whole prompt stays in budget"""
+    system_message = prompts.build_system_message({"profile_text_base": "Be kind.", "profile_text_addon": "Sign as Bob."})
+    row = {"message": "word " * 10000, "username": "Jane Doe", "rating": 2}
+
+    with patch.object(prompts, "PROMPT_MAX_TOKENS", 200):
+        content = prompts.build_message_content(row, system_message)
+
+    messages = [{"role": "system", "content": system_message}, {"role": "user", "content": content}]
+    assert prompts.prompt_tokens(messages) <= 200
+    assert content.endswith("sent by Jane who gave a rating of 2 stars")
+
+def test_system_prefix_is_built_once_per_profile_text():
+    """Repeated profiles reuse the cached system prefix"""
+    prompts.system_prefix.cache_clear()
+    profile = {"profile_text_base": "Be kind.", "profile_text_addon": "Sign as Ann."}
+    prompts.build_system_message(profile)
+    prompts.build_system_message(dict(profile))
+    assert prompts.system_prefix.cache_info().hits == 1
+
+def test_generate_reply_records_token_usage():
+    """API usage is buffered per reply and flushed in one insert"""
+    recorder = UsageRecorder(flush_interval=60, max_buffer=10)
+    response = SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content="Thanks!"))],
+        usage=SimpleNamespace(prompt_tokens=40, completion_tokens=3)
+    )
+    connection = MagicMock()
+    connection.execute = AsyncMock()
+    pool = MagicMock()
+    pool.acquire.return_value.__aenter__ = AsyncMock(return_value=connection)
+    pool.acquire.return_value.__aexit__ = AsyncMock(return_value=False)
+
+    async def run():
+        reply = await message.generate_reply("system", "content", bypass_cache=True, profile_id=7, message_id="r1")
+        await recorder.flush(pool)
+        return reply
+
+    with patch.object(message, "usage_recorder", recorder), \
+            patch.object(message.llm, "create_chat_completion", AsyncMock(return_value=response)), \
+            patch.object(message.reply_cache, "set", AsyncMock()):
+        reply = asyncio.run(run())
+
+    assert (reply.text, reply.prompt_tokens, reply.completion_tokens) == ("Thanks!", 40, 3)
+    _, profile_ids, review_ids, models, prompt_tokens, completion_tokens, _ = connection.execute.await_args.args
+    assert profile_ids == [7]
+    assert review_ids == ["r1"]
+    assert models == ["gpt-3.5-turbo"]
+    assert (prompt_tokens, completion_tokens) == ([40], [3])
@@ -0,0 +1,101 @@
+import asyncio
+import pytest
+from contextlib import asynccontextmanager
+from fastapi.testclient import TestClient
+from unittest.mock import patch, MagicMock, AsyncMock
+from src import metrics, ratelimit
+from src.main import app
+from src.routes import message
+
+client = TestClient(app)
+
+@pytest.fixture
+def limiter():
+    """Replace the rate limiter with one allowing two requests and 100 tokens"""
+    fresh = ratelimit.TenantRateLimiter(
+        requests_per_minute=60, request_burst=2, tokens_per_minute=600, token_burst=100
+    )
+    with patch.object(ratelimit, "rate_limiter", fresh), patch.object(message, "rate_limiter", fresh), \
+            patch.object(ratelimit, "RATE_LIMIT_ENABLED", True):
+        yield fresh
+
+def test_bucket_refills_over_time():
+    """Tokens come back at the refill rate, up to the capacity"""
+    bucket = ratelimit.TokenBucket(capacity=2, rate=10)
+    assert bucket.take(2, 2)
+    assert not bucket.take(1, 1)
+    bucket.updated -= 0.1
+    assert bucket.take(1, 1)
+
+def test_requests_over_budget_get_429(db_connection, limiter):
+    """The third request in a burst of two is rejected with Retry-After, whatever API key is sent"""
+    with patch.object(message.llm, "client", MagicMock()), \
+            patch.object(message, "fetch_generation_inputs", AsyncMock(return_value=("system", "content", None))), \
+            patch.object(message, "generate_reply", AsyncMock(return_value=message.GeneratedReply(text="Thanks!"))), \
+            patch.object(message, "save_reply", AsyncMock()):
+        responses = [client.post("/message/get_response", json={"profile_id": 1, "message_id": f"r{i}"}) for i in range(3)]
+        new_key = client.post(
+            "/message/get_response", json={"profile_id": 1, "message_id": "r9"}, headers={"X-API-Key": "fresh"}
+        )
+        other_profile = client.post("/message/get_response", json={"profile_id": 2, "message_id": "r9"})
+
+    assert [r.status_code for r in responses] == [200, 200, 429]
+    assert responses[2].headers["Retry-After"] == "1"
+    assert new_key.status_code == 429
+    assert other_profile.status_code == 200
+
+def test_token_debt_blocks_until_repaid(limiter):
+    """Tokens used beyond the budget reject the tenant's next request"""
+    async def run():
+        await limiter.acquire(None, "profile:1")
+        limiter.charge(160)
+        await limiter.acquire(None, "profile:1")
+
+    with pytest.raises(ratelimit.RateLimitExceeded) as exc:
+        asyncio.run(run())
+    assert exc.value.budget == "tokens"
+    assert exc.value.retry_after > 5
+
+def test_job_items_count_against_the_request_budget(db_connection, limiter):
+    """Job items use up the request budget; a job that no longer fits is rejected before it is created"""
+    @asynccontextmanager
+    async def transaction():
+        yield
+
+    db_connection.transaction = transaction
+    db_connection.fetchval.return_value = 12
+    db_connection.execute.return_value = "INSERT 0 2"
+
+    first = client.post("/jobs/submit", json={"profile_id": 1, "message_ids": ["r1", "r2"]})
+    second = client.post("/jobs/submit", json={"profile_id": 1, "message_ids": ["r3", "r4"]})
+
+    assert first.status_code == 200
+    assert second.status_code == 429
+    assert "Retry-After" in second.headers
+    assert db_connection.fetchval.await_count == 1
+
+def test_level_series_are_dropped_for_evicted_tenants():
+    """Only the most recent tenants keep a bucket level series"""
+    limiter = ratelimit.TenantRateLimiter(
+        requests_per_minute=60, request_burst=2, tokens_per_minute=600, token_burst=100, max_tenants=2
+    )
+
+    async def run():
+        for profile_id in range(3):
+            await limiter.acquire(None, ratelimit.tenant_key(profile_id + 1000))
+
+    asyncio.run(run())
+    tenants = {sample.labels["tenant"] for sample in metrics.RATE_LIMIT_LEVEL.collect()[0].samples}
+    assert "profile:1000" not in tenants
+    assert {"profile:1001", "profile:1002"} <= tenants
+
+def test_large_batch_is_charged_in_full(limiter):
+    """A batch over the burst is admitted once, then blocks until its whole cost refills"""
+    async def run():
+        await limiter.acquire(None, "profile:1", requests=10)
+        await limiter.acquire(None, "profile:1")
+
+    with pytest.raises(ratelimit.RateLimitExceeded) as exc:
+        asyncio.run(run())
+    assert exc.value.budget == "requests"
+    assert exc.value.retry_after > 8
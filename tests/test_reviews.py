@@ -0,0 +1,164 @@
+import json
+from contextlib import asynccontextmanager
+from datetime import datetime
+from unittest.mock import patch, MagicMock, AsyncMock
+from fastapi.testclient import TestClient
+from src import database
+from src.main import app
+from src.routes.reviews import BusinessReviewRequest, build_review_filters, encode_cursor, decode_cursor
+
+client = TestClient(app)
+
+STATS = {
+    "total_reviews": 4,
+    "average_rating": 4.0,
+    "replied_reviews": 1,
+    "rating_1": 0,
+    "rating_2": 0,
+    "rating_3": 1,
+    "rating_4": 2,
+    "rating_5": 1
+}
+
+def _review_row(pk, timestamp):
+    return {
+        **STATS,
+        "id": pk,
+        "review_id": f"r{pk}",
+        "username": "Jane Doe",
+        "rating": 4.0,
+        "timestamp": timestamp,
+        "review_text": "Nice",
+        "business_place_id": "place",
+        "n_review_user": 3,
+        "replies": None,
+        "review_timestamp": 1700000000,
+        "url_user": None
+    }
+
+def test_cursor_round_trip():
+    """Cursors decode back to the sort key they were built from"""
+    timestamp = datetime(2024, 5, 1, 12, 30)
+    assert decode_cursor(encode_cursor(timestamp, 42)) == (timestamp, 42)
+    assert decode_cursor(encode_cursor(None, 7)) == (None, 7)
+
+def test_build_review_filters_numbers_parameters_in_order():
+    """Each filter adds one clause with the next positional parameter"""
+    request = BusinessReviewRequest(
+        business_place_id="place",
+        min_rating=2,
+        has_reply=False,
+        cursor=encode_cursor(datetime(2024, 5, 1), 10)
+    )
+    clauses, params = build_review_filters(request)
+    assert clauses[0] == "business_place_id = $1"
+    assert clauses[1] == "review_rating >= $2"
+    assert clauses[2] == database.UNREPLIED
+    assert "review_datetime_utc < $3" in clauses[3] and "id < $4" in clauses[3]
+    assert params == ["place", 2, datetime(2024, 5, 1), 10]
+
+def test_fetch_reviews_returns_next_cursor(db_connection):
+    """A full page returns a cursor pointing after its last review"""
+    rows = [_review_row(pk, datetime(2024, 5, pk)) for pk in (3, 2, 1)]
+    db_connection.fetch.return_value = rows
+
+    response = client.post("/reviews/fetch", json={"business_place_id": "place", "limit": 2})
+
+    assert response.status_code == 200
+    body = response.json()
+    assert [review["id"] for review in body["reviews"]] == [3, 2]
+    assert decode_cursor(body["next_cursor"]) == (datetime(2024, 5, 2), 2)
+    assert db_connection.fetch.await_args.args[-1] == 3
+    assert db_connection.fetch.await_count == 1
+
+def test_fetch_reviews_reports_stats_for_empty_page(db_connection):
+    """Stats are returned from the same query even when no review matches"""
+    empty_page = {**{key: None for key in _review_row(1, None)}, **STATS}
+    db_connection.fetch.return_value = [empty_page]
+
+    response = client.post("/reviews/fetch", json={"business_place_id": "place", "min_rating": 5.5})
+
+    body = response.json()
+    assert body["reviews"] == []
+    assert body["next_cursor"] is None
+    assert body["total_reviews"] == 4
+    assert body["rating_distribution"] == {"1": 0, "2": 0, "3": 1, "4": 2, "5": 1}
+    assert body["reply_coverage"] == 25.0
+
+def test_fetch_reviews_rejects_invalid_cursor(db_connection):
+    """A malformed cursor is a client error"""
+    response = client.post("/reviews/fetch", json={"business_place_id": "place", "cursor": "not-a-cursor"})
+    assert response.status_code == 400
+
+def test_fetch_review_stats_reads_summary_rows(db_connection):
+    """Stats come from summary rows; unknown businesses report zeros"""
+    db_connection.fetch.return_value = [{
+        "business_place_id": "place",
+        "review_count": 4,
+        "rating_sum": 16,
+        "rating_1": 0,
+        "rating_2": 0,
+        "rating_3": 1,
+        "rating_4": 2,
+        "rating_5": 1,
+        "replied_count": 2,
+        "last_review_at": datetime(2024, 5, 3)
+    }]
+
+    response = client.post("/reviews/stats", json={"business_place_ids": ["place", "other"]})
+
+    assert response.status_code == 200
+    place, other = response.json()
+    assert place["average_rating"] == 4.0
+    assert place["reply_coverage"] == 50.0
+    assert place["rating_distribution"]["4"] == 2
+    assert other == {
+        "business_place_id": "other",
+        "total_reviews": 0,
+        "average_rating": 0.0,
+        "rating_distribution": {"1": 0, "2": 0, "3": 0, "4": 0, "5": 0},
+        "reply_coverage": 0.0,
+        "last_review_at": None
+    }
+
+def _export_cursor(db_connection, rows):
+    @asynccontextmanager
+    async def transaction(**kwargs):
+        yield
+
+    cursor = MagicMock()
+    cursor.fetch = AsyncMock(side_effect=[rows, []])
+    db_connection.transaction = transaction
+    db_connection.cursor = AsyncMock(return_value=cursor)
+    return cursor
+
+def test_export_reviews_streams_csv(db_connection):
+    """CSV exports start with a header and contain one line per review"""
+    _export_cursor(db_connection, [_review_row(1, datetime(2024, 5, 1))])
+
+    with patch("src.routes.reviews.REVIEWS_EXPORT_BATCH_SIZE", 1):
+        response = client.post("/reviews/export", json={"business_place_ids": ["place"], "format": "csv"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    lines = response.text.splitlines()
+    assert lines[0].startswith("id,review_id,username,rating,timestamp")
+    assert lines[1].startswith("1,r1,Jane Doe,4.0,2024-05-01T00:00:00")
+    assert len(lines) == 2
+
+def test_export_reviews_gzips_ndjson(db_connection):
+    """NDJSON exports can be gzipped on the fly"""
+    rows = [_review_row(2, datetime(2024, 5, 2)), _review_row(1, None)]
+    _export_cursor(db_connection, rows)
+
+    response = client.post(
+        "/reviews/export",
+        json={"business_place_ids": ["place"], "gzip": True, "has_reply": False}
+    )
+
+    assert response.headers["content-encoding"] == "gzip"
+    records = [json.loads(line) for line in response.text.splitlines()]
+    assert [record["id"] for record in records] == [2, 1]
+    assert records[1]["timestamp"] is None
+    query = db_connection.cursor.await_args.args[0]
+    assert "business_place_id = ANY($1::text[])" in query and database.UNREPLIED in query
@@ -0,0 +1,80 @@
+import asyncio
+import httpx
+import openai
+import pytest
+from types import SimpleNamespace
+from unittest.mock import patch, AsyncMock
+from src import routing
+
+def _timeout_error():
+    return openai.APITimeoutError(request=httpx.Request("POST", "https://api.openai.com"))
+
+def test_short_or_positive_reviews_use_the_cheap_model():
+    """Easy reviews go to the cheap model first; others to the primary"""
+    profile = {"model": "big", "cheap_model": "small", "fallback_model": "backup", "temperature": None, "max_tokens": None}
+    long_text = "The soup was cold and the waiter ignored us. " * 20
+
+    easy = routing.completion_settings(profile, {"message": "Great!", "rating": 2})
+    positive = routing.completion_settings(profile, {"message": long_text, "rating": 5})
+    hard = routing.completion_settings(profile, {"message": long_text, "rating": 1})
+
+    assert easy["models"] == ["small", "big", "backup"]
+    assert positive["models"][0] == "small"
+    assert hard["models"] == ["big", "backup"]
+    assert hard["temperature"] == routing.OPENAI_TEMPERATURE
+
+def test_completion_falls_back_after_transient_error():
+    """A failing primary model hands the call to the next one"""
+    calls = []
+
+    async def create(**params):
+        calls.append(params["model"])
+        if params["model"] == "primary":
+            raise _timeout_error()
+        return SimpleNamespace(model=params["model"])
+
+    breaker = routing.CircuitBreaker(failure_threshold=5, reset_seconds=30)
+    with patch.object(routing.llm, "create_chat_completion", side_effect=create), \
+            patch.object(routing, "circuit_breaker", breaker):
+        response = asyncio.run(routing.create_chat_completion({"messages": []}, ["primary", "secondary"]))
+
+    assert response.model == "secondary"
+    assert calls == ["primary", "secondary"]
+
+def test_circuit_breaker_skips_failing_model_until_reset():
+    """An open circuit skips its model, then lets one trial call through"""
+    breaker = routing.CircuitBreaker(failure_threshold=2, reset_seconds=30)
+    breaker.record_failure("m")
+    assert breaker.allow("m")
+    breaker.record_failure("m")
+    assert not breaker.allow("m")
+
+    with patch.object(routing.time, "monotonic", return_value=routing.time.monotonic() + 31):
+        assert breaker.allow("m")
+        assert not breaker.allow("m")
+    breaker.record_success("m")
+    assert breaker.allow("m")
+
+def test_all_circuits_open_raises():
+    """With every model's circuit open no call is made"""
+    breaker = routing.CircuitBreaker(failure_threshold=1, reset_seconds=30)
+    breaker.record_failure("only")
+    create = AsyncMock()
+    with patch.object(routing.llm, "create_chat_completion", create), \
+            patch.object(routing, "circuit_breaker", breaker):
+        with pytest.raises(routing.CircuitOpenError):
+            asyncio.run(routing.create_chat_completion({"messages": []}, ["only"]))
+    create.assert_not_called()
+
+def test_trial_is_released_when_the_call_ends_without_an_outcome():
+    """A trial call failing with a request error does not block the model for good"""
+    breaker = routing.CircuitBreaker(failure_threshold=1, reset_seconds=30)
+    breaker.record_failure("only")
+    create = AsyncMock(side_effect=ValueError("bad request"))
+
+    with patch.object(routing.llm, "create_chat_completion", create), \
+            patch.object(routing, "circuit_breaker", breaker), \
+            patch.object(routing.time, "monotonic", return_value=routing.time.monotonic() + 31):
+        with pytest.raises(ValueError):
+            asyncio.run(routing.create_chat_completion({"messages": []}, ["only"]))
+        assert breaker.allow("only")
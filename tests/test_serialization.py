@@ -0,0 +1,55 @@
+import json
+from datetime import datetime
+from decimal import Decimal
+from fastapi.encoders import jsonable_encoder
+from fastapi.testclient import TestClient
+from unittest.mock import patch
+from src import serialization
+from src.main import app
+from src.routes import reviews
+
+client = TestClient(app)
+
+ROW = {
+    "id": 7, "review_id": "r7", "username": "Sam", "rating": Decimal("4.5"),
+    "timestamp": datetime(2024, 3, 1, 12, 30, 5, 123400), "review_text": None,
+    "business_place_id": "place-1", "n_review_user": 3, "replies": None,
+    "review_timestamp": 1709296205, "url_user": None
+}
+
+def pydantic_response(rows, stats):
+    """What the listing returned when it built response models"""
+    response = reviews.BusinessReviewResponse(
+        business_place_id="place-1",
+        reviews=[reviews.Review(**{**row, "rating": float(row["rating"]), "review_text": row["review_text"] or ""}) for row in rows],
+        total_reviews=stats["total_reviews"],
+        average_rating=float(stats["average_rating"]),
+        rating_distribution=reviews.rating_distribution(stats),
+        reply_coverage=reviews.reply_coverage(stats["replied_reviews"], stats["total_reviews"]),
+    )
+    return jsonable_encoder(response)
+
+def test_listing_matches_response_model_output(db_connection):
+    """The direct encoding has the same shape and values as the Pydantic path"""
+    stats = {"total_reviews": 2, "average_rating": Decimal("4.25"), "replied_reviews": 1,
+             "rating_1": 0, "rating_2": 0, "rating_3": 0, "rating_4": 1, "rating_5": 1}
+    rows = [{**stats, **ROW}, {**stats, **ROW, "id": 6, "review_id": "r6", "timestamp": None, "replies": "Thanks"}]
+    db_connection.fetch.return_value = rows
+
+    response = client.post("/reviews/fetch", json={"business_place_id": "place-1"})
+
+    assert response.status_code == 200
+    assert response.json() == pydantic_response(rows, stats)
+
+def test_fallback_encoder_matches_orjson():
+    """Without orjson the standard library produces the same document"""
+    payload = {"reviews": [reviews.review_dict(ROW)], "rating_distribution": {1: 0, 5: 2}}
+    fast = serialization.dumps(payload)
+    with patch.object(serialization, "orjson", None):
+        fallback = serialization.dumps(payload)
+    assert json.loads(fast) == json.loads(fallback)
+
+def test_listing_keeps_openapi_schema():
+    """The response model still documents the listing"""
+    schema = app.openapi()["paths"]["/reviews/fetch"]["post"]["responses"]["200"]
+    assert schema["content"]["application/json"]["schema"] == {"$ref": "#/components/schemas/BusinessReviewResponse"}
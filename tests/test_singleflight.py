@@ -0,0 +1,95 @@
+import asyncio
+import httpx
+from unittest.mock import patch, MagicMock, AsyncMock
+from src import singleflight
+from src.main import app
+from src.routes import message
+
+def test_concurrent_calls_share_one_execution():
+    """Callers with the same key get the result of a single call"""
+    flight = singleflight.SingleFlight()
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "reply"
+
+    async def run():
+        return await asyncio.gather(*[flight.do(("p", "r"), work) for _ in range(5)])
+
+    assert asyncio.run(run()) == ["reply"] * 5
+    assert len(calls) == 1
+
+def test_waiter_returns_reply_written_by_other_process():
+    """When another process holds the lock, its written reply is reused"""
+    locks = singleflight.AdvisoryLocks()
+    generate = AsyncMock(return_value="mine")
+    read_reply = AsyncMock(side_effect=[(None, None), (8, "theirs")])
+
+    with patch.object(locks, "try_acquire", AsyncMock(side_effect=[False, False, True])), \
+            patch.object(locks, "release", AsyncMock()) as release:
+        result = asyncio.run(locks.run_exclusive(1, generate, read_reply, wait_seconds=5, poll_interval=0))
+
+    assert result == "theirs"
+    generate.assert_not_awaited()
+    release.assert_awaited_once_with(1)
+
+def test_waiter_reuses_a_new_version_with_the_same_text():
+    """A new version counts as the other process's reply even when its text is unchanged"""
+    locks = singleflight.AdvisoryLocks()
+    generate = AsyncMock(return_value="mine")
+    read_reply = AsyncMock(side_effect=[(7, "Thanks!"), (8, "Thanks!")])
+
+    with patch.object(locks, "try_acquire", AsyncMock(side_effect=[False, True])), \
+            patch.object(locks, "release", AsyncMock()):
+        result = asyncio.run(locks.run_exclusive(1, generate, read_reply, wait_seconds=5, poll_interval=0))
+
+    assert result == "Thanks!"
+    generate.assert_not_awaited()
+
+def test_get_response_coalesces_duplicate_requests(db_connection):
+    """A double-click generates and saves one reply"""
+    generate = AsyncMock(return_value=message.GeneratedReply(text="Thank you!"))
+    save = AsyncMock()
+
+    async def slow_inputs(db_pool, profile_id, message_id):
+        await asyncio.sleep(0.01)
+        return "system", "content", None
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            body = {"profile_id": 1, "message_id": "r1"}
+            return await asyncio.gather(*[client.post("/message/get_response", json=body) for _ in range(2)])
+
+    with patch.object(message.llm, "client", MagicMock()), \
+            patch.object(singleflight.reply_flight, "cross_process", False), \
+            patch.object(message, "fetch_generation_inputs", side_effect=slow_inputs), \
+            patch.object(message, "generate_reply", generate), \
+            patch.object(message, "save_reply", save):
+        responses = asyncio.run(run())
+
+    assert [r.json() for r in responses] == [{"response": "Thank you!"}] * 2
+    assert generate.await_count == 1
+    assert save.await_count == 1
+
+def test_bypass_cache_request_does_not_join_a_cached_flight():
+    """A request bypassing the cache gets its own generation"""
+    calls = []
+
+    async def generate(label):
+        calls.append(label)
+        await asyncio.sleep(0.01)
+        return label
+
+    flight = singleflight.ReplyFlight(cross_process=False, wait_seconds=1, poll_interval=0)
+
+    async def run():
+        return await asyncio.gather(
+            flight.run(1, "r1", lambda: generate("cached"), AsyncMock()),
+            flight.run(1, "r1", lambda: generate("fresh"), AsyncMock(), bypass_cache=True),
+            flight.run(1, "r1", lambda: generate("fresh again"), AsyncMock(), bypass_cache=True),
+        )
+
+    assert asyncio.run(run()) == ["cached", "fresh", "fresh"]
+    assert calls == ["cached", "fresh"]